@@ -0,0 +1,86 @@
+"""Compares the sync handlers with their asyncio variants against the docker-compose services.
+
+    python benchmarks/bench_async.py --requests 300 --cache hit
+    python benchmarks/bench_async.py --requests 300 --cache miss
+
+A Lambda container serves one request at a time, so each handler is called sequentially and
+the per-request latency is what differs. With --cache miss the cached event list is moved
+aside for the run, so the async read shows its database fallback against get_events_handler.
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import uuid
+
+import harness
+from bench_handlers import submission
+
+PAIRS = {
+    'read': ('get_redis_events_handler', 'get_events_async_handler'),
+    'read-db': ('get_events_handler', 'get_events_async_handler'),
+    'create': ('insert_event_handler', 'insert_event_async_handler')
+}
+
+
+def make_call(kind, module):
+    if kind == 'create':
+        run_id = uuid.uuid4().hex[:8]
+        return lambda index: module.lambda_handler(submission(index, run_id), None).get("statusCode") in (200, 202)
+    return lambda index: module.lambda_handler({}, None).get("statusCode") == 200
+
+
+def bench(kind, module_name, requests, warmup):
+    call = make_call(kind, importlib.import_module(module_name))
+    for index in range(warmup):
+        call(-1 - index)
+    return harness.run_sequential(call, requests)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cache', choices=('hit', 'miss'), default='hit')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--label', default=None, help='name added to the result file')
+    parser.add_argument('--output', default=None, help='result path, defaults to benchmarks/results/')
+    parser.add_argument('--env-file', default=os.path.join(harness.ROOT, '.env'))
+    args = parser.parse_args(argv)
+
+    harness.load_env(args.env_file)
+    harness.add_handler_paths()
+    from common import config
+    from common.cache import (
+        CACHE_POINTER_KEY,
+        shared_redis
+    )
+    from common.secrets import get_aws_pass
+
+    # A cache miss run compares the async fallback with the direct database read, a hit run with the cached read
+    kinds = ('read-db', 'create') if args.cache == 'miss' else ('read', 'create')
+    r = shared_redis(get_aws_pass(config.REDIS_PASS_KEY))
+    # Moving the pointer aside hides every generation, the key keeps its hash tag and so its cluster slot
+    aside = CACHE_POINTER_KEY + ':bench_aside'
+    if args.cache == 'miss' and r.exists(CACHE_POINTER_KEY):
+        r.rename(CACHE_POINTER_KEY, aside)
+    try:
+        results = {}
+        for kind in kinds:
+            sync_name, async_name = PAIRS[kind]
+            results[kind] = {
+                'sync': bench(kind, sync_name, args.requests, args.warmup),
+                'async': bench(kind, async_name, args.requests, args.warmup)
+            }
+    finally:
+        if r.exists(aside):
+            r.rename(aside, CACHE_POINTER_KEY)
+
+    parameters = {key: value for key, value in vars(args).items() if key not in ('output', 'env_file')}
+    path = harness.save_result('async-' + args.cache + ('-' + args.label if args.label else ''), parameters, results, args.output)
+    print(json.dumps(results, indent=2))
+    print('Saved results to {}'.format(path))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Compares the dict-per-row and columnar read responses, no services needed.
+
+    python benchmarks/bench_columnar.py --events 10000
+
+Builds rows shaped like the SELECT_ALL result and times common.responses.success for each shape:
+dict rows as found_events, columnar from cursor tuples as the get handler builds it, and columnar
+reshaped from cached dict rows as the cache handler builds it. Bytes are reported raw and gzipped,
+since API Gateway can compress responses.
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import date, time as clock, timedelta
+
+import harness
+
+COLUMNS = ('name', 'time', 'price', 'description', 'link', 'craft', 'kids', 'date', 'business',
+           'location_name', 'address', 'city', 'state', 'zip')
+CRAFTS = ('pottery', 'painting', 'woodworking', 'knitting', 'jewelry', 'printmaking', 'glassblowing', 'weaving')
+
+
+def event_tuples(count, rng):
+    start = date(2026, 1, 1)
+    for i in range(count):
+        craft = rng.choice(CRAFTS)
+        location = rng.randrange(max(1, count // 50))
+        yield (
+            'Bench {} class {}'.format(craft, i),
+            clock(rng.randrange(8, 21), rng.choice((0, 15, 30, 45))),
+            round(rng.uniform(0, 120), 2),
+            'Generated {} event number {} for benchmarking'.format(craft, i),
+            'https://example.com/bench/{}'.format(i),
+            craft,
+            rng.random() < 0.3,
+            start + timedelta(days=rng.randrange(730)),
+            'Bench Business {}'.format(i % 500),
+            'Bench Studio {}'.format(location),
+            '{} Bench St'.format(location),
+            'Washington',
+            'DC',
+            '200{:02d}'.format(location % 100)
+        )
+
+
+def measure(build, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = build()
+        timings.append((time.perf_counter() - start) * 1000)
+    body = response['body'].encode()
+    return {
+        'ms': round(sorted(timings)[len(timings) // 2], 3),
+        'bytes': len(body),
+        'gzip_bytes': len(gzip.compress(body, 6))
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20, help='median of this many serializations')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--label', default='')
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    harness.add_handler_paths()
+    from common.responses import (
+        columnar,
+        success
+    )
+    rows = list(event_tuples(args.events, random.Random(args.seed)))
+    records = [dict(zip(COLUMNS, row)) for row in rows]
+    # What read_event_cache hands the cache handler: dict rows with dates already turned into strings
+    cached = json.loads(json.dumps(records, default=str))
+
+    results = {
+        'rows': measure(lambda: success(found_events=records), args.repeat),
+        'columnar_from_cursor': measure(lambda: success(columns=list(COLUMNS), rows=rows), args.repeat),
+        'rows_from_cache': measure(lambda: success(found_events=cached), args.repeat),
+        'columnar_from_cache': measure(lambda: success(**columnar(cached)), args.repeat)
+    }
+
+    parameters = {key: value for key, value in vars(args).items() if key != 'output'}
+    path = harness.save_result('columnar' + ('-' + args.label if args.label else ''), parameters, results, args.output)
+    print(json.dumps(results, indent=2))
+    print('Saved results to {}'.format(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Calls the get, cache and create handlers in-process against the docker-compose services.
+
+    docker compose up
+    python benchmarks/seed_events.py --events 100000
+    python benchmarks/bench_handlers.py --handler all --requests 500 --concurrency 8
+
+Every concurrent worker is a separate process with its own warm connections, as a Lambda container
+is. Results are written to benchmarks/results/ as JSON, compare two runs with compare.py.
+"""
+import argparse
+import functools
+import importlib
+import json
+import os
+import sys
+import uuid
+
+import harness
+
+HANDLERS = {
+    'get': 'get_events_handler',
+    'cache': 'get_redis_events_handler',
+    'create': 'insert_event_handler'
+}
+
+
+def submission(index, run_id):
+    # Unique name and link per call so the unique_event_name_link_date constraint never rejects it
+    return {
+        "name": "Bench submission {} {}".format(run_id, index),
+        "description": "Generated by bench_handlers",
+        "organization": "Bench Business",
+        "location": "Bench Studio 0",
+        "date": "2027-06-15",
+        "time": "18:30",
+        "price": "25",
+        "link": "https://example.com/bench/{}/{}".format(run_id, index),
+        "kids": False,
+        "email": "bench@example.com"
+    }
+
+
+def make_call(name, module):
+    run_id = uuid.uuid4().hex[:8]
+    if name == 'create':
+        return lambda index: module.lambda_handler(submission(index, run_id), None).get("statusCode") in (200, 202)
+    return lambda index: module.lambda_handler({}, None).get("statusCode") == 200
+
+
+def response_bytes(name, module):
+    if name == 'create':
+        return None
+    response = module.lambda_handler({}, None)
+    return len(response.get("body", "")) if response.get("statusCode") == 200 else None
+
+
+def worker_call(name):
+    return make_call(name, importlib.import_module(HANDLERS[name]))
+
+
+def bench(name, requests, concurrency, warmup):
+    # Each worker is a process of its own, the handlers keep one warm connection per container
+    result = harness.run_workers(functools.partial(worker_call, name), requests, concurrency, warmup)
+    result['response_bytes'] = response_bytes(name, importlib.import_module(HANDLERS[name]))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handler', choices=sorted(HANDLERS) + ['all'], default='all')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--label', default=None, help='name added to the result file')
+    parser.add_argument('--output', default=None, help='result path, defaults to benchmarks/results/')
+    parser.add_argument('--env-file', default=os.path.join(harness.ROOT, '.env'))
+    args = parser.parse_args(argv)
+
+    harness.load_env(args.env_file)
+    harness.add_handler_paths()
+    names = sorted(HANDLERS) if args.handler == 'all' else [args.handler]
+    results = {name: bench(name, args.requests, args.concurrency, args.warmup) for name in names}
+    parameters = {key: value for key, value in vars(args).items() if key not in ('output', 'env_file')}
+    path = harness.save_result('handlers' + ('-' + args.label if args.label else ''), parameters, results, args.output)
+    print(json.dumps(results, indent=2))
+    print('Saved results to {}'.format(path))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
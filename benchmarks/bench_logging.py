@@ -0,0 +1,77 @@
+"""Measures the per-request cost of handler logging, no services needed.
+
+    python benchmarks/bench_logging.py --requests 50000
+
+Compares the previous basicConfig text logging with eager .format() messages against the JSON
+logging in common/log.py at several LOG_SAMPLE_RATE values. Output goes to os.devnull so only
+formatting and handler overhead is measured.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+import harness
+
+RECORDS = [{"name": "Event {}".format(i), "date": "2027-06-15"} for i in range(3)]
+
+
+def text_request(logger):
+    # The shape of one insert request before structured logging
+    logger.info('Starting lambda handler')
+    logger.info("Submission rate limited for {} seconds".format(0))
+    logger.info("Parameter getter has started with url {}".format("http://localhost:2773/"))
+    logger.info("Inserted {} events".format(RECORDS))
+
+
+def json_request(log, logger):
+    log.start_request()
+    logger.info('Starting lambda handler')
+    logger.info("Submission rate limited for %s seconds", 0)
+    logger.debug("Parameter getter has started with url %s", "http://localhost:2773/")
+    logger.info("Inserted %s events", RECORDS)
+
+
+def measure(request, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        request()
+    elapsed = time.perf_counter() - start
+    return {'requests': requests, 'us_per_request': round(elapsed / requests * 1e6, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--sample-rates', default='1,0.1,0')
+    parser.add_argument('--label', default='')
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    harness.add_handler_paths()
+    from common import log
+    root = logging.getLogger()
+    logger = logging.getLogger('bench')
+    results = {}
+    with open(os.devnull, 'w') as devnull:
+        handler = logging.StreamHandler(devnull)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        root.handlers = [handler]
+        root.setLevel(logging.INFO)
+        results['text'] = measure(lambda: text_request(logger), args.requests)
+
+        for rate in args.sample_rates.split(','):
+            os.environ['LOG_SAMPLE_RATE'] = rate
+            log.configure()
+            root.handlers[0].setStream(devnull)
+            results['json_sample_{}'.format(rate)] = measure(lambda: json_request(log, logger), args.requests)
+
+    parameters = {'requests': args.requests, 'sample_rates': args.sample_rates}
+    path = harness.save_result('logging' + ('-' + args.label if args.label else ''), parameters, results, args.output)
+    print(json.dumps(results, indent=2))
+    print('Saved results to {}'.format(path))
+
+
+if __name__ == '__main__':
+    main()
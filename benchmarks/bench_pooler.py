@@ -0,0 +1,136 @@
+"""Compares direct Postgres connections with PgBouncer in transaction mode at Lambda-like concurrency.
+
+    docker compose up -d database pgbouncer
+    python benchmarks/seed_events.py --events 100000
+    python benchmarks/bench_pooler.py --clients 300 --requests 20
+
+Each client stands in for one warm Lambda container. It opens its own connection, as a cold start
+would, and then runs the search query of get_events_handler once per request, one transaction per
+request. Through the pooler the connections are opened the way the handlers open them with
+DB_POOL_MODE=transaction. A separate connection samples pg_stat_activity to report the peak number of
+server connections. Above max_connections (100 by default) direct clients fail to connect.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import harness
+
+ACTIVE_CONNECTIONS = "Select count(*) from pg_stat_activity where backend_type = 'client backend' and datname = current_database();"
+SAMPLE_SECONDS = 0.05
+
+
+def sample_connections(monitor, stop, peak):
+    with monitor.cursor() as cur:
+        while not stop.is_set():
+            cur.execute(ACTIVE_CONNECTIONS)
+            # The monitor's own connection is not counted
+            peak[0] = max(peak[0], cur.fetchone()[0] - 1)
+            monitor.rollback()
+            time.sleep(SAMPLE_SECONDS)
+
+
+def run_client(connect, query, requests, latencies, connects, failures, lock):
+    import psycopg2
+    start = time.perf_counter()
+    try:
+        conn = connect()
+    except psycopg2.Error:
+        with lock:
+            failures['connect'] += 1
+        return
+    with lock:
+        connects.append(round((time.perf_counter() - start) * 1000, 3))
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(*query)
+                    cur.fetchall()
+                conn.rollback()
+            except psycopg2.Error:
+                conn.rollback()
+                with lock:
+                    failures['query'] += 1
+                continue
+            with lock:
+                latencies.append(round((time.perf_counter() - start) * 1000, 3))
+    finally:
+        conn.close()
+
+
+def measure(connect, monitor, query, clients, requests):
+    latencies = []
+    connects = []
+    failures = {'connect': 0, 'query': 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+    peak = [0]
+    sampler = threading.Thread(target=sample_connections, args=(monitor, stop, peak))
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for _ in range(clients):
+            pool.submit(run_client, connect, query, requests, latencies, connects, failures, lock)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+    result = harness.summarize(latencies, elapsed, failures['query'])
+    connects.sort()
+    result.update({
+        'connect_errors': failures['connect'],
+        'connect_p50_ms': harness.percentile(connects, 50),
+        'connect_p95_ms': harness.percentile(connects, 95),
+        'peak_server_connections': peak[0]
+    })
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=300, help='concurrent containers, each with its own connection')
+    parser.add_argument('--requests', type=int, default=20, help='queries per client')
+    parser.add_argument('--query', default='pottery', help='search text for the get_events_handler search query')
+    parser.add_argument('--pooler-host', default=os.environ.get('BENCH_POOLER_HOST', 'localhost'))
+    parser.add_argument('--pooler-port', default=os.environ.get('BENCH_POOLER_PORT', '6432'))
+    parser.add_argument('--label', default=None, help='name added to the result file')
+    parser.add_argument('--output', default=None, help='result path, defaults to benchmarks/results/')
+    parser.add_argument('--env-file', default=os.path.join(harness.ROOT, '.env'))
+    args = parser.parse_args(argv)
+
+    harness.load_env(args.env_file)
+    harness.add_handler_paths()
+    import psycopg2
+    from seed_events import connect
+    from common import db
+    from get_events_handler import SEARCH_EVENTS
+
+    query = (SEARCH_EVENTS, (args.query, 20, 0))
+    settings = {'dbname': os.environ['DB_NAME'], 'user': os.environ['DB_USER'], 'password': os.environ['DB_PASSWORD']}
+
+    def direct():
+        return psycopg2.connect(host=os.environ['DB_HOST'], port=os.environ['DB_PORT'],
+                                options='-c statement_timeout={}'.format(db.DB_STATEMENT_TIMEOUT_MS), **settings)
+
+    def pooled():
+        return psycopg2.connect(host=args.pooler_host, port=args.pooler_port, connection_factory=db.pooled_connection(), **settings)
+
+    monitor = connect()
+    results = {}
+    for name, open_connection in (('direct', direct), ('pooler', pooled)):
+        results[name] = measure(open_connection, monitor, query, args.clients, args.requests)
+    monitor.close()
+
+    parameters = {key: value for key, value in vars(args).items() if key not in ('output', 'env_file')}
+    path = harness.save_result('pooler' + ('-' + args.label if args.label else ''), parameters, results, args.output)
+    print(json.dumps(results, indent=2))
+    print('Saved results to {}'.format(path))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
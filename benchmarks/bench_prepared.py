@@ -0,0 +1,96 @@
+"""Compares plain SQL with PREPARE/EXECUTE for the handlers' fixed queries on the seeded database.
+
+    python benchmarks/seed_events.py --events 100000
+    python benchmarks/bench_prepared.py --requests 200
+
+Each query is run on one warm connection, as a warm Lambda would. Wall time per call is reported
+along with the server's Planning Time from EXPLAIN ANALYZE, which is what preparing removes once
+Postgres switches to the generic plan. Inserts run in a rolled back transaction so nothing is kept.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+import harness
+
+PLANNING = re.compile(r'Planning Time: ([0-9.]+) ms')
+SAMPLE_ROW = ('Bench prepared', 25, 'Generated by bench_prepared', 'https://example.com/bench/prepared', True,
+              'Bench Studio 0', '2027-06-15', '18:30', 'Bench Business', 'bench@example.com', '2026-10-19')
+
+
+def planning_ms(cur, statement, params=None):
+    cur.execute('EXPLAIN (ANALYZE, TIMING OFF) ' + statement, params)
+    plan = '\n'.join(row[0] for row in cur.fetchall())
+    match = PLANNING.search(plan)
+    return float(match.group(1)) if match else None
+
+
+def measure(conn, run, explain, requests, rollback):
+    latencies = []
+    planning = []
+    with conn.cursor() as cur:
+        for _ in range(requests):
+            start = time.perf_counter()
+            run(cur)
+            if cur.description:
+                cur.fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+            if rollback:
+                conn.rollback()
+            planning.append(explain(cur))
+            if rollback:
+                conn.rollback()
+    conn.rollback()
+    result = harness.summarize([round(latency, 3) for latency in latencies], sum(latencies) / 1000, 0)
+    # The first executions of a prepared statement are still custom planned, the steady state is what matters
+    steady = [value for value in planning[5:] if value is not None]
+    result['planning_ms'] = round(sum(steady) / len(steady), 4) if steady else None
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--label', default=None, help='name added to the result file')
+    parser.add_argument('--output', default=None, help='result path, defaults to benchmarks/results/')
+    parser.add_argument('--env-file', default=os.path.join(harness.ROOT, '.env'))
+    args = parser.parse_args(argv)
+
+    harness.load_env(args.env_file)
+    harness.add_handler_paths()
+    from seed_events import connect
+    from common.db import (
+        SELECT_ALL,
+        to_positional
+    )
+    from insert_event_handler import INSERT
+
+    conn = connect()
+    queries = {
+        'select_all': (SELECT_ALL, None, False),
+        'insert': (INSERT, SAMPLE_ROW, True)
+    }
+    results = {}
+    for name, (sql, params, rollback) in queries.items():
+        statement = sql.rstrip().rstrip(';')
+        execute = 'EXECUTE bench_{} ({})'.format(name, ', '.join(['%s'] * len(params))) if params else 'EXECUTE bench_' + name
+        plain = measure(conn, lambda cur: cur.execute(sql, params), lambda cur: planning_ms(cur, statement, params), args.requests, rollback)
+        with conn.cursor() as cur:
+            cur.execute('PREPARE bench_{} AS {}'.format(name, to_positional(sql)))
+        prepared = measure(conn, lambda cur: cur.execute(execute, params), lambda cur: planning_ms(cur, execute, params), args.requests, rollback)
+        with conn.cursor() as cur:
+            cur.execute('DEALLOCATE bench_' + name)
+        results[name] = {'plain': plain, 'prepared': prepared}
+    conn.close()
+
+    parameters = {key: value for key, value in vars(args).items() if key not in ('output', 'env_file')}
+    path = harness.save_result('prepared' + ('-' + args.label if args.label else ''), parameters, results, args.output)
+    print(json.dumps(results, indent=2))
+    print('Saved results to {}'.format(path))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Compares dict-per-row reads with the tuple RowSet on peak RSS and throughput.
+
+    python benchmarks/bench_rows.py --events 100000
+    python benchmarks/bench_rows.py --source db     # after seed_events.py --events 100000
+
+Each shape runs in its own process, because peak RSS never goes down within one. A run fetches
+the rows and serializes them with common.responses.success, as get_events_handler does. The
+synthetic source generates SELECT_ALL shaped rows directly in each shape, with no services needed.
+The db source reads the seeded table with a RealDictCursor and with common.db.fetch_events.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import harness
+from bench_columnar import (
+    COLUMNS,
+    event_tuples
+)
+
+SHAPES = ('dicts', 'rowset')
+
+
+def fetch_synthetic(shape, events):
+    from common.responses import RowSet
+    rows = event_tuples(events, random.Random(1))
+    if shape == 'dicts':
+        return [dict(zip(COLUMNS, row)) for row in rows]
+    return RowSet(list(COLUMNS), list(rows))
+
+
+def fetch_db(shape, conn):
+    if shape == 'dicts':
+        from psycopg2.extras import RealDictCursor
+        from common.db import SELECT_ALL
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(SELECT_ALL)
+            records = cur.fetchall()
+        conn.rollback()
+        return records
+    from common.db import fetch_events
+    return fetch_events(conn)
+
+
+def child(args):
+    harness.add_handler_paths()
+    from common.responses import success
+    conn = None
+    if args.source == 'db':
+        harness.load_env(args.env_file)
+        from seed_events import connect
+        conn = connect()
+    fetch = (lambda: fetch_db(args.child, conn)) if conn else (lambda: fetch_synthetic(args.child, args.events))
+
+    baseline = harness.peak_rss_mb()
+    fetch_ms = []
+    serialize_ms = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        rows = fetch()
+        fetched = time.perf_counter()
+        response = success(found_events=rows)
+        fetch_ms.append((fetched - start) * 1000)
+        serialize_ms.append((time.perf_counter() - fetched) * 1000)
+        count = len(rows)
+        del rows, response
+    total_s = (sum(fetch_ms) + sum(serialize_ms)) / 1000
+    print(json.dumps({
+        'rows': count,
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': harness.peak_rss_mb(),
+        'growth_rss_mb': round(harness.peak_rss_mb() - baseline, 1),
+        'fetch_ms': round(sorted(fetch_ms)[len(fetch_ms) // 2], 1),
+        'serialize_ms': round(sorted(serialize_ms)[len(serialize_ms) // 2], 1),
+        'rows_per_s': round(count * args.repeat / total_s)
+    }))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=100000, help='rows generated by the synthetic source')
+    parser.add_argument('--source', choices=('synthetic', 'db'), default='synthetic')
+    parser.add_argument('--repeat', type=int, default=3, help='fetch and serialize this many times per shape')
+    parser.add_argument('--label', default='')
+    parser.add_argument('--output')
+    parser.add_argument('--env-file', default=os.path.join(harness.ROOT, '.env'))
+    parser.add_argument('--child', choices=SHAPES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(args)
+
+    results = {}
+    for shape in SHAPES:
+        command = [sys.executable, os.path.abspath(__file__), '--child', shape, '--events', str(args.events),
+                   '--source', args.source, '--repeat', str(args.repeat), '--env-file', args.env_file]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results[shape] = json.loads(output.strip().splitlines()[-1])
+
+    parameters = {key: value for key, value in vars(args).items() if key not in ('output', 'env_file', 'child')}
+    path = harness.save_result('rows' + ('-' + args.label if args.label else ''), parameters, results, args.output)
+    print(json.dumps(results, indent=2))
+    print('Saved results to {}'.format(path))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""Prints the change between two benchmark result files.
+
+    python benchmarks/compare.py benchmarks/results/handlers-a.json benchmarks/results/handlers-b.json
+"""
+import argparse
+import json
+import sys
+
+METRICS = ('throughput_rps', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'peak_rss_mb', 'response_bytes')
+
+
+def change(before, after):
+    if not isinstance(before, (int, float)) or not isinstance(after, (int, float)) or before == 0:
+        return ''
+    return '{:+.1f}%'.format((after - before) / before * 100)
+
+
+def compare(before, after):
+    rows = []
+    for case in sorted(set(before['results']) & set(after['results'])):
+        for metric in METRICS:
+            old = before['results'][case].get(metric)
+            new = after['results'][case].get(metric)
+            if old is None and new is None:
+                continue
+            rows.append((case, metric, old, new, change(old, new)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args(argv)
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print('{:<24} {:<16} {:>12} {:>12} {:>9}'.format('case', 'metric', 'before', 'after', 'change'))
+    for case, metric, old, new, delta in compare(before, after):
+        print('{:<24} {:<16} {:>12} {:>12} {:>9}'.format(case, metric, str(old), str(new), delta))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Shared helpers for the local benchmarks: paths, env loading, timing and result files."""
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EVENTS_DIR = os.path.join(ROOT, 'src', 'events')
+HANDLER_DIRS = ('get', 'cache', 'create')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def load_env(env_file):
+    """Loads the docker-compose .env and points the handlers at the locally exposed ports."""
+    if env_file and os.path.exists(env_file):
+        from dotenv import load_dotenv
+        load_dotenv(env_file)
+    os.environ.setdefault('AWS_SESSION_TOKEN', 'test')
+    # Inside docker-compose the services are addressed by name, the benchmarks run on the host
+    os.environ['DB_HOST'] = os.environ.get('BENCH_DB_HOST', 'localhost')
+    os.environ['DB_READ_HOSTS'] = os.environ.get('BENCH_DB_READ_HOSTS', 'localhost:5433')
+    os.environ['REDIS_URL'] = os.environ.get('BENCH_REDIS_HOST', 'localhost')
+    os.environ['PARAMETERS_SECRETS_EXTENSION_URL'] = os.environ.get('BENCH_EXTENSION_URL', 'http://localhost:2773/')
+
+
+def add_handler_paths():
+    for path in (EVENTS_DIR,) + tuple(os.path.join(EVENTS_DIR, folder) for folder in HANDLER_DIRS):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024, 1)
+
+
+def summarize(latencies_ms, elapsed_s, errors):
+    ordered = sorted(latencies_ms)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'elapsed_s': round(elapsed_s, 3),
+        'throughput_rps': round(len(ordered) / elapsed_s, 1) if elapsed_s else None,
+        'mean_ms': round(sum(ordered) / len(ordered), 3) if ordered else None,
+        'p50_ms': percentile(ordered, 50),
+        'p95_ms': percentile(ordered, 95),
+        'p99_ms': percentile(ordered, 99),
+        'max_ms': ordered[-1] if ordered else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def timed_call(call, index):
+    start = time.perf_counter()
+    ok = call(index)
+    return (time.perf_counter() - start) * 1000, ok
+
+
+def run_sequential(call, requests):
+    """Runs call(index) requests times in this process, one at a time like a single container."""
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for index in range(requests):
+        try:
+            latency, ok = timed_call(call, index)
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(round(latency, 3))
+        if not ok:
+            errors += 1
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def worker(setup, indexes, warmup, barrier, results):
+    # Runs in its own process, so the handlers' module level connections, metrics and log state are
+    # this worker's alone, as they are a Lambda container's
+    add_handler_paths()
+    try:
+        call = setup()
+        for index in range(warmup):
+            call(-1 - index)
+    except Exception:
+        # Releases the other workers and the parent instead of leaving them waiting on this one
+        barrier.abort()
+        raise
+    barrier.wait()
+    latencies = []
+    errors = 0
+    for index in indexes:
+        try:
+            latency, ok = timed_call(call, index)
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(round(latency, 3))
+        if not ok:
+            errors += 1
+    results.put((latencies, errors, peak_rss_mb()))
+
+
+def run_workers(setup, requests, concurrency, warmup=0):
+    """Splits requests calls over concurrency worker processes, each standing in for one container.
+
+    setup is called once in every worker and returns call(index), which returns True on success. It
+    has to be picklable, a module level function or a functools.partial of one. Workers are spawned,
+    not forked, so none inherits this process's connections, and timing starts once all are warm.
+    """
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(concurrency + 1)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(setup, range(number, requests, concurrency), warmup, barrier, results))
+                 for number in range(concurrency)]
+    for process in processes:
+        process.start()
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        for process in processes:
+            process.terminate()
+        raise RuntimeError('A benchmark worker failed during setup or warmup, see its traceback above')
+    start = time.perf_counter()
+    collected = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+    latencies = [latency for worker_latencies, _, _ in collected for latency in worker_latencies]
+    result = summarize(latencies, elapsed, sum(errors for _, errors, _ in collected))
+    # Per worker, the figure a container's memory setting has to cover
+    result['peak_rss_mb'] = max(rss for _, _, rss in collected)
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def save_result(name, parameters, results, output=None):
+    document = {
+        'benchmark': name,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'parameters': parameters,
+        'results': results
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, '{}-{}.json'.format(name, stamp))
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=2)
+    return output
@@ -0,0 +1,117 @@
+"""Seeds the docker-compose Postgres with generated events and writes them to the Redis cache.
+
+    python benchmarks/seed_events.py --events 100000
+"""
+import argparse
+import io
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+import harness
+
+CRAFTS = ('pottery', 'painting', 'woodworking', 'knitting', 'jewelry', 'printmaking', 'glassblowing', 'weaving')
+CHUNK_SIZE = 50000
+
+
+def connect():
+    import psycopg2
+    return psycopg2.connect(
+        dbname=os.environ['DB_NAME'],
+        user=os.environ['DB_USER'],
+        password=os.environ['DB_PASSWORD'],
+        port=os.environ['DB_PORT'],
+        host=os.environ['DB_HOST']
+    )
+
+
+def location_rows(count, rng):
+    # Spread over roughly 30 km around downtown DC so proximity searches have something to filter
+    for i in range(count):
+        yield ('Bench Studio {}'.format(i), '{} Bench St'.format(i), 'Washington', 'DC', '200{:02d}'.format(i % 100),
+               round(38.9 + rng.uniform(-0.15, 0.15), 6), round(-77.03 + rng.uniform(-0.2, 0.2), 6))
+
+
+def event_rows(count, location_ids, rng):
+    start = date(2026, 1, 1)
+    for i in range(count):
+        craft = rng.choice(CRAFTS)
+        yield (
+            'Bench {} class {}'.format(craft, i),
+            round(rng.uniform(0, 120), 2),
+            'Generated {} event number {} for benchmarking'.format(craft, i),
+            'https://example.com/bench/{}'.format(i),
+            craft,
+            rng.random() < 0.3,
+            rng.choice(location_ids),
+            (start + timedelta(days=rng.randrange(730))).isoformat(),
+            '{:02d}:{:02d}:00'.format(rng.randrange(8, 21), rng.choice((0, 15, 30, 45))),
+            'Bench Business {}'.format(i % 500),
+            True,
+            'bench@example.com'
+        )
+
+
+def copy_rows(cur, table, columns, rows):
+    """COPYs rows in CHUNK_SIZE pieces so memory stays flat for 1M events."""
+    buffer = io.StringIO()
+    written = 0
+    for row in rows:
+        buffer.write('\t'.join(str(value) for value in row) + '\n')
+        written += 1
+        if written % CHUNK_SIZE == 0:
+            buffer.seek(0)
+            cur.copy_from(buffer, table, columns=columns)
+            buffer = io.StringIO()
+    buffer.seek(0)
+    cur.copy_from(buffer, table, columns=columns)
+    return written
+
+
+def seed(conn, events, locations, seed_value):
+    rng = random.Random(seed_value)
+    with conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM event WHERE submitted_by = 'bench@example.com';")
+        cur.execute("DELETE FROM location WHERE location_name LIKE 'Bench Studio %%';")
+        copy_rows(cur, 'location', ('location_name', 'address', 'city', 'state', 'zip', 'latitude', 'longitude'), location_rows(locations, rng))
+        cur.execute("SELECT id FROM location WHERE location_name LIKE 'Bench Studio %%';")
+        location_ids = [row[0] for row in cur.fetchall()]
+        copy_rows(cur, 'event', ('name', 'price', 'description', 'link', 'craft', 'kids', 'location_id', 'date', 'time', 'business', 'approved', 'submitted_by'), event_rows(events, location_ids, rng))
+        cur.execute("ANALYZE event; ANALYZE location;")
+
+
+def refresh_cache(conn):
+    from psycopg2.extras import RealDictCursor
+    from common.cache import write_event_cache
+    from common.db import SELECT_ALL
+    import redis
+    r = redis.Redis(host=os.environ['REDIS_URL'], port=os.environ['REDIS_PORT'], username=os.environ.get('REDIS_USERNAME'), password=os.environ.get('REDIS_PASSWORD'), decode_responses=True)
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(SELECT_ALL)
+        write_event_cache(r, cur.fetchall())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=1000, help='number of events to generate (1k to 1M)')
+    parser.add_argument('--locations', type=int, default=None, help='distinct locations, defaults to events / 50')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--env-file', default=os.path.join(harness.ROOT, '.env'))
+    parser.add_argument('--no-cache', action='store_true', help='skip writing the event list to Redis')
+    args = parser.parse_args(argv)
+
+    harness.load_env(args.env_file)
+    harness.add_handler_paths()
+    conn = connect()
+    try:
+        seed(conn, args.events, args.locations or max(1, args.events // 50), args.seed)
+        if not args.no_cache:
+            refresh_cache(conn)
+    finally:
+        conn.close()
+    print('Seeded {} events'.format(args.events))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,6 @@
 #!/bin/bash
 
-FUNCTIONS=("create" "get" "cache")
+FUNCTIONS=("create" "get" "cache" "promote" "router" "snapshot")
 
 for i in "${!FUNCTIONS[@]}"; do
     echo "Building $FOLDER..."
@@ -9,19 +9,32 @@ for i in "${!FUNCTIONS[@]}"; do
 
     case "$FOLDER" in
     "create")
-        cp src/events/$FOLDER/validators.py src/events/$FOLDER/insert_event_handler.py src/events/$FOLDER/build
+        cp src/events/$FOLDER/validators.py src/events/$FOLDER/insert_event_handler.py src/events/$FOLDER/idempotency.py src/events/$FOLDER/import_events_handler.py src/events/$FOLDER/rate_limiter.py src/events/$FOLDER/submission_queue.py src/events/$FOLDER/submission_consumer.py src/events/$FOLDER/insert_event_async_handler.py src/events/$FOLDER/build
         ;;
     "get")
-        cp src/events/$FOLDER/get_events_handler.py src/events/$FOLDER/build
+        cp src/events/$FOLDER/get_events_handler.py src/events/$FOLDER/get_calendar_handler.py src/events/$FOLDER/build
         ;;
     "cache")
-         cp src/events/$FOLDER/get_redis_events_handler.py src/events/$FOLDER/build
+         cp src/events/$FOLDER/get_redis_events_handler.py src/events/$FOLDER/get_events_async_handler.py src/events/$FOLDER/build
+        ;;
+    "promote")
+        cp src/events/$FOLDER/promote_events_handler.py src/events/$FOLDER/build
+        ;;
+    "snapshot")
+        cp src/events/$FOLDER/snapshot_events_handler.py src/events/$FOLDER/build
+        ;;
+    "router")
+        # One function serving every API route, so it carries all three handlers
+        cp src/events/$FOLDER/router_handler.py src/events/get/get_events_handler.py src/events/get/get_calendar_handler.py src/events/cache/get_redis_events_handler.py src/events/$FOLDER/build
+        cp src/events/create/validators.py src/events/create/insert_event_handler.py src/events/create/idempotency.py src/events/create/rate_limiter.py src/events/create/submission_queue.py src/events/$FOLDER/build
         ;;
     *)
         echo "unknown folder"
         ;;
     esac
 
+    cp -r src/events/common src/events/$FOLDER/build
+    rm -rf src/events/$FOLDER/build/common/test_*.py src/events/$FOLDER/build/common/__pycache__
     cp .env src/events/$FOLDER/build
     pip install -r src/events/$FOLDER/requirements.txt \
         --platform manylinux2014_x86_64 \
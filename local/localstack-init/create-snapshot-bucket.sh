@@ -0,0 +1,3 @@
+#!/bin/bash
+# Bucket the snapshot handler publishes to, served locally at http://localhost:4566/$SNAPSHOT_BUCKET/
+awslocal s3 mb "s3://${SNAPSHOT_BUCKET:-dc-craft-events-snapshots}"
@@ -55,10 +55,101 @@ ALTER TABLE user_submitted_event
 ADD CONSTRAINT unique_event_name_link_date
 UNIQUE (name, link, date);
 
-INSERT INTO location (location_name, address, city, state, zip) VALUES
-    ('Community Center', '123 Main St', 'Seattle', 'WA', '98101'),
-    ('Art Studio Downtown', '456 Art Ave', 'Portland', 'OR', '97201'),
-    ('Creative Space', '789 Maker Blvd', 'Austin', 'TX', '78701');
+ALTER TABLE location
+ADD CONSTRAINT unique_location
+UNIQUE NULLS NOT DISTINCT (location_name, address, city, state, zip);
+
+CREATE INDEX IF NOT EXISTS idx_user_submitted_event_ready
+ON user_submitted_event (id)
+WHERE status = 'ready' AND approved;
+
+-- Weighted search document for the get handler's q= search, kept current by Postgres on every write
+ALTER TABLE event
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(craft, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(business, '')), 'C') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'D')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_event_search_vector
+ON event USING GIN (search_vector);
+
+-- Delta sync: version is the id of the transaction that last wrote the row, set by the trigger below
+ALTER TABLE event
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_event_version
+ON event (version);
+
+-- Deleted and unapproved events, so clients syncing with since= can drop them
+CREATE TABLE IF NOT EXISTS event_tombstone (
+    event_id INT PRIMARY KEY,
+    version BIGINT NOT NULL,
+    removed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_event_tombstone_version
+ON event_tombstone (version);
+
+CREATE OR REPLACE FUNCTION event_track_version() RETURNS trigger AS $$
+BEGIN
+    NEW.version := pg_current_xact_id()::text::bigint;
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER event_version
+BEFORE INSERT OR UPDATE ON event
+FOR EACH ROW EXECUTE FUNCTION event_track_version();
+
+CREATE OR REPLACE FUNCTION event_track_removal() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR (OLD.approved AND NOT NEW.approved) THEN
+        INSERT INTO event_tombstone (event_id, version)
+        VALUES (OLD.id, pg_current_xact_id()::text::bigint)
+        ON CONFLICT (event_id) DO UPDATE SET version = EXCLUDED.version, removed_at = now();
+    ELSIF NEW.approved AND NOT OLD.approved THEN
+        -- Approved again, it is sent as a change instead
+        DELETE FROM event_tombstone WHERE event_id = NEW.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER event_removal
+AFTER UPDATE OF approved OR DELETE ON event
+FOR EACH ROW EXECUTE FUNCTION event_track_removal();
+
+-- Calendar counts of approved events per day and craft are answered from this index alone
+CREATE INDEX IF NOT EXISTS idx_event_date_craft
+ON event (date, craft)
+WHERE approved;
+
+-- Filled in from the bundled zip centroids by the promotion handler, NULL until then
+ALTER TABLE location
+ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+
+-- Set once the promotion handler has looked the zip up, so a zip missing from the centroids is not retried every run
+ALTER TABLE location
+ADD COLUMN IF NOT EXISTS geocode_attempted BOOLEAN NOT NULL DEFAULT false;
+
+CREATE INDEX IF NOT EXISTS idx_location_geocode_pending
+ON location (id)
+WHERE NOT geocode_attempted;
+
+-- Serves the bounding box prefilter of proximity searches, the range on latitude narrows the scan
+CREATE INDEX IF NOT EXISTS idx_location_lat_lon
+ON location (latitude, longitude)
+WHERE latitude IS NOT NULL;
+
+INSERT INTO location (location_name, address, city, state, zip, latitude, longitude) VALUES
+    ('Community Center', '123 Main St', 'Seattle', 'WA', '98101', 47.6114, -122.3305),
+    ('Art Studio Downtown', '456 Art Ave', 'Portland', 'OR', '97201', 45.5079, -122.6906),
+    ('Creative Space', '789 Maker Blvd', 'Austin', 'TX', '78701', 30.2713, -97.7426);
 
 INSERT INTO event (name, price, description, link, craft, kids, location_id, date, time, business, approved, submitted_by) VALUES
     ('Pottery Workshop', 45.00, 'Learn basic pottery techniques', 'https://example.com/pottery', 'pottery', true, 1, '2026-02-15', '14:00:00', 'Clay Masters', true, 'admin@example.com'),
@@ -0,0 +1,8 @@
+#!/bin/bash
+set -e
+
+# Runs after init.sql: lets the database-replica service stream from this server
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-EOSQL
+	CREATE ROLE replicator WITH REPLICATION LOGIN PASSWORD '$POSTGRES_PASSWORD';
+EOSQL
+echo "host replication replicator all scram-sha-256" >> "$PGDATA/pg_hba.conf"
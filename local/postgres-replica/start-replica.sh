@@ -0,0 +1,13 @@
+#!/bin/bash
+set -e
+
+# Clones the primary on the first start, then runs as a hot standby streaming from it
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until pg_basebackup --host=database --username=replicator --pgdata="$PGDATA" --wal-method=stream --write-recovery-conf; do
+        echo "Waiting for the primary to accept replication connections..."
+        rm -rf "$PGDATA"/*
+        sleep 2
+    done
+    chmod 0700 "$PGDATA"
+fi
+exec postgres -c hot_standby=on
@@ -0,0 +1,14 @@
+#!/bin/bash
+# Joins the six redis-cluster nodes into a cluster once they answer, a node that already
+# knows the cluster means it was created on an earlier start
+NODES="127.0.0.1:7000 127.0.0.1:7001 127.0.0.1:7002 127.0.0.1:7003 127.0.0.1:7004 127.0.0.1:7005"
+for node in $NODES; do
+    until redis-cli -h "${node%:*}" -p "${node#*:}" ping > /dev/null 2>&1; do
+        sleep 1
+    done
+done
+if redis-cli -p 7000 cluster info | grep -q 'cluster_state:ok'; then
+    echo "Cluster already created"
+    exit 0
+fi
+redis-cli --cluster create $NODES --cluster-replicas 1 --cluster-yes
@@ -0,0 +1,151 @@
+# Imported first so an enabled cold start profile covers every import below
+from common import profiling
+import asyncio
+import json
+import os
+from common import aio
+from common import breaker
+from common import config
+from common import metrics
+from common.cache import eval_read_cache
+from common.db import (
+    CHANGED_EVENTS,
+    CHANGES_VERSION,
+    DELETED_EVENTS,
+    SELECT_ALL,
+    to_positional
+)
+from common.params import (
+    int_param,
+    query_params
+)
+from common.responses import (
+    RowSet,
+    is_error,
+    return_error,
+    success
+)
+from common.log import (
+    get_logger,
+    start_request
+)
+
+logger=get_logger(__name__)
+profiling.mark("handler_imported")
+
+# How long the Redis read runs alone before the database query is started alongside it
+CACHE_HEDGE_MS=int(os.environ.get('ASYNC_CACHE_HEDGE_MS', '50'))
+
+async def read_cache(password_task):
+	password=await password_task
+	if is_error(password):
+		return None
+	try:
+		with metrics.stage("RedisGet"):
+			data=await eval_read_cache(aio.shared_async_cache_redis(password))
+	except breaker.BreakerOpenError:
+		return None
+	except Exception as e:
+		logger.error("Failed to get from redis: %s", e)
+		breaker.redis.record_failure()
+		return None
+	breaker.redis.record_success()
+	if not data:
+		return None
+	with metrics.stage("Deserialize"):
+		return json.loads(data)
+
+def record_set(rows):
+	# asyncpg records iterate over their values like tuples, so they are kept as they are
+	return RowSet(list(rows[0].keys()) if rows else [], rows)
+
+async def read_db(password_task):
+	import asyncpg
+	password=await password_task
+	if is_error(password):
+		return password
+	conn=await aio.shared_pg(password)
+	if is_error(conn):
+		return conn
+	try:
+		with metrics.stage("DbQuery"):
+			rows=await conn.fetch(SELECT_ALL)
+	except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError) as e:
+		logger.error("Failed database call with code: %s and error: %s", getattr(e, "sqlstate", None), e)
+		await aio.reset_pg(e)
+		return return_error(500, 'Retrieval from database failed')
+	breaker.postgres.record_success()
+	return record_set(rows)
+
+async def read_changes(since):
+	"""Async counterpart of fetch_changes, the cache does not hold changes so they always come from Postgres."""
+	import asyncpg
+	password=await aio.get_aws_pass_async(config.DB_PASS_KEY)
+	if is_error(password):
+		return password
+	conn=await aio.shared_pg(password)
+	if is_error(conn):
+		return conn
+	try:
+		with metrics.stage("DbQuery"):
+			# The version is read first, see CHANGES_VERSION
+			version=await conn.fetchval(CHANGES_VERSION)
+			rows=await conn.fetch(to_positional(CHANGED_EVENTS), since)
+			deleted=await conn.fetch(to_positional(DELETED_EVENTS), since)
+	except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError) as e:
+		logger.error("Failed database call with code: %s and error: %s", getattr(e, "sqlstate", None), e)
+		await aio.reset_pg(e)
+		return return_error(500, 'Retrieval from database failed')
+	breaker.postgres.record_success()
+	return {"version": version, "found_events": record_set(rows), "deleted": [row["event_id"] for row in deleted]}
+
+async def read_events():
+	"""Reads the cached events, racing the database query once the cache is slow or misses.
+
+	Both secrets are fetched concurrently at the start. The query starts CACHE_HEDGE_MS after the
+	Redis read, or immediately on a miss. Whichever read returns events first cancels the other, and
+	a database error is only returned once the cache read has also come back empty.
+	"""
+	redis_password=asyncio.ensure_future(aio.get_aws_pass_async(config.REDIS_PASS_KEY))
+	db_password=asyncio.ensure_future(aio.get_aws_pass_async(config.DB_PASS_KEY))
+	cache_task=asyncio.ensure_future(read_cache(redis_password))
+	done, _=await asyncio.wait({cache_task}, timeout=CACHE_HEDGE_MS / 1000)
+	if done and cache_task.result() is not None:
+		await aio.cancel(db_password)
+		metrics.record("CacheHit", 1)
+		return cache_task.result()
+
+	db_task=asyncio.ensure_future(read_db(db_password))
+	pending={db_task} if done else {cache_task, db_task}
+	while pending:
+		done, pending=await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+		if cache_task in done and cache_task.result() is not None:
+			await aio.cancel(db_task)
+			metrics.record("CacheHit", 1)
+			return cache_task.result()
+		if db_task in done and not is_error(db_task.result()):
+			await aio.cancel(cache_task)
+			break
+	metrics.record("CacheHit", 0)
+	return db_task.result()
+
+@profiling.profile_cold_start
+@metrics.instrument('get_events_async_handler')
+def lambda_handler(event, context):
+	start_request(context)
+	logger.info('Starting lambda handler')
+	try:
+		since=int_param(query_params(event), "since", None, minimum=0)
+	except ValueError as e:
+		return return_error(422, str(e))
+	if since is not None:
+		changes=aio.run(read_changes(since))
+		if is_error(changes):
+			return changes
+		metrics.record("RowCount", len(changes["found_events"]))
+		return success(**changes)
+	records=aio.run(read_events())
+	if is_error(records):
+		return records
+	metrics.record("RowCount", len(records))
+	return success(found_events=records)
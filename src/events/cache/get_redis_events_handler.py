@@ -1,93 +1,108 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import logging
-import json
-import os
-import requests
-from dotenv import load_dotenv
-import redis
-from redis.backoff import ExponentialBackoff
-from redis.retry import Retry
-from redis.client import Redis
-from redis.exceptions import (
-   BusyLoadingError,
-   RedisError
+# Imported first so an enabled cold start profile covers every import below
+from common import profiling
+from common import breaker
+from common import config
+from common import metrics
+from common.cache import (
+    read_event_cache,
+    shared_cache_redis
+)
+from common.db import (
+    fetch_changes,
+    fetch_events,
+    record_db_success,
+    reset_read_db,
+    shared_read_db
+)
+from common.params import (
+    columnar_format,
+    int_param,
+    query_params
+)
+from common.responses import (
+    columnar,
+    is_error,
+    return_error,
+    success
+)
+from common.secrets import get_aws_pass
+from common.log import (
+    get_logger,
+    start_request
 )
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
-logger=logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-CACHE_KEY='event_table:all'
-
-if os.path.exists('.env'):
-	load_dotenv()
-	logger.info("Loaded environment from .env file")
-else:
-	logger.info("No .env file")
-
-aws_session_token=os.environ['AWS_SESSION_TOKEN']
-URL=os.environ['PARAMETERS_SECRETS_EXTENSION_URL']
-
-REDIS_URL=os.environ['REDIS_URL']
-REDIS_PORT=os.environ['REDIS_PORT']
-REDIS_USERNAME=os.environ['REDIS_USERNAME']
-REDIS_PASS_KEY=os.environ['REDIS_PASS_KEY']
-def return_error(code, message):
-	return {
-		"statusCode": code,
-		"message": message
-	}
+logger=get_logger(__name__)
+profiling.mark("handler_imported")
 
-def connect_redis(password):
-	logger.info("Connecting to Redis")
-	logger.info(REDIS_URL)
-	retry=Retry(ExponentialBackoff(), 3)
+def database_fallback(error, as_columns=False):
+	"""Reads the events from Postgres when Redis is unavailable or the cache is empty, otherwise returns error."""
+	import psycopg2
+	db_password=get_aws_pass(config.DB_PASS_KEY)
+	if is_error(db_password):
+		return error
+	conn=shared_read_db(db_password)
+	if is_error(conn):
+		return error
 	try:
-		r=redis.Redis(host=REDIS_URL, port=REDIS_PORT, password=password, username=REDIS_USERNAME, ssl=False, decode_responses=True, retry=retry, retry_on_error=[BusyLoadingError, RedisError])
-	except Exception as e:
-		logger.error("Failed to connect to redis: {}".format(e))
-		return return_error(500, 'Error connecting to Redis')
+		records=fetch_events(conn)
+	except psycopg2.Error as e:
+		logger.error("Database fallback failed with code: %s and error: %s", e.pgcode, e.pgerror)
+		reset_read_db(e)
+		return error
+	record_db_success(conn)
+	metrics.set_property("Fallback", "database")
+	metrics.record("RowCount", len(records))
+	return success(**(columnar(records) if as_columns else {"found_events": records}))
 
-	logger.info(r.ping())
-	return r
+def database_changes(since, as_columns=False):
+	"""Reads the changes since a version, which the cache does not hold, from Postgres."""
+	import psycopg2
+	db_password=get_aws_pass(config.DB_PASS_KEY)
+	if is_error(db_password):
+		return db_password
+	conn=shared_read_db(db_password)
+	if is_error(conn):
+		return conn
+	try:
+		changes=fetch_changes(conn, since)
+	except psycopg2.Error as e:
+		logger.error("Failed database call with code: %s and error: %s", e.pgcode, e.pgerror)
+		reset_read_db(e)
+		return return_error(500, 'Retrieval from database failed')
+	record_db_success(conn)
+	records=changes.pop("found_events")
+	metrics.record("RowCount", len(records))
+	return success(**(columnar(records) if as_columns else {"found_events": records}), **changes)
 
-def get_cached_data(r):
+@profiling.profile_cold_start
+@metrics.instrument('get_redis_events_handler')
+def lambda_handler(event, context):
+	start_request(context)
+	logger.info('Starting lambda handler')
+	params=query_params(event)
 	try:
-		logger.info(r.ping())
-		data=r.get(CACHE_KEY)
-		return data
-	except Exception as e:
-		logger.error("Failed to get from to redis: {}".format(e))
-		return return_error(500, 'Error getting from Redis')
+		since=int_param(params, "since", None, minimum=0)
+		as_columns=columnar_format(params)
+	except ValueError as e:
+		return return_error(422, str(e))
+	if since is not None:
+		return database_changes(since, as_columns)
+
+	red_password=get_aws_pass(config.REDIS_PASS_KEY)
+	if is_error(red_password):
+		return database_fallback(red_password, as_columns)
 
-def get_aws_pass(password):
 	try:
-		url_config=URL+"/systemsmanager/parameters/get"
-		logger.info("Parameter getter has started with url {}".format(url_config))
-		res = requests.get(
-    		url_config,
-    		headers={"X-Aws-Parameters-Secrets-Token": aws_session_token},
-    		params={"name": password, "withDecryption": "true"}
-    		)
-		found_password=res.json()['Parameter']['Value']
+		with breaker.redis.guard():
+			found_events=read_event_cache(shared_cache_redis(red_password))
 	except Exception as e:
-		logger.error({e})
-		return return_error(500, 'Server parameter retrieval error')
-	return found_password
-
-def lambda_handler(event, context):
-	logger.info('Starting lambda handler')
-	red_password=get_aws_pass(REDIS_PASS_KEY)
-	
-	r=connect_redis(red_password)
-	cached_records=get_cached_data(r)
-	if cached_records:
-		return {
-			"statusCode": 200,
-        	"body": json.dumps({
-            	"message": "Successful",
-            	"found_events": json.loads(cached_records)
-        	}, default=str) 
-		}
-	else:
-		return return_error(500, 'No cached data found')
+		logger.error("Failed to get from redis: %s", e)
+		return database_fallback(return_error(500, 'Error getting from Redis'), as_columns)
+	metrics.record("CacheHit", 1 if found_events is not None else 0)
+	if found_events is None:
+		return database_fallback(return_error(500, 'No cached data found'), as_columns)
+	metrics.record("RowCount", len(found_events))
+	if as_columns:
+		# The cache holds dict rows, reshaping them costs less than the keys it drops from the payload
+		return success(**columnar(found_events))
+	return success(found_events=found_events)
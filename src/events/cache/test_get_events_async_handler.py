@@ -0,0 +1,109 @@
+import pytest
+import asyncio
+import json
+from common import aio
+import get_events_async_handler
+from get_events_async_handler import read_events
+
+CACHED = [{"name": "Pottery Workshop"}]
+FROM_DB = [{"name": "Painting Class"}]
+
+
+@pytest.fixture
+def services(async_fake_redis, monkeypatch):
+    # Replaces the extension, Redis and Postgres so only the read ordering is exercised
+    calls = []
+
+    class SlowRedis(async_fake_redis):
+        def __init__(self, value, delay):
+            super().__init__(script_results=[value])
+            self.delay = delay
+
+        async def eval(self, script, numkeys, *args):
+            await asyncio.sleep(self.delay)
+            return await super().eval(script, numkeys, *args)
+
+    async def get_pass(key):
+        return "password"
+
+    async def read_db(password_task):
+        await password_task
+        calls.append("db")
+        return FROM_DB
+
+    def use_redis(value, delay=0):
+        monkeypatch.setattr(aio, "shared_async_redis", lambda password: SlowRedis(value, delay))
+    monkeypatch.setattr(aio, "get_aws_pass_async", get_pass)
+    monkeypatch.setattr(get_events_async_handler, "read_db", read_db)
+    monkeypatch.setattr(get_events_async_handler, "CACHE_HEDGE_MS", 20)
+    use_redis(json.dumps(CACHED))
+    return calls, use_redis
+
+
+class TestReadEvents:
+
+    def test_fast_cache_hit_skips_the_database(self, services):
+        calls, _ = services
+        assert asyncio.run(read_events()) == CACHED
+        assert calls == []
+
+    def test_cache_miss_falls_back_to_the_database(self, services):
+        calls, use_redis = services
+        use_redis(None)
+        assert asyncio.run(read_events()) == FROM_DB
+        assert calls == ["db"]
+
+    def test_slow_cache_loses_to_the_database(self, services):
+        calls, use_redis = services
+        use_redis(json.dumps(CACHED), delay=0.5)
+        assert asyncio.run(read_events()) == FROM_DB
+
+    def test_redis_error_falls_back_to_the_database(self, services, async_fake_redis, monkeypatch):
+        class BrokenRedis(async_fake_redis):
+            def run_script(self, script, keys, args):
+                raise ConnectionError("redis down")
+        monkeypatch.setattr(aio, "shared_async_redis", lambda password: BrokenRedis())
+        assert asyncio.run(read_events()) == FROM_DB
+
+
+    def test_database_error_waits_for_a_slow_cache_hit(self, services, monkeypatch):
+        _, use_redis = services
+
+        async def read_db(password_task):
+            return {"statusCode": 500, "body": "{}"}
+        monkeypatch.setattr(get_events_async_handler, "read_db", read_db)
+        use_redis(json.dumps(CACHED), delay=0.1)
+        assert asyncio.run(read_events()) == CACHED
+
+    def test_losing_cache_read_is_not_left_on_the_loop(self, services):
+        _, use_redis = services
+        use_redis(json.dumps(CACHED), delay=0.5)
+        # The container's loop outlives the invocation, unlike the one asyncio.run cleans up
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(read_events()) == FROM_DB
+            assert [task for task in asyncio.all_tasks(loop) if not task.done()] == []
+        finally:
+            loop.close()
+
+
+class TestSince:
+
+    def test_changes_skip_the_cache(self, monkeypatch):
+        async def read_changes(since):
+            return {"version": 90, "found_events": FROM_DB, "deleted": [since]}
+        monkeypatch.setattr(get_events_async_handler, "read_changes", read_changes)
+        monkeypatch.setattr(get_events_async_handler, "read_events", lambda: pytest.fail("full read"))
+        response = get_events_async_handler.lambda_handler({"since": "12"}, None)
+        assert json.loads(response["body"])["deleted"] == [12]
+
+
+class TestPgTimeout:
+
+    def test_server_setting_by_default(self, monkeypatch):
+        monkeypatch.setattr(aio, "TRANSACTION_POOLING", False)
+        assert aio.pg_timeout_options() == {"server_settings": {"statement_timeout": str(aio.DB_STATEMENT_TIMEOUT_MS)}}
+
+    def test_client_timeout_behind_a_transaction_pooler(self, monkeypatch):
+        monkeypatch.setattr(aio, "TRANSACTION_POOLING", True)
+        assert aio.pg_timeout_options() == {"command_timeout": aio.DB_STATEMENT_TIMEOUT_MS / 1000}
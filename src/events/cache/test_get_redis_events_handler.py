@@ -0,0 +1,24 @@
+import pytest
+import json
+import get_redis_events_handler
+
+
+class TestSince:
+
+    def test_changes_are_read_from_the_database(self, monkeypatch):
+        monkeypatch.setattr(get_redis_events_handler, "database_changes", lambda since, as_columns: {"since": since})
+        monkeypatch.setattr(get_redis_events_handler, "read_event_cache", lambda r: pytest.fail("cache read"))
+        assert get_redis_events_handler.lambda_handler({"queryStringParameters": {"since": "42"}}, None) == {"since": 42}
+
+    def test_invalid_version(self):
+        assert get_redis_events_handler.lambda_handler({"since": "-5"}, None)["statusCode"] == 422
+
+
+class TestColumnar:
+
+    def test_cached_rows_are_reshaped(self, monkeypatch):
+        monkeypatch.setattr(get_redis_events_handler, "get_aws_pass", lambda key: "password")
+        monkeypatch.setattr(get_redis_events_handler, "shared_cache_redis", lambda password: "redis")
+        monkeypatch.setattr(get_redis_events_handler, "read_event_cache", lambda r: [{"name": "Pottery", "zip": "20001"}])
+        body = json.loads(get_redis_events_handler.lambda_handler({"format": "columnar"}, None)["body"])
+        assert body == {"message": "Successful", "columns": ["name", "zip"], "rows": [["Pottery", "20001"]]}
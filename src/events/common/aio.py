@@ -0,0 +1,154 @@
+import asyncio
+import time
+from common import breaker
+from common import config
+from common import metrics
+from common import profiling
+from common.cache import (
+    REDIS_CLUSTER,
+    REDIS_READ_FROM_REPLICAS,
+    REDIS_RETRIES,
+    cluster_options,
+    redis_options
+)
+from common.db import (
+    DB_CONNECT_TIMEOUT_SECONDS,
+    DB_MAX_IDLE_SECONDS,
+    DB_STATEMENT_TIMEOUT_MS,
+    PREPARED_STATEMENTS,
+    TRANSACTION_POOLING
+)
+from common.responses import return_error
+from common.secrets import get_aws_pass
+from common.log import get_logger
+
+logger=get_logger(__name__)
+
+# asyncpg connections and redis.asyncio pools are bound to the loop that created them, so the
+# container keeps one loop for its lifetime instead of a new asyncio.run() loop per invocation
+_loop=None
+_pg=None
+_pg_last_used=0
+_pg_lock=None
+_redis=None
+_replica_redis=None
+
+def run(coro):
+	global _loop
+	if _loop is None or _loop.is_closed():
+		_loop=asyncio.new_event_loop()
+		asyncio.set_event_loop(_loop)
+	return _loop.run_until_complete(coro)
+
+async def cancel(task):
+	# Waits for the cancellation too, so nothing of the task is left on the loop for the next invocation
+	task.cancel()
+	await asyncio.gather(task, return_exceptions=True)
+
+async def get_aws_pass_async(key):
+	# The extension call stays on urllib in a worker thread and shares the sync secrets cache
+	return await asyncio.to_thread(get_aws_pass, key)
+
+async def shared_pg(password):
+	"""asyncpg counterpart of common.db.shared_db: one warm connection per container."""
+	global _pg_lock
+	if _pg_lock is None:
+		_pg_lock=asyncio.Lock()
+	# A connect left running by an earlier invocation is awaited instead of opening a second connection
+	async with _pg_lock:
+		return await _connect_pg(password)
+
+def pg_timeout_options():
+	# A transaction-mode pooler rejects server_settings at startup, asyncpg then cancels overlong statements itself
+	if TRANSACTION_POOLING:
+		return {"command_timeout": DB_STATEMENT_TIMEOUT_MS / 1000 or None}
+	return {"server_settings": {'statement_timeout': str(DB_STATEMENT_TIMEOUT_MS)}}
+
+async def _connect_pg(password):
+	import asyncpg
+	global _pg, _pg_last_used
+	if not breaker.postgres.allow():
+		return return_error(503, 'Database temporarily unavailable')
+	if _pg is not None and (_pg.is_closed() or time.monotonic() - _pg_last_used > DB_MAX_IDLE_SECONDS):
+		await discard_pg()
+	if _pg is None:
+		logger.info("Connecting to database")
+		try:
+			with metrics.stage("DbConnect"):
+				_pg=await asyncpg.connect(
+					database=config.DB_NAME,
+					user=config.DB_USER,
+					password=password,
+					port=config.DB_PORT,
+					host=config.DB_HOST,
+					timeout=DB_CONNECT_TIMEOUT_SECONDS,
+					# asyncpg prepares and caches every statement itself, which a transaction-mode pooler cannot follow
+					statement_cache_size=100 if PREPARED_STATEMENTS else 0,
+					**pg_timeout_options()
+				)
+		except (asyncpg.PostgresError, OSError) as e:
+			logger.error("Failed to connect to database: %s", e)
+			breaker.postgres.record_failure()
+			return return_error(500, 'Error connecting to database')
+		breaker.postgres.record_success()
+		profiling.mark("first_db_connected")
+	_pg_last_used=time.monotonic()
+	return _pg
+
+def pg_unavailable(error):
+	# asyncpg counterpart of common.db.is_unavailable
+	import asyncpg
+	return isinstance(error, (asyncpg.exceptions.PostgresConnectionError, asyncpg.exceptions.QueryCanceledError, asyncpg.InterfaceError, OSError))
+
+async def reset_pg(error):
+	# Counts lost connections and timeouts against the breaker and drops the connection they happened on
+	if pg_unavailable(error):
+		breaker.postgres.record_failure()
+		await discard_pg()
+
+async def discard_pg():
+	global _pg
+	conn, _pg=_pg, None
+	if conn is not None:
+		try:
+			await conn.close(timeout=1)
+		except Exception:
+			conn.terminate()
+
+def connect_async_redis(password, replicas=False):
+	import redis.asyncio as aioredis
+	from redis.asyncio.retry import Retry
+	from redis.backoff import ExponentialBackoff
+	from redis.exceptions import (
+	   BusyLoadingError,
+	   RedisError
+	)
+	logger.info("Connecting to Redis")
+	retry=Retry(ExponentialBackoff(), REDIS_RETRIES)
+	if REDIS_CLUSTER:
+		from redis.asyncio.cluster import RedisCluster
+		r=RedisCluster(retry=retry, retry_on_error=[BusyLoadingError, RedisError], **redis_options(password), **cluster_options(replicas))
+	else:
+		r=aioredis.Redis(retry=retry, retry_on_error=[BusyLoadingError, RedisError], **redis_options(password))
+	profiling.mark("first_redis_client")
+	return r
+
+def shared_async_redis(password):
+	"""redis.asyncio counterpart of common.cache.shared_redis, with the same retry settings."""
+	global _redis
+	if not breaker.redis.allow():
+		raise breaker.BreakerOpenError("redis circuit breaker is open")
+	if _redis is None:
+		_redis=connect_async_redis(password)
+	return _redis
+
+def shared_async_cache_redis(password):
+	"""redis.asyncio counterpart of common.cache.shared_cache_redis."""
+	global _replica_redis
+	if not (REDIS_CLUSTER and REDIS_READ_FROM_REPLICAS):
+		return shared_async_redis(password)
+	if not breaker.redis.allow():
+		raise breaker.BreakerOpenError("redis circuit breaker is open")
+	if _replica_redis is None:
+		_replica_redis=connect_async_redis(password, replicas=True)
+	return _replica_redis
@@ -0,0 +1,66 @@
+import os
+import time
+from contextlib import contextmanager
+from common import config  # loads .env before the lookups below
+from common import metrics
+from common.log import get_logger
+
+logger=get_logger(__name__)
+
+FAILURE_THRESHOLD=int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+RESET_SECONDS=float(os.environ.get('BREAKER_RESET_SECONDS', '30'))
+
+class BreakerOpenError(Exception):
+	pass
+
+class CircuitBreaker:
+	"""Per-container breaker for one dependency.
+
+	Opens after FAILURE_THRESHOLD consecutive failures and fails fast for RESET_SECONDS. Calls are
+	then let through again: the first success closes it and the first failure opens it again.
+	"""
+
+	def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_seconds=RESET_SECONDS):
+		self.name=name
+		self.failure_threshold=failure_threshold
+		self.reset_seconds=reset_seconds
+		self.failures=0
+		self.opened_at=None
+
+	def allow(self):
+		if self.opened_at is None or time.monotonic() - self.opened_at >= self.reset_seconds:
+			return True
+		metrics.set_property("BreakerOpen", self.name)
+		return False
+
+	def record_success(self):
+		if self.opened_at is not None:
+			logger.warning("Circuit breaker for %s closed", self.name)
+		self.failures=0
+		self.opened_at=None
+
+	def record_failure(self):
+		self.failures+=1
+		if self.failures >= self.failure_threshold:
+			if self.opened_at is None:
+				logger.warning("Circuit breaker for %s opened after %s failures", self.name, self.failures)
+			self.opened_at=time.monotonic()
+
+	@contextmanager
+	def guard(self, *counted):
+		"""Fails fast with BreakerOpenError while open, and records the outcome of the with-block.
+
+		Only exceptions of the counted types, all of them by default, are recorded as failures.
+		"""
+		if not self.allow():
+			raise BreakerOpenError("{} circuit breaker is open".format(self.name))
+		try:
+			yield
+		except Exception as e:
+			if isinstance(e, counted or Exception):
+				self.record_failure()
+			raise
+		self.record_success()
+
+postgres=CircuitBreaker("postgres")
+redis=CircuitBreaker("redis")
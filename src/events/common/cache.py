@@ -0,0 +1,217 @@
+import json
+import os
+from common import breaker
+from common import config
+from common import metrics
+from common import profiling
+from common.log import get_logger
+from common.responses import encode
+
+logger=get_logger(__name__)
+
+# The event list is written as numbered generations, {event_table:v1}:g42, and readers follow the
+# pointer key to the current one. CACHE_SCHEMA_VERSION starts a separate set of keys, so two layouts
+# can be served side by side. Every key of one layout shares the hash tag, and so one cluster slot,
+# which lets the scripts below reach the generation keys they build from the pointer.
+CACHE_SCHEMA_VERSION=int(os.environ.get('CACHE_SCHEMA_VERSION', '1'))
+CACHE_NAMESPACE='{{event_table:v{}}}'.format(CACHE_SCHEMA_VERSION)
+CACHE_POINTER_KEY=CACHE_NAMESPACE + ':current'
+CACHE_GENERATIONS_KEY=CACHE_NAMESPACE + ':generations'
+CACHE_COUNTER_KEY=CACHE_NAMESPACE + ':counter'
+GENERATION_PREFIX=CACHE_NAMESPACE + ':g'
+# Generations kept, the current one included, so the cache can be rolled back
+CACHE_KEEP_GENERATIONS=int(os.environ.get('CACHE_KEEP_GENERATIONS', '2'))
+
+# The scripts build generation keys as ARGV .. generation, which are not declared in KEYS. A cluster
+# routes a script by its KEYS, so this only works while the generation prefix shares their hash tag.
+
+# Resolves the pointer and reads the generation in one round trip
+READ_CACHE_SCRIPT = """
+local generation = redis.call('GET', KEYS[1])
+if not generation then
+	return false
+end
+return redis.call('GET', ARGV[1] .. generation)
+"""
+
+# Points readers at generation ARGV[1] unless a newer one is already current, then deletes the
+# generations ARGV[2] or more behind the current one. Returns the current generation.
+SWAP_CACHE_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1])) or 0
+local generation = tonumber(ARGV[1])
+if generation > current then
+	redis.call('SET', KEYS[1], generation)
+	current = generation
+end
+local cutoff = current - tonumber(ARGV[2])
+for _, old in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', cutoff)) do
+	redis.call('DEL', ARGV[3] .. old)
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', cutoff)
+return current
+"""
+
+# Points readers at the newest generation older than the current one that still exists
+ROLLBACK_CACHE_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1])) or 0
+for _, generation in ipairs(redis.call('ZREVRANGEBYSCORE', KEYS[2], '(' .. current, '-inf')) do
+	if redis.call('EXISTS', ARGV[1] .. generation) == 1 then
+		redis.call('SET', KEYS[1], generation)
+		return tonumber(generation)
+	end
+end
+return false
+"""
+# One key per month of calendar counts. The year is the hash tag, e.g. event_calendar:{2026}-02, so
+# a cluster keeps a year's months in one slot and a typical range is read from one node.
+CALENDAR_KEY_PREFIX='event_calendar:'
+# Promotion deletes the months it touches, the expiry only bounds a count cached from a read that raced a promotion
+CALENDAR_CACHE_SECONDS=int(os.environ.get('CALENDAR_CACHE_SECONDS', '86400'))
+_client=None
+# Short timeouts and a single retry, so a degraded Redis fails within a second or two instead of holding the invocation
+REDIS_CONNECT_TIMEOUT_SECONDS=float(os.environ.get('REDIS_CONNECT_TIMEOUT_SECONDS', '1'))
+REDIS_SOCKET_TIMEOUT_SECONDS=float(os.environ.get('REDIS_SOCKET_TIMEOUT_SECONDS', '1'))
+REDIS_RETRIES=int(os.environ.get('REDIS_RETRIES', '1'))
+# REDIS_URL and REDIS_PORT name any node of the cluster, the rest are discovered from it
+REDIS_CLUSTER=os.environ.get('REDIS_CLUSTER', 'false').lower() == 'true'
+# Cache reads may then trail the primaries by the replication delay, every other read stays on them
+REDIS_READ_FROM_REPLICAS=os.environ.get('REDIS_READ_FROM_REPLICAS', 'true').lower() == 'true'
+# Replaces the host the cluster nodes announce, for clients that reach them under another name
+REDIS_CLUSTER_REMAP_HOST=os.environ.get('REDIS_CLUSTER_REMAP_HOST', '')
+_replica_client=None
+
+def redis_options(password):
+	return {
+		"host": config.REDIS_URL,
+		"port": config.REDIS_PORT,
+		"password": password,
+		"username": config.REDIS_USERNAME,
+		"ssl": False,
+		"decode_responses": True,
+		"socket_connect_timeout": REDIS_CONNECT_TIMEOUT_SECONDS,
+		"socket_timeout": REDIS_SOCKET_TIMEOUT_SECONDS
+	}
+
+def remap_address(address):
+	return (REDIS_CLUSTER_REMAP_HOST or address[0], address[1])
+
+def cluster_options(replicas):
+	from redis.cluster import LoadBalancingStrategy
+	return {
+		"load_balancing_strategy": LoadBalancingStrategy.ROUND_ROBIN_REPLICAS if replicas else None,
+		"address_remap": remap_address if REDIS_CLUSTER_REMAP_HOST else None
+	}
+
+def connect_redis(password, replicas=False):
+	"""Connects to the single node, or to the cluster in REDIS_CLUSTER mode.
+
+	With replicas, cluster reads go to the replicas of each shard. Writes always go to the primaries.
+	"""
+	import redis
+	from redis.backoff import ExponentialBackoff
+	from redis.retry import Retry
+	from redis.exceptions import (
+	   BusyLoadingError,
+	   RedisError
+	)
+	logger.info("Connecting to Redis")
+	retry=Retry(ExponentialBackoff(), REDIS_RETRIES)
+	if REDIS_CLUSTER:
+		from redis.cluster import RedisCluster
+		r=RedisCluster(retry=retry, **redis_options(password), **cluster_options(replicas))
+	else:
+		r=redis.Redis(retry=retry, retry_on_error=[BusyLoadingError, RedisError], **redis_options(password))
+	profiling.mark("first_redis_client")
+	return r
+
+def shared_redis(password):
+	"""Returns the container's Redis client; it keeps its own connection pool, so one is shared by every handler.
+
+	Raises BreakerOpenError while the Redis breaker is open, callers already handle Redis being unavailable.
+	"""
+	global _client
+	if not breaker.redis.allow():
+		raise breaker.BreakerOpenError("redis circuit breaker is open")
+	if _client is None:
+		_client=connect_redis(password)
+	return _client
+
+def shared_cache_redis(password):
+	"""Returns the client for cache reads: one reading from replicas in cluster mode, otherwise shared_redis."""
+	global _replica_client
+	if not (REDIS_CLUSTER and REDIS_READ_FROM_REPLICAS):
+		return shared_redis(password)
+	if not breaker.redis.allow():
+		raise breaker.BreakerOpenError("redis circuit breaker is open")
+	if _replica_client is None:
+		_replica_client=connect_redis(password, replicas=True)
+	return _replica_client
+
+def generation_key(generation):
+	return "{}{}".format(GENERATION_PREFIX, generation)
+
+def write_event_cache(r, records):
+	"""Writes records as a new generation and then points readers at it, returns the generation.
+
+	Readers keep getting the previous generation until the swap, so a refresh never shows a partial
+	list. A generation that loses the swap to a newer one is left for the collection in later swaps.
+	"""
+	data=encode(records)
+	generation=r.incr(CACHE_COUNTER_KEY)
+	# Registered with its data so a writer that dies before the swap leaves nothing uncollected
+	with r.pipeline(transaction=False) as pipe:
+		pipe.zadd(CACHE_GENERATIONS_KEY, {generation: generation})
+		pipe.set(generation_key(generation), data)
+		pipe.execute()
+	current=r.eval(SWAP_CACHE_SCRIPT, 2, CACHE_POINTER_KEY, CACHE_GENERATIONS_KEY, generation, CACHE_KEEP_GENERATIONS, GENERATION_PREFIX)
+	if int(current) != generation:
+		logger.warning("Cache generation %s was superseded by %s before its swap", generation, current)
+	return generation
+
+def rollback_event_cache(r):
+	"""Points readers back at the previous generation still kept, returns it or None when there is none."""
+	return r.eval(ROLLBACK_CACHE_SCRIPT, 2, CACHE_POINTER_KEY, CACHE_GENERATIONS_KEY, GENERATION_PREFIX)
+
+def eval_read_cache(r):
+	# EVAL_RO lets a cluster replica serve the read but needs Redis 7, a single node keeps EVAL so 6.2 still works.
+	# Works for the redis.asyncio clients too, which return an awaitable instead.
+	if REDIS_CLUSTER and REDIS_READ_FROM_REPLICAS:
+		return r.eval_ro(READ_CACHE_SCRIPT, 1, CACHE_POINTER_KEY, GENERATION_PREFIX)
+	return r.eval(READ_CACHE_SCRIPT, 1, CACHE_POINTER_KEY, GENERATION_PREFIX)
+
+def read_event_cache(r):
+	"""Returns the current generation of the event list, or None when nothing is cached."""
+	with metrics.stage("RedisGet"):
+		data=eval_read_cache(r)
+	if not data:
+		return None
+	with metrics.stage("Deserialize"):
+		return json.loads(data)
+
+def calendar_key(month):
+	return "{}{{{}}}{}".format(CALENDAR_KEY_PREFIX, month[:4], month[4:])
+
+def read_calendar_cache(r, months):
+	"""Returns {month: counts} for the months that are cached, missing months are left out.
+
+	The GETs are pipelined rather than sent as one MGET, which a cluster rejects across slots. A
+	cluster pipeline sends one batch to each node holding some of the keys.
+	"""
+	with metrics.stage("RedisGet"), r.pipeline(transaction=False) as pipe:
+		for month in months:
+			pipe.get(calendar_key(month))
+		values=pipe.execute()
+	with metrics.stage("Deserialize"):
+		return {month: json.loads(value) for month, value in zip(months, values) if value is not None}
+
+def write_calendar_cache(r, counts):
+	with r.pipeline(transaction=False) as pipe:
+		for month, value in counts.items():
+			pipe.set(calendar_key(month), json.dumps(value), ex=CALENDAR_CACHE_SECONDS)
+		pipe.execute()
+
+def invalidate_calendar_cache(r, months):
+	with r.pipeline(transaction=False) as pipe:
+		for month in months:
+			pipe.delete(calendar_key(month))
+		pipe.execute()
@@ -0,0 +1,33 @@
+import os
+from common import log
+from common import profiling
+
+# Every module that reads the environment imports this first so .env is applied before any lookup
+DOTENV_LOADED=os.path.exists('.env')
+if DOTENV_LOADED:
+	from dotenv import load_dotenv
+	load_dotenv()
+
+# Configured after the .env load so LOG_LEVEL and LOG_SAMPLE_RATE from it apply
+log.configure()
+logger=log.get_logger(__name__)
+logger.info("Loaded environment from .env file" if DOTENV_LOADED else "No .env file")
+profiling.mark("dotenv_loaded")
+
+ENV=os.environ.get('ENV')
+AWS_SESSION_TOKEN=os.environ.get('AWS_SESSION_TOKEN')
+PARAMETERS_SECRETS_EXTENSION_URL=os.environ.get('PARAMETERS_SECRETS_EXTENSION_URL')
+
+DB_NAME=os.environ.get('DB_NAME')
+DB_USER=os.environ.get('DB_USER')
+DB_PORT=os.environ.get('DB_PORT')
+DB_HOST=os.environ.get('DB_HOST')
+# Comma separated host[:port] list of read replicas, empty to read from DB_HOST
+DB_READ_HOSTS=os.environ.get('DB_READ_HOSTS', '')
+DB_PASS_KEY=os.environ.get('DB_PASS_KEY')
+
+REDIS_URL=os.environ.get('REDIS_URL')
+REDIS_PORT=os.environ.get('REDIS_PORT')
+REDIS_USERNAME=os.environ.get('REDIS_USERNAME')
+REDIS_PASS_KEY=os.environ.get('REDIS_PASS_KEY')
+profiling.mark("environ_read")
@@ -0,0 +1,337 @@
+import os
+import random
+import re
+import time
+import weakref
+from common import breaker
+from common import config
+from common import metrics
+from common import profiling
+from common.responses import (
+    RowSet,
+    is_error,
+    return_error
+)
+from common.log import get_logger
+
+logger=get_logger(__name__)
+
+# Warm connections idle longer than this may have been dropped by the server or a NAT while the container was frozen
+DB_MAX_IDLE_SECONDS=int(os.environ.get('DB_MAX_IDLE_SECONDS', '300'))
+_conn=None
+_last_used=0
+# Bounds on how long a degraded database can hold an invocation, statement_timeout is enforced by the server
+DB_CONNECT_TIMEOUT_SECONDS=int(os.environ.get('DB_CONNECT_TIMEOUT_SECONDS', '3'))
+DB_STATEMENT_TIMEOUT_MS=int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '5000'))
+
+READ_HOSTS=[host.strip() for host in config.DB_READ_HOSTS.split(',') if host.strip()]
+REPLICA_MAX_LAG_SECONDS=float(os.environ.get('DB_REPLICA_MAX_LAG_SECONDS', '30'))
+# How often a warm replica connection has its lag checked again, and how long a failed replica is skipped
+REPLICA_CHECK_SECONDS=int(os.environ.get('DB_REPLICA_CHECK_SECONDS', '10'))
+REPLICA_RETRY_SECONDS=int(os.environ.get('DB_REPLICA_RETRY_SECONDS', '30'))
+REPLICA_CONNECT_TIMEOUT_SECONDS=int(os.environ.get('DB_REPLICA_CONNECT_TIMEOUT_SECONDS', '2'))
+_read_conn=None
+_read_host=None
+_read_checked=0
+_read_last_used=0
+_replica_down={}
+
+# Recovery state, whether everything received is replayed, whether the WAL receiver is streaming from the
+# primary, and the age of the last replayed transaction, NULL when it never replayed one. See replica_lag.
+REPLICA_STATUS="""SELECT pg_is_in_recovery(), pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn(),
+	EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming'),
+	EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp());"""
+
+# Named prepared statements live on one server connection. Behind a transaction-mode pooler the next
+# EXECUTE can land on a different one, so the handlers send plain SQL in that mode.
+DB_POOL_MODE=os.environ.get('DB_POOL_MODE', 'session').lower()
+TRANSACTION_POOLING=DB_POOL_MODE == 'transaction'
+PREPARED_STATEMENTS=os.environ.get('DB_PREPARED_STATEMENTS', 'true').lower() == 'true' and not TRANSACTION_POOLING
+_pooled_connection=None
+# Statement names already prepared on each connection, dropped with the connection
+_prepared=weakref.WeakKeyDictionary()
+
+# The one definition of a visible event, used by every read path: the full list and its cache, since=,
+# search, nearby, the calendar counts and the snapshot. since= tombstones events that stop matching it.
+VISIBLE_EVENT="event.approved"
+
+# Delta sync. Versions are the id of the transaction that last wrote the row, and the version handed
+# back is the oldest transaction still running, read before the changes. Anything not yet committed
+# then has a version at or above it, so the next sync picks it up instead of skipping it.
+CHANGES_VERSION="Select pg_snapshot_xmin(pg_current_snapshot())::text::bigint version;"
+CHANGED_EVENTS="""Select event.id, event.version, name, time, price, description, link, craft, kids, date, business, location_name, address, city, state, zip
+from event LEFT JOIN location on event.location_id=location.id
+where event.version >= %s and {}
+order by event.version, event.id;""".format(VISIBLE_EVENT)
+DELETED_EVENTS="Select event_id from event_tombstone where version >= %s order by version, event_id;"
+SELECT_ALL="Select name, time, price, description, link, craft,kids, date, business, location_name, address, city, state, zip from event LEFT JOIN location on event.location_id=location.id where {};".format(VISIBLE_EVENT)
+
+def pg_connection(password, host=None, port=None):
+	return {
+		'dbname': config.DB_NAME,
+		'user': config.DB_USER,
+		'password': password,
+		'port': port or config.DB_PORT,
+		'host': host or config.DB_HOST
+	}
+
+def pooled_connection():
+	"""Returns the psycopg2 connection class used behind a transaction-mode pooler.
+
+	Such a pooler rejects the options startup parameter and hands every transaction to any server
+	connection, so a session setting would not follow the client. Instead each transaction starts
+	with SET LOCAL statement_timeout, which ends with it.
+	"""
+	global _pooled_connection
+	if _pooled_connection is None:
+		import psycopg2.extensions
+
+		class PooledConnection(psycopg2.extensions.connection):
+			statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS
+
+			def cursor(self, *args, **kwargs):
+				cur=super().cursor(*args, **kwargs)
+				# The first statement opens the transaction, a named cursor would wrap it in DECLARE
+				if cur.name is None and self.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+					cur.execute("SET LOCAL statement_timeout = %s", (self.statement_timeout_ms,))
+				return cur
+		_pooled_connection=PooledConnection
+	return _pooled_connection
+
+def connect_db(password, host=None, port=None, connect_timeout=None, statement_timeout_ms=None, use_breaker=True):
+	"""Opens a connection with the configured timeouts; statement_timeout_ms=0 leaves statements unbounded.
+
+	Connections to the primary go through its circuit breaker, replicas pass use_breaker=False.
+	With DB_POOL_MODE=transaction the timeout is set per transaction, see pooled_connection.
+	"""
+	# psycopg2 is imported here so handlers that never reach Postgres do not pay for it
+	import psycopg2
+	circuit=breaker.postgres if use_breaker else None
+	if circuit is not None and not circuit.allow():
+		return return_error(503, 'Database temporarily unavailable')
+	if statement_timeout_ms is None:
+		statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS
+	logger.info("Connecting to database")
+	try:
+		with metrics.stage("DbConnect"):
+			if TRANSACTION_POOLING:
+				conn=psycopg2.connect(
+					**pg_connection(password, host, port),
+					connect_timeout=connect_timeout or DB_CONNECT_TIMEOUT_SECONDS,
+					connection_factory=pooled_connection()
+				)
+				conn.statement_timeout_ms=statement_timeout_ms
+			else:
+				conn=psycopg2.connect(
+					**pg_connection(password, host, port),
+					connect_timeout=connect_timeout or DB_CONNECT_TIMEOUT_SECONDS,
+					options="-c statement_timeout={}".format(statement_timeout_ms)
+				)
+	except psycopg2.Error as e:
+		logger.error("Failed to connect to database with code: %s and error: %s", e.pgcode, e.pgerror)
+		if circuit is not None:
+			circuit.record_failure()
+		return return_error(500, 'Error connecting to database')
+	if circuit is not None:
+		circuit.record_success()
+	profiling.mark("first_db_connected")
+	return conn
+
+def is_unavailable(error):
+	# Lost connections and statement timeouts (QueryCanceledError) are both OperationalError
+	import psycopg2
+	return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+def shared_db(password):
+	"""Returns the container's warm connection, shared by every handler in it, connecting when there is none."""
+	global _conn, _last_used
+	if not breaker.postgres.allow():
+		return return_error(503, 'Database temporarily unavailable')
+	if _conn is not None and (_conn.closed or time.monotonic() - _last_used > DB_MAX_IDLE_SECONDS):
+		discard_db()
+	if _conn is None:
+		conn=connect_db(password)
+		if is_error(conn):
+			return conn
+		_conn=conn
+	_last_used=time.monotonic()
+	return _conn
+
+def reset_db(error=None):
+	# Called after a failed statement so the next request does not inherit an aborted transaction
+	if error is not None and is_unavailable(error):
+		breaker.postgres.record_failure()
+	if _conn is None:
+		return
+	try:
+		_conn.rollback()
+	except Exception:
+		discard_db()
+
+def record_db_success(conn):
+	# Closes a half-open breaker once the primary answers a statement again
+	if conn is _conn:
+		breaker.postgres.record_success()
+
+def discard_db():
+	global _conn
+	conn, _conn=_conn, None
+	if conn is not None:
+		try:
+			conn.close()
+		except Exception:
+			pass
+
+def to_positional(sql):
+	# PREPARE takes $n parameters where psycopg2 takes %s
+	count=iter(range(1, sql.count('%s') + 1))
+	return re.sub(r'%s', lambda match: '${}'.format(next(count)), sql).rstrip().rstrip(';')
+
+def execute_prepared(cur, name, sql, params=None):
+	"""Runs sql as a statement PREPAREd once per connection, or as plain SQL when prepared statements are off.
+
+	Postgres parses the statement once, and after five executions can reuse a generic plan instead of
+	planning every call. Prepared statements outlive the transaction, so rollbacks do not undo them.
+	"""
+	if not PREPARED_STATEMENTS:
+		cur.execute(sql, params)
+		return
+	prepared=_prepared.setdefault(cur.connection, set())
+	if name not in prepared:
+		cur.execute("PREPARE {} AS {}".format(name, to_positional(sql)))
+		prepared.add(name)
+	if params:
+		cur.execute("EXECUTE {} ({})".format(name, ", ".join(["%s"] * len(params))), params)
+	else:
+		cur.execute("EXECUTE {}".format(name))
+
+def fetch_rowset(cur):
+	# Rows of a plain cursor stay tuples, no dict is built per row
+	rows=cur.fetchall()
+	return RowSet([column.name for column in cur.description], rows)
+
+def fetch_events(conn):
+	"""Returns every event as a RowSet."""
+	with metrics.stage("DbQuery"), conn.cursor() as cur:
+		execute_prepared(cur, "select_all_events", SELECT_ALL)
+		events=fetch_rowset(cur)
+	# Ends the read transaction so the warm connection is not left idle in transaction
+	conn.rollback()
+	return events
+
+def fetch_changes(conn, since):
+	"""Returns the visible events written, as a RowSet, and the ids deleted or hidden at or after version since.
+
+	The bound is inclusive, so rows can repeat across syncs. Applying them again changes nothing.
+	"""
+	with metrics.stage("DbQuery"), conn.cursor() as cur:
+		# Must run before the reads below, see CHANGES_VERSION
+		cur.execute(CHANGES_VERSION)
+		version=cur.fetchone()[0]
+		execute_prepared(cur, "changed_events", CHANGED_EVENTS, (since,))
+		records=fetch_rowset(cur)
+		execute_prepared(cur, "deleted_events", DELETED_EVENTS, (since,))
+		deleted=[event_id for event_id, in cur.fetchall()]
+	conn.rollback()
+	return {"version": version, "found_events": records, "deleted": deleted}
+
+def split_host(entry):
+	host, _, port=entry.partition(':')
+	return host, port or None
+
+def replica_lag(conn):
+	with conn.cursor() as cur:
+		cur.execute(REPLICA_STATUS)
+		in_recovery, caught_up, streaming, age=cur.fetchone()
+	conn.rollback()
+	# A replica that replayed everything is current even when the primary has been idle, but only while
+	# its receiver is streaming. With the receiver down it has nothing new to replay however far behind it is.
+	if not in_recovery or (caught_up and streaming):
+		return 0.0
+	return None if age is None else float(age)
+
+def replica_usable(conn, entry):
+	try:
+		lag=replica_lag(conn)
+	except Exception as e:
+		logger.warning("Replica %s failed its lag check: %s", entry, e)
+		return False
+	if lag is None or lag > REPLICA_MAX_LAG_SECONDS:
+		logger.warning("Replica %s is %s seconds behind, skipping it", entry, lag)
+		return False
+	return True
+
+def mark_replica_down(entry):
+	_replica_down[entry]=time.monotonic() + REPLICA_RETRY_SECONDS
+
+def replica_candidates():
+	# Shuffled so containers spread their reads over the replicas
+	now=time.monotonic()
+	candidates=[entry for entry in READ_HOSTS if _replica_down.get(entry, 0) <= now]
+	random.shuffle(candidates)
+	return candidates
+
+def connect_replica(password):
+	for entry in replica_candidates():
+		host, port=split_host(entry)
+		conn=connect_db(password, host, port, connect_timeout=REPLICA_CONNECT_TIMEOUT_SECONDS, use_breaker=False)
+		if is_error(conn):
+			mark_replica_down(entry)
+			continue
+		if not replica_usable(conn, entry):
+			conn.close()
+			mark_replica_down(entry)
+			continue
+		return entry, conn
+	return None, None
+
+def shared_read_db(password):
+	"""Returns a warm connection to a healthy read replica, or the primary's when none is usable.
+
+	Replicas that fail to connect or lag more than DB_REPLICA_MAX_LAG_SECONDS are skipped for
+	DB_REPLICA_RETRY_SECONDS. Writes keep using shared_db.
+	"""
+	global _read_conn, _read_host, _read_checked, _read_last_used
+	now=time.monotonic()
+	if _read_conn is not None:
+		if _read_conn.closed or now - _read_last_used > DB_MAX_IDLE_SECONDS:
+			discard_read_db()
+		elif now - _read_checked > REPLICA_CHECK_SECONDS:
+			if replica_usable(_read_conn, _read_host):
+				_read_checked=now
+			else:
+				mark_replica_down(_read_host)
+				discard_read_db()
+	if _read_conn is None and READ_HOSTS:
+		_read_host, _read_conn=connect_replica(password)
+		_read_checked=now
+	if _read_conn is None:
+		metrics.set_property("ReadTarget", "primary")
+		return shared_db(password)
+	metrics.set_property("ReadTarget", _read_host)
+	_read_last_used=now
+	return _read_conn
+
+def reset_read_db(error=None):
+	# Counterpart of reset_db for connections from shared_read_db, a replica that breaks or times out is skipped for a while
+	if _read_conn is None:
+		reset_db(error)
+		return
+	if error is not None and is_unavailable(error):
+		mark_replica_down(_read_host)
+		discard_read_db()
+		return
+	try:
+		_read_conn.rollback()
+	except Exception:
+		mark_replica_down(_read_host)
+		discard_read_db()
+
+def discard_read_db():
+	global _read_conn, _read_host
+	conn, _read_conn, _read_host=_read_conn, None, None
+	if conn is not None:
+		try:
+			conn.close()
+		except Exception:
+			pass
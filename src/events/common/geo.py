@@ -0,0 +1,57 @@
+import csv
+import math
+import os
+from common import config  # loads .env before the lookups below
+from common.log import get_logger
+
+logger=get_logger(__name__)
+
+EARTH_RADIUS_KM=6371.0088
+# Bundled with the Lambda so geocoding never leaves the container. A Census ZCTA gazetteer file works too.
+ZIP_CENTROIDS_PATH=os.environ.get('ZIP_CENTROIDS_PATH', os.path.join(os.path.dirname(__file__), 'zip_centroids.csv'))
+
+_centroids=None
+
+def load_centroids(path=ZIP_CENTROIDS_PATH):
+	"""Reads zip,latitude,longitude rows, or the tab separated GEOID/INTPTLAT/INTPTLONG gazetteer columns."""
+	with open(path, newline='') as f:
+		delimiter='\t' if '\t' in f.readline() else ','
+		f.seek(0)
+		reader=csv.reader(f, delimiter=delimiter)
+		header=[column.strip().lower() for column in next(reader)]
+		if 'geoid' in header:
+			columns=(header.index('geoid'), header.index('intptlat'), header.index('intptlong'))
+		else:
+			columns=(header.index('zip'), header.index('latitude'), header.index('longitude'))
+		return {row[columns[0]].strip(): (float(row[columns[1]]), float(row[columns[2]])) for row in reader if row}
+
+def centroid(zip_code):
+	"""Returns (latitude, longitude) for a zip code, or None when it is not in the table."""
+	global _centroids
+	if _centroids is None:
+		_centroids=load_centroids()
+		logger.info("Loaded %s zip centroids", len(_centroids))
+	if not zip_code:
+		return None
+	# ZIP+4 codes share the centroid of their five digit zip
+	return _centroids.get(zip_code.strip()[:5])
+
+def haversine_km(lat1, lon1, lat2, lon2):
+	lat1, lon1, lat2, lon2=map(math.radians, (lat1, lon1, lat2, lon2))
+	a=math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+	return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def bounding_box(lat, lon, radius_km):
+	"""Returns (min_lat, max_lat, min_lon, max_lon) enclosing every point within radius_km.
+
+	The box is only a prefilter for the index, it admits corners outside the circle. Near a pole
+	it widens to every longitude. Boxes crossing the antimeridian are clamped to it.
+	"""
+	delta_lat=math.degrees(radius_km / EARTH_RADIUS_KM)
+	min_lat=max(-90.0, lat - delta_lat)
+	max_lat=min(90.0, lat + delta_lat)
+	if min_lat == -90.0 or max_lat == 90.0:
+		return min_lat, max_lat, -180.0, 180.0
+	# The widest longitude span of the circle is at the latitude furthest from the equator
+	delta_lon=math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+	return min_lat, max_lat, max(-180.0, lon - delta_lon), min(180.0, lon + delta_lon)
@@ -0,0 +1,64 @@
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+_configured=False
+_base_level=logging.INFO
+_sample_rate=1.0
+_request_id=None
+
+class JsonFormatter(logging.Formatter):
+	"""One JSON object per line; the message is only %-formatted here, after the level check passed."""
+
+	def format(self, record):
+		entry={
+			"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + ".%03dZ" % record.msecs,
+			"level": record.levelname,
+			"logger": record.name,
+			"message": record.getMessage()
+		}
+		if _request_id:
+			entry["request_id"]=_request_id
+		fields=getattr(record, "fields", None)
+		if fields:
+			entry.update(fields)
+		if record.exc_info:
+			entry["exception"]=self.formatException(record.exc_info)
+		return json.dumps(entry, default=str)
+
+def configure():
+	"""Replaces the root handlers, including the one the Lambda runtime installs, with a single JSON handler."""
+	global _configured, _base_level, _sample_rate
+	_base_level=logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+	if not isinstance(_base_level, int):
+		_base_level=logging.INFO
+	_sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', '1'))
+	handler=logging.StreamHandler(sys.stdout)
+	handler.setFormatter(JsonFormatter())
+	root=logging.getLogger()
+	root.handlers=[handler]
+	root.setLevel(_base_level)
+	_configured=True
+
+def get_logger(name):
+	if not _configured:
+		configure()
+	return logging.getLogger(name)
+
+def start_request(context=None):
+	"""Tags log lines with the request id and decides whether this request logs below WARNING.
+
+	Unsampled requests raise the root level instead of filtering records, so their info() calls
+	return at the level check without building a record. Warnings and errors are always logged.
+	"""
+	global _request_id
+	_request_id=getattr(context, "aws_request_id", None)
+	sampled=_sample_rate >= 1 or random.random() < _sample_rate
+	level=_base_level if sampled else max(_base_level, logging.WARNING)
+	root=logging.getLogger()
+	if root.level != level:
+		root.setLevel(level)
+	return sampled
@@ -0,0 +1,106 @@
+import functools
+import json
+import os
+import time
+from contextlib import nullcontext
+from common import config  # loads .env before the lookups below
+
+METRICS_ENABLED=os.environ.get('METRICS_ENABLED', 'false').lower() == 'true'
+METRICS_NAMESPACE=os.environ.get('METRICS_NAMESPACE', 'DCCraftEvents')
+
+# Shared no-op returned by stage() when no invocation is being recorded, so disabled metrics cost one global lookup
+_NULL_STAGE=nullcontext()
+_current=None
+_cold_start=True
+
+class Invocation:
+	"""Collects the timings and values of one handler invocation and prints them as a CloudWatch EMF line."""
+
+	def __init__(self, handler, cold_start):
+		self.handler=handler
+		self.values={"ColdStart": 1 if cold_start else 0}
+		self.units={"ColdStart": "Count"}
+		self.properties={}
+
+	def set_property(self, name, value):
+		self.properties[name]=value
+
+	def record(self, name, value, unit="Count"):
+		self.values[name]=value
+		self.units[name]=unit
+
+	def stage(self, name):
+		return _Stage(self, name)
+
+	def to_emf(self):
+		return {
+			"_aws": {
+				"Timestamp": int(time.time() * 1000),
+				"CloudWatchMetrics": [{
+					"Namespace": METRICS_NAMESPACE,
+					"Dimensions": [["Handler"]],
+					"Metrics": [{"Name": name, "Unit": unit} for name, unit in self.units.items()]
+				}]
+			},
+			"Handler": self.handler,
+			**self.properties,
+			**self.values
+		}
+
+	def emit(self):
+		# EMF lines must be bare JSON on stdout, the logging format would prefix them
+		print(json.dumps(self.to_emf()), flush=True)
+
+class _Stage:
+
+	def __init__(self, invocation, name):
+		self.invocation=invocation
+		self.name=name
+
+	def __enter__(self):
+		self.start=time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		elapsed=(time.perf_counter() - self.start) * 1000
+		previous=self.invocation.values.get(self.name, 0)
+		self.invocation.record(self.name, previous + elapsed, "Milliseconds")
+		return False
+
+def stage(name):
+	"""Times the with-block as the metric name, adding to it if the stage runs more than once."""
+	if _current is None:
+		return _NULL_STAGE
+	return _current.stage(name)
+
+def record(name, value, unit="Count"):
+	if _current is not None:
+		_current.record(name, value, unit)
+
+def set_property(name, value):
+	if _current is not None:
+		_current.set_property(name, value)
+
+def instrument(handler):
+	"""Wraps a lambda_handler so each call emits one EMF line; returns it untouched when metrics are disabled."""
+	def wrap(fn):
+		if not METRICS_ENABLED:
+			return fn
+
+		@functools.wraps(fn)
+		def wrapper(event, context):
+			global _current, _cold_start
+			_current=Invocation(handler, _cold_start)
+			_cold_start=False
+			invocation=_current
+			try:
+				with invocation.stage("Total"):
+					response=fn(event, context)
+				if isinstance(response, dict):
+					invocation.set_property("StatusCode", response.get("statusCode"))
+				return response
+			finally:
+				_current=None
+				invocation.emit()
+		return wrapper
+	return wrap
@@ -0,0 +1,46 @@
+def query_params(event):
+	"""Returns the query string of an API Gateway proxy event, or the keys of a direct invocation."""
+	if not isinstance(event, dict):
+		return {}
+	if "requestContext" in event or "queryStringParameters" in event:
+		return event.get("queryStringParameters") or {}
+	return event
+
+def int_param(params, name, default, minimum=None, maximum=None):
+	"""Parses an integer parameter, raising ValueError with a message that can be returned to the client."""
+	value=params.get(name)
+	if value is None or value == '':
+		return default
+	try:
+		number=int(value)
+	except (TypeError, ValueError):
+		raise ValueError("{} must be a whole number".format(name))
+	if minimum is not None and number < minimum:
+		raise ValueError("{} must be at least {}".format(name, minimum))
+	if maximum is not None and number > maximum:
+		raise ValueError("{} must be at most {}".format(name, maximum))
+	return number
+
+def float_param(params, name, default=None, minimum=None, maximum=None):
+	"""Parses a number parameter like int_param, rejecting nan and infinity."""
+	value=params.get(name)
+	if value is None or value == '':
+		return default
+	try:
+		number=float(value)
+	except (TypeError, ValueError):
+		raise ValueError("{} must be a number".format(name))
+	if number != number or number in (float('inf'), float('-inf')):
+		raise ValueError("{} must be a number".format(name))
+	if minimum is not None and number < minimum:
+		raise ValueError("{} must be at least {}".format(name, minimum))
+	if maximum is not None and number > maximum:
+		raise ValueError("{} must be at most {}".format(name, maximum))
+	return number
+
+def columnar_format(params):
+	"""Returns True for format=columnar, False for the default dict per row."""
+	value=params.get("format") or "rows"
+	if value not in ("rows", "columnar"):
+		raise ValueError("format must be rows or columnar")
+	return value == "columnar"
@@ -0,0 +1,128 @@
+import functools
+import json
+import os
+import sys
+import time
+
+# Read straight from os.environ, this module is imported before config so it can time the .env load
+PROFILE_ENABLED=os.environ.get('COLD_START_PROFILE', 'false').lower() == 'true'
+PROFILE_PATH=os.environ.get('COLD_START_PROFILE_PATH', '/tmp/cold_start_profile.json')
+PROFILE_TOP=int(os.environ.get('COLD_START_PROFILE_TOP', '15'))
+
+_origin=time.perf_counter()
+_phases=[]
+_roots=[]
+_stack=[]
+_finder=None
+_profiled=False
+
+def _elapsed_ms(start):
+	return round((time.perf_counter() - start) * 1000, 3)
+
+def mark(phase):
+	"""Records the first time an init phase is reached, relative to when profiling started."""
+	if PROFILE_ENABLED and not _profiled and phase not in {name for name, _ in _phases}:
+		_phases.append((phase, _elapsed_ms(_origin)))
+
+class _TimingLoader:
+	"""Wraps a loader so executing the module is timed as a node in the import tree."""
+
+	def __init__(self, loader, find_ms):
+		self.loader=loader
+		self.find_ms=find_ms
+
+	def create_module(self, spec):
+		return self.loader.create_module(spec)
+
+	def exec_module(self, module):
+		node={"module": module.__name__, "find_ms": self.find_ms, "children": []}
+		(_stack[-1]["children"] if _stack else _roots).append(node)
+		_stack.append(node)
+		start=time.perf_counter()
+		try:
+			self.loader.exec_module(module)
+		finally:
+			_stack.pop()
+			node["total_ms"]=round(_elapsed_ms(start) + self.find_ms, 3)
+			node["self_ms"]=round(node["total_ms"] - sum(child["total_ms"] for child in node["children"]), 3)
+			# Hand the module its real loader back so nothing downstream sees the wrapper
+			module.__loader__=self.loader
+			if getattr(module, "__spec__", None) is not None:
+				module.__spec__.loader=self.loader
+
+	def __getattr__(self, name):
+		return getattr(self.loader, name)
+
+class _TimingFinder:
+	"""Meta path finder that defers to the real finders and wraps the loader they return."""
+
+	def find_spec(self, name, path, target=None):
+		start=time.perf_counter()
+		for finder in sys.meta_path:
+			if finder is self or not hasattr(finder, "find_spec"):
+				continue
+			spec=finder.find_spec(name, path, target)
+			if spec is not None:
+				if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+					spec.loader=_TimingLoader(spec.loader, _elapsed_ms(start))
+				return spec
+		return None
+
+def _flatten(nodes):
+	for node in nodes:
+		yield node
+		yield from _flatten(node["children"])
+
+def build_profile(first_invocation_ms):
+	imports=list(_flatten(_roots))
+	return {
+		"phases": [{"phase": name, "at_ms": at} for name, at in _phases],
+		"first_invocation_ms": first_invocation_ms,
+		"import_total_ms": round(sum(node["total_ms"] for node in _roots), 3),
+		"top_imports": [
+			{"module": node["module"], "self_ms": node["self_ms"], "total_ms": node["total_ms"]}
+			for node in sorted(imports, key=lambda node: node["self_ms"], reverse=True)[:PROFILE_TOP]
+		],
+		"import_tree": _roots
+	}
+
+def _stop():
+	global _finder
+	if _finder in sys.meta_path:
+		sys.meta_path.remove(_finder)
+	_finder=None
+
+def write_profile(profile):
+	try:
+		with open(PROFILE_PATH, "w") as f:
+			json.dump(profile, f)
+	except OSError as e:
+		print(json.dumps({"cold_start_profile_error": str(e)}), flush=True)
+	summary={key: value for key, value in profile.items() if key != "import_tree"}
+	print(json.dumps({"cold_start_profile": summary, "path": PROFILE_PATH}), flush=True)
+
+def profile_cold_start(fn):
+	"""Writes the profile once the first invocation, and with it the first connections, has finished."""
+	if not PROFILE_ENABLED:
+		return fn
+
+	@functools.wraps(fn)
+	def wrapper(event, context):
+		global _profiled
+		if _profiled:
+			return fn(event, context)
+		mark("handler_start")
+		start=time.perf_counter()
+		try:
+			return fn(event, context)
+		finally:
+			mark("handler_end")
+			_stop()
+			_profiled=True
+			write_profile(build_profile(_elapsed_ms(start)))
+	return wrapper
+
+if PROFILE_ENABLED:
+	_finder=_TimingFinder()
+	sys.meta_path.insert(0, _finder)
+	mark("profiling_start")
@@ -0,0 +1,123 @@
+import json
+import math
+from datetime import (
+    date,
+    time
+)
+from json.encoder import encode_basestring_ascii
+from common import metrics
+
+# Rows encoded together, column by column
+ROW_CHUNK=1000
+_BOOLEANS={True: "true", False: "false"}
+
+def encode_float(value):
+	# repr is what json.dumps writes for finite floats, NaN and Infinity are left to it
+	return repr(value) if math.isfinite(value) else json.dumps(value)
+
+def encode_text(value):
+	return encode_basestring_ascii(str(value))
+
+def encode_value(value):
+	return json.dumps(value, default=str)
+
+def encode_column(values):
+	"""Returns the JSON text of each value, with one encoder picked from the types in the column."""
+	kinds=set(map(type, values))
+	nullable=type(None) in kinds
+	kinds.discard(type(None))
+	if kinds <= {str}:
+		encoder=encode_basestring_ascii
+	elif kinds <= {date, time}:
+		encoder=encode_text
+	elif kinds <= {bool}:
+		encoder=_BOOLEANS.__getitem__
+	elif kinds <= {int}:
+		encoder=int.__repr__
+	elif kinds <= {float}:
+		encoder=encode_float
+	else:
+		encoder=encode_value
+	if nullable:
+		return [encoder(value) if value is not None else "null" for value in values]
+	return list(map(encoder, values))
+
+class RowSet:
+	"""Query rows kept as tuples sharing one list of column names, instead of a dict per row.
+
+	success() writes it as the same list of objects json.dumps gives for dict rows, without building them.
+	"""
+	__slots__=("columns", "rows")
+
+	def __init__(self, columns, rows):
+		self.columns=columns
+		self.rows=rows
+
+	def __len__(self):
+		return len(self.rows)
+
+	def __iter__(self):
+		# Dict rows on demand, for callers that need them
+		return (dict(zip(self.columns, row)) for row in self.rows)
+
+	def json_parts(self):
+		# Each row fills a template holding the encoded column names
+		template="{" + ", ".join(json.dumps(column).replace("%", "%%") + ": %s" for column in self.columns) + "}"
+		yield "["
+		for start in range(0, len(self.rows), ROW_CHUNK):
+			if start:
+				yield ", "
+			columns=[encode_column(values) for values in zip(*self.rows[start:start + ROW_CHUNK])]
+			yield ", ".join(map(template.__mod__, zip(*columns)))
+		yield "]"
+
+	def to_json(self):
+		return "".join(self.json_parts())
+
+def encode(value):
+	return value.to_json() if isinstance(value, RowSet) else json.dumps(value, default=str)
+
+def return_error(code, message):
+	return {
+		"statusCode": code,
+		"message": message
+	}
+
+def is_error(result):
+	# Helpers return an error response dict in place of the resource they failed to create
+	return isinstance(result, dict) and "statusCode" in result
+
+def success(status_code=200, **body):
+	with metrics.stage("Serialize"):
+		body={
+			"message": "Accepted" if status_code == 202 else "Successful",
+			**body
+		}
+		if any(isinstance(value, RowSet) for value in body.values()):
+			# Same text json.dumps would give, joined once so the rows are not copied into a second string
+			parts=["{"]
+			for key, value in body.items():
+				parts.append((", " if len(parts) > 1 else "") + json.dumps(key) + ": ")
+				if isinstance(value, RowSet):
+					parts.extend(value.json_parts())
+				else:
+					parts.append(json.dumps(value, default=str))
+			parts.append("}")
+			payload="".join(parts)
+		else:
+			payload=json.dumps(body, default=str)
+	metrics.record("PayloadBytes", len(payload), "Bytes")
+	return {
+		"statusCode": status_code,
+		"body": payload
+	}
+
+def columnar(records):
+	"""Turns rows into one header and lists of values, for responses with format=columnar."""
+	if isinstance(records, RowSet):
+		return {"columns": records.columns, "rows": records.rows}
+	columns=list(records[0]) if records else []
+	return {
+		"columns": columns,
+		"rows": [[record[column] for column in columns] for record in records]
+	}
@@ -0,0 +1,39 @@
+import json
+import os
+import time
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+from common import config
+from common import metrics
+from common import profiling
+from common.responses import return_error
+from common.log import get_logger
+
+logger=get_logger(__name__)
+
+# Fetched values are kept for the life of a warm container, so every handler sharing it pays for one lookup
+SECRETS_CACHE_SECONDS=int(os.environ.get('SECRETS_CACHE_SECONDS', '300'))
+_cache={}
+# A stalled extension fails the lookup instead of holding the invocation until the Lambda timeout
+SECRETS_TIMEOUT_SECONDS=float(os.environ.get('SECRETS_TIMEOUT_SECONDS', '2'))
+
+def get_aws_pass(password):
+	cached=_cache.get(password)
+	if cached is not None and time.monotonic() - cached[1] < SECRETS_CACHE_SECONDS:
+		return cached[0]
+	# urllib is used instead of requests, which alone was the largest import on every cold start
+	try:
+		url_config=config.PARAMETERS_SECRETS_EXTENSION_URL+"/systemsmanager/parameters/get"
+		logger.debug("Parameter getter has started with url %s", url_config)
+		req=Request(
+			url_config+"?"+urlencode({"name": password, "withDecryption": "true"}),
+			headers={"X-Aws-Parameters-Secrets-Token": config.AWS_SESSION_TOKEN}
+			)
+		with metrics.stage("SecretFetch"), urlopen(req, timeout=SECRETS_TIMEOUT_SECONDS) as res:
+			found_pass=json.loads(res.read())['Parameter']['Value']
+	except Exception as e:
+		logger.error("Parameter retrieval failed: %s", e)
+		return return_error(500, 'Server parameter retrieval error')
+	profiling.mark("first_secret_fetched")
+	_cache[password]=(found_pass, time.monotonic())
+	return found_pass
@@ -0,0 +1,72 @@
+import pytest
+from common import breaker
+from common.breaker import (
+    BreakerOpenError,
+    CircuitBreaker
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+class TestCircuitBreaker:
+
+    def test_opens_after_consecutive_failures(self, clock):
+        circuit = CircuitBreaker("postgres", failure_threshold=3, reset_seconds=30)
+        circuit.record_failure()
+        circuit.record_failure()
+        assert circuit.allow()
+        circuit.record_failure()
+        assert not circuit.allow()
+
+    def test_success_resets_the_count(self, clock):
+        circuit = CircuitBreaker("postgres", failure_threshold=2, reset_seconds=30)
+        circuit.record_failure()
+        circuit.record_success()
+        circuit.record_failure()
+        assert circuit.allow()
+
+    def test_half_open_after_reset_period(self, clock):
+        circuit = CircuitBreaker("redis", failure_threshold=1, reset_seconds=30)
+        circuit.record_failure()
+        clock[0] += 30
+        assert circuit.allow()
+        # One more failure reopens it straight away
+        circuit.record_failure()
+        assert not circuit.allow()
+        clock[0] += 30
+        circuit.record_success()
+        assert circuit.allow()
+        assert circuit.failures == 0
+
+
+class TestGuard:
+
+    def test_open_breaker_fails_fast(self, clock):
+        circuit = CircuitBreaker("redis", failure_threshold=1, reset_seconds=30)
+        circuit.record_failure()
+        with pytest.raises(BreakerOpenError):
+            with circuit.guard():
+                pytest.fail("guarded call ran while open")
+
+    def test_only_counted_errors_are_failures(self, clock):
+        circuit = CircuitBreaker("postgres", failure_threshold=1, reset_seconds=30)
+        with pytest.raises(ValueError):
+            with circuit.guard(TimeoutError):
+                raise ValueError("duplicate row")
+        assert circuit.allow()
+        with pytest.raises(TimeoutError):
+            with circuit.guard(TimeoutError):
+                raise TimeoutError("statement timeout")
+        assert not circuit.allow()
+
+    def test_success_is_recorded(self, clock):
+        circuit = CircuitBreaker("redis", failure_threshold=2, reset_seconds=30)
+        circuit.record_failure()
+        with circuit.guard():
+            pass
+        assert circuit.failures == 0
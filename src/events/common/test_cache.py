@@ -0,0 +1,268 @@
+import os
+import pytest
+from redis.crc import key_slot
+from common import breaker
+from common import cache
+
+# Node of a running cluster, e.g. localhost:7000 from docker compose --profile redis-cluster up
+CLUSTER_NODE = os.environ.get('REDIS_CLUSTER_TEST_NODE')
+
+
+@pytest.fixture
+def r(fake_redis):
+    # Answers the scripts from the last generation counted, as if each write won its swap
+    r = fake_redis()
+
+    def run_script(script, keys, args):
+        generation = r.data.get(cache.CACHE_COUNTER_KEY)
+        if script == cache.READ_CACHE_SCRIPT:
+            return r.data.get(cache.generation_key(generation))
+        return generation
+    r.run_script = run_script
+    return r
+
+
+class TestCalendarKeys:
+
+    def test_year_is_the_hash_tag(self):
+        assert cache.calendar_key("2026-02") == "event_calendar:{2026}-02"
+
+    def test_months_of_a_year_share_a_slot(self):
+        slots = {key_slot(cache.calendar_key("2026-{:02d}".format(month)).encode()) for month in range(1, 13)}
+        assert len(slots) == 1
+
+
+class TestCalendarCache:
+
+    def test_round_trip_is_pipelined(self, r):
+        cache.write_calendar_cache(r, {"2026-12": {"2026-12-05": {"pottery": 1}}, "2027-01": {}})
+        assert cache.read_calendar_cache(r, ["2026-12", "2027-01", "2027-02"]) == {
+            "2026-12": {"2026-12-05": {"pottery": 1}},
+            "2027-01": {}
+        }
+        assert len(r.pipelines[-1].commands) == 3
+        assert not any(pipe.transaction for pipe in r.pipelines)
+
+    def test_invalidate(self, r):
+        cache.write_calendar_cache(r, {"2026-12": {}, "2027-01": {}})
+        cache.invalidate_calendar_cache(r, ["2026-12"])
+        assert list(r.data) == [cache.calendar_key("2027-01")]
+
+
+class TestEventCacheGenerations:
+
+    def test_keys_share_a_cluster_slot(self):
+        keys = [cache.CACHE_POINTER_KEY, cache.CACHE_GENERATIONS_KEY, cache.CACHE_COUNTER_KEY, cache.generation_key(42)]
+        assert cache.generation_key(42) == "{event_table:v1}:g42"
+        assert len({key_slot(key.encode()) for key in keys}) == 1
+
+    def test_generation_is_written_before_the_swap(self, r):
+        assert cache.write_event_cache(r, [{"name": "Pottery Workshop"}]) == 1
+        assert [command[:2] for command in r.pipelines[0].commands] == [("zadd", cache.CACHE_GENERATIONS_KEY), ("set", cache.generation_key(1))]
+        assert not r.pipelines[0].transaction
+        command, script, keys, args = r.scripts[0]
+        assert (command, script) == ("eval", cache.SWAP_CACHE_SCRIPT)
+        assert keys == (cache.CACHE_POINTER_KEY, cache.CACHE_GENERATIONS_KEY)
+        assert args == (1, cache.CACHE_KEEP_GENERATIONS, cache.GENERATION_PREFIX)
+
+    def test_read_resolves_the_pointer_in_one_call(self, r):
+        cache.write_event_cache(r, [{"name": "Pottery Workshop"}])
+        assert cache.read_event_cache(r) == [{"name": "Pottery Workshop"}]
+        assert r.scripts[-1] == ("eval", cache.READ_CACHE_SCRIPT, (cache.CACHE_POINTER_KEY,), (cache.GENERATION_PREFIX,))
+
+    def test_nothing_cached(self, r):
+        assert cache.read_event_cache(r) is None
+
+    def test_replica_reads_use_eval_ro(self, r, monkeypatch):
+        # A single node may be Redis 6.2, which has no EVAL_RO
+        cache.write_event_cache(r, [{"name": "Pottery Workshop"}])
+        monkeypatch.setattr(cache, "REDIS_CLUSTER", True)
+        assert cache.read_event_cache(r) == [{"name": "Pottery Workshop"}]
+        assert r.scripts[-1][:2] == ("eval_ro", cache.READ_CACHE_SCRIPT)
+
+
+class TestClients:
+
+    @pytest.fixture
+    def connections(self, monkeypatch):
+        opened = []
+
+        def connect(password, replicas=False):
+            opened.append(("replicas" if replicas else "primaries", password))
+            return opened[-1]
+        monkeypatch.setattr(cache, "connect_redis", connect)
+        monkeypatch.setattr(cache, "_client", None)
+        monkeypatch.setattr(cache, "_replica_client", None)
+        return opened
+
+    def test_single_node_cache_reads_share_the_client(self, connections, monkeypatch):
+        monkeypatch.setattr(cache, "REDIS_CLUSTER", False)
+        assert cache.shared_cache_redis("pw") is cache.shared_redis("pw")
+        assert connections == [("primaries", "pw")]
+
+    def test_cluster_cache_reads_use_replicas(self, connections, monkeypatch):
+        monkeypatch.setattr(cache, "REDIS_CLUSTER", True)
+        assert cache.shared_cache_redis("pw") == ("replicas", "pw")
+        assert cache.shared_redis("pw") == ("primaries", "pw")
+        cache.shared_cache_redis("pw")
+        assert len(connections) == 2
+
+    def test_replica_reads_can_be_turned_off(self, connections, monkeypatch):
+        monkeypatch.setattr(cache, "REDIS_CLUSTER", True)
+        monkeypatch.setattr(cache, "REDIS_READ_FROM_REPLICAS", False)
+        assert cache.shared_cache_redis("pw") is cache.shared_redis("pw")
+
+    def test_open_breaker_skips_the_replicas(self, connections, monkeypatch):
+        monkeypatch.setattr(cache, "REDIS_CLUSTER", True)
+        for _ in range(breaker.redis.failure_threshold):
+            breaker.redis.record_failure()
+        with pytest.raises(breaker.BreakerOpenError):
+            cache.shared_cache_redis("pw")
+        assert connections == []
+
+    def test_remap_host(self, monkeypatch):
+        monkeypatch.setattr(cache, "REDIS_CLUSTER_REMAP_HOST", "host.docker.internal")
+        assert cache.remap_address(("127.0.0.1", 7001)) == ("host.docker.internal", 7001)
+
+
+@pytest.mark.skipif(not CLUSTER_NODE, reason="set REDIS_CLUSTER_TEST_NODE to a node of a running Redis Cluster")
+class TestCluster:
+
+    @pytest.fixture
+    def clients(self, monkeypatch):
+        from common import config
+        host, _, port = CLUSTER_NODE.partition(':')
+        monkeypatch.setattr(config, "REDIS_URL", host)
+        monkeypatch.setattr(config, "REDIS_PORT", int(port or 6379))
+        monkeypatch.setattr(cache, "REDIS_CLUSTER", True)
+        primaries = cache.connect_redis(os.environ.get('REDIS_PASSWORD'))
+        replicas = cache.connect_redis(os.environ.get('REDIS_PASSWORD'), replicas=True)
+        yield primaries, replicas
+        primaries.close()
+        replicas.close()
+
+    def test_calendar_months_across_slots(self, clients):
+        primaries, replicas = clients
+        months = ["2026-12", "2027-01", "2028-06"]
+        assert len({primaries.keyslot(cache.calendar_key(month)) for month in months}) == 3
+        cache.write_calendar_cache(primaries, {month: {month + "-01": {"pottery": 1}} for month in months})
+        primaries.wait(1, 1000, target_nodes=primaries.PRIMARIES)
+        assert set(cache.read_calendar_cache(replicas, months)) == set(months)
+        cache.invalidate_calendar_cache(primaries, months)
+        assert cache.read_calendar_cache(primaries, months) == {}
+
+    @pytest.fixture
+    def namespace(self, clients, monkeypatch):
+        # A schema version of its own keeps the test away from a cache in use
+        prefix = "{event_table:test}"
+        for name, suffix in (("CACHE_NAMESPACE", ""), ("CACHE_POINTER_KEY", ":current"), ("CACHE_GENERATIONS_KEY", ":generations"),
+                             ("CACHE_COUNTER_KEY", ":counter"), ("GENERATION_PREFIX", ":g")):
+            monkeypatch.setattr(cache, name, prefix + suffix)
+        yield clients[0]
+        keys = clients[0].keys(prefix + "*", target_nodes=clients[0].PRIMARIES)
+        if keys:
+            clients[0].delete(*keys)
+
+    def test_event_list_is_read_from_a_replica(self, clients, namespace):
+        primaries, replicas = clients
+        cache.write_event_cache(primaries, [{"name": "Pottery Workshop"}])
+        primaries.wait(1, 1000, target_nodes=primaries.get_node_from_key(cache.CACHE_POINTER_KEY))
+        assert cache.read_event_cache(replicas) == [{"name": "Pottery Workshop"}]
+        node = replicas.nodes_manager.get_node_from_slot(replicas.keyslot(cache.CACHE_POINTER_KEY), read_from_replicas=True,
+                                                          load_balancing_strategy=replicas.load_balancing_strategy)
+        assert node.server_type == "replica"
+
+    def test_old_generations_are_collected(self, namespace, monkeypatch):
+        monkeypatch.setattr(cache, "CACHE_KEEP_GENERATIONS", 2)
+        for name in ("Pottery", "Painting", "Weaving"):
+            generation = cache.write_event_cache(namespace, [{"name": name}])
+        assert cache.read_event_cache(namespace) == [{"name": "Weaving"}]
+        assert not namespace.exists(cache.generation_key(generation - 2))
+        assert namespace.zrange(cache.CACHE_GENERATIONS_KEY, 0, -1) == [str(generation - 1), str(generation)]
+
+    def test_older_generation_does_not_replace_a_newer_one(self, namespace):
+        generation = cache.write_event_cache(namespace, [{"name": "Pottery"}])
+        namespace.set(cache.CACHE_POINTER_KEY, generation + 5)
+        namespace.set(cache.generation_key(generation + 5), '[{"name": "Newer"}]')
+        cache.write_event_cache(namespace, [{"name": "Painting"}])
+        assert cache.read_event_cache(namespace) == [{"name": "Newer"}]
+
+    def test_rollback(self, namespace):
+        first = cache.write_event_cache(namespace, [{"name": "Pottery"}])
+        cache.write_event_cache(namespace, [{"name": "Painting"}])
+        assert cache.rollback_event_cache(namespace) == first
+        assert cache.read_event_cache(namespace) == [{"name": "Pottery"}]
+
+
+class TestScripts:
+    # Runs the Lua scripts on a real node, see REDIS_TEST_NODE in conftest.py
+
+    @pytest.fixture
+    def r(self, live_redis, monkeypatch):
+        prefix = "{event_table:test}"
+        for name, suffix in (("CACHE_NAMESPACE", ""), ("CACHE_POINTER_KEY", ":current"), ("CACHE_GENERATIONS_KEY", ":generations"),
+                             ("CACHE_COUNTER_KEY", ":counter"), ("GENERATION_PREFIX", ":g")):
+            monkeypatch.setattr(cache, name, prefix + suffix)
+        monkeypatch.setattr(cache, "CACHE_KEEP_GENERATIONS", 2)
+        keys = list(live_redis.scan_iter(prefix + "*"))
+        if keys:
+            live_redis.delete(*keys)
+        yield live_redis
+        keys = list(live_redis.scan_iter(prefix + "*"))
+        if keys:
+            live_redis.delete(*keys)
+
+    def swap(self, r, generation):
+        return r.eval(cache.SWAP_CACHE_SCRIPT, 2, cache.CACHE_POINTER_KEY, cache.CACHE_GENERATIONS_KEY,
+                      generation, cache.CACHE_KEEP_GENERATIONS, cache.GENERATION_PREFIX)
+
+    def test_read_without_a_current_generation(self, r):
+        assert cache.read_event_cache(r) is None
+        r.set(cache.CACHE_POINTER_KEY, 4)
+        assert cache.read_event_cache(r) is None
+
+    def test_read_follows_the_pointer(self, r):
+        r.set(cache.generation_key(3), '[{"name": "Pottery"}]')
+        r.set(cache.generation_key(4), '[{"name": "Painting"}]')
+        r.set(cache.CACHE_POINTER_KEY, 3)
+        assert cache.read_event_cache(r) == [{"name": "Pottery"}]
+
+    def test_older_generation_loses_the_swap(self, r):
+        newer = cache.write_event_cache(r, [{"name": "Painting"}])
+        older = newer - 1
+        r.zadd(cache.CACHE_GENERATIONS_KEY, {older: older})
+        r.set(cache.generation_key(older), '[{"name": "Pottery"}]')
+        assert self.swap(r, older) == newer
+        assert r.get(cache.CACHE_POINTER_KEY) == str(newer)
+        assert cache.read_event_cache(r) == [{"name": "Painting"}]
+
+    def test_generations_behind_the_kept_ones_are_collected(self, r):
+        generations = [cache.write_event_cache(r, [{"name": name}]) for name in ("Pottery", "Painting", "Weaving")]
+        assert not r.exists(cache.generation_key(generations[0]))
+        assert all(r.exists(cache.generation_key(generation)) for generation in generations[1:])
+        assert r.zrange(cache.CACHE_GENERATIONS_KEY, 0, -1) == [str(generation) for generation in generations[1:]]
+
+    def test_superseded_generation_is_collected_by_a_later_swap(self, r):
+        first = cache.write_event_cache(r, [{"name": "Pottery"}])
+        # A writer that registered its generation but lost the swap to a newer one
+        r.zadd(cache.CACHE_GENERATIONS_KEY, {first + 1: first + 1})
+        r.set(cache.generation_key(first + 1), '[{"name": "Lost"}]')
+        r.set(cache.CACHE_COUNTER_KEY, first + 1)
+        for name in ("Painting", "Weaving", "Knitting"):
+            cache.write_event_cache(r, [{"name": name}])
+        assert not r.exists(cache.generation_key(first + 1))
+        assert r.zrange(cache.CACHE_GENERATIONS_KEY, 0, -1) == [str(first + 3), str(first + 4)]
+
+    def test_rollback_skips_deleted_generations(self, r, monkeypatch):
+        monkeypatch.setattr(cache, "CACHE_KEEP_GENERATIONS", 3)
+        first, second, _ = (cache.write_event_cache(r, [{"name": name}]) for name in ("Pottery", "Painting", "Weaving"))
+        r.delete(cache.generation_key(second))
+        assert cache.rollback_event_cache(r) == first
+        assert cache.read_event_cache(r) == [{"name": "Pottery"}]
+        assert cache.rollback_event_cache(r) is None
+        assert r.get(cache.CACHE_POINTER_KEY) == str(first)
+
+    def test_rollback_without_an_older_generation(self, r):
+        cache.write_event_cache(r, [{"name": "Pottery"}])
+        assert cache.rollback_event_cache(r) is None
+        assert cache.read_event_cache(r) == [{"name": "Pottery"}]
@@ -0,0 +1,288 @@
+import pytest
+import psycopg2
+from common import breaker
+from common import db
+from common.responses import return_error
+
+
+@pytest.fixture
+def replica(fake_db):
+    # Answers the replica check: in recovery, caught up, receiver streaming, age of the last replayed transaction
+    class Replica(fake_db):
+        def __init__(self, host=None, lag=0, caught_up=False, streaming=True):
+            super().__init__()
+            self.host = host
+            self.lag = lag
+            self.caught_up = caught_up
+            self.streaming = streaming
+
+        def answer(self, sql):
+            if self.lag == "error":
+                raise Exception("recovery functions failed")
+            return [(True, self.caught_up, self.streaming, self.lag)]
+    return Replica
+
+
+@pytest.fixture
+def connections(fake_db, monkeypatch):
+    opened = []
+
+    def connect(password):
+        opened.append(fake_db())
+        return opened[-1]
+    monkeypatch.setattr(db, "connect_db", connect)
+    monkeypatch.setattr(db, "_conn", None)
+    return opened
+
+
+class TestSharedDb:
+
+    def test_warm_connection_is_reused(self, connections):
+        assert db.shared_db("pw") is db.shared_db("pw")
+        assert len(connections) == 1
+
+    def test_closed_connection_is_replaced(self, connections):
+        db.shared_db("pw").close()
+        db.shared_db("pw")
+        assert len(connections) == 2
+
+    def test_idle_connection_is_replaced(self, connections, monkeypatch):
+        first = db.shared_db("pw")
+        monkeypatch.setattr(db, "_last_used", db._last_used - db.DB_MAX_IDLE_SECONDS - 1)
+        assert db.shared_db("pw") is not first
+        assert first.closed
+
+    def test_connect_error_is_not_kept(self, monkeypatch):
+        monkeypatch.setattr(db, "_conn", None)
+        monkeypatch.setattr(db, "connect_db", lambda password: return_error(500, 'Error connecting to database'))
+        assert db.shared_db("pw")["statusCode"] == 500
+        assert db._conn is None
+
+    def test_reset_rolls_back_or_discards(self, connections):
+        conn = db.shared_db("pw")
+        db.reset_db()
+        assert conn.rollbacks == 1
+        conn.closed = 1
+        db.reset_db()
+        assert db._conn is None
+
+
+@pytest.fixture
+def replicas(replica, monkeypatch):
+    # Hosts map to their lag in seconds, or None when the replica cannot be reached
+    lags = {}
+    opened = []
+
+    def connect(password, host=None, port=None, **options):
+        if host is not None and lags.get(host, 0) is None:
+            return return_error(500, 'Error connecting to database')
+        opened.append(replica(host or "primary", lags.get(host, 0)))
+        return opened[-1]
+    monkeypatch.setattr(db, "connect_db", connect)
+    monkeypatch.setattr(db, "random", type("NoShuffle", (), {"shuffle": staticmethod(lambda hosts: None)}))
+    monkeypatch.setattr(db, "READ_HOSTS", ["replica-a", "replica-b:5433"])
+    for name in ("_conn", "_read_conn", "_read_host"):
+        monkeypatch.setattr(db, name, None)
+    monkeypatch.setattr(db, "_replica_down", {})
+    return lags, opened
+
+
+class TestSharedReadDb:
+
+    def test_reads_go_to_a_replica(self, replicas):
+        conn = db.shared_read_db("pw")
+        assert conn.host == "replica-a"
+        assert db.shared_read_db("pw") is conn
+
+    def test_port_is_taken_from_the_entry(self):
+        assert db.split_host("replica-b:5433") == ("replica-b", "5433")
+        assert db.split_host("replica-a") == ("replica-a", None)
+
+    def test_unreachable_replica_is_skipped(self, replicas):
+        lags, _ = replicas
+        lags["replica-a"] = None
+        assert db.shared_read_db("pw").host == "replica-b"
+        assert "replica-a" in db._replica_down
+
+    def test_lagging_replica_is_skipped(self, replicas):
+        lags, opened = replicas
+        lags["replica-a"] = db.REPLICA_MAX_LAG_SECONDS + 1
+        assert db.shared_read_db("pw").host == "replica-b"
+        assert opened[0].closed
+
+    def test_caught_up_replica_is_current(self, replica):
+        conn = replica("replica-a", db.REPLICA_MAX_LAG_SECONDS + 1, caught_up=True)
+        assert db.replica_lag(conn) == 0
+
+    def test_replica_with_its_receiver_down_is_skipped(self, replicas, replica, monkeypatch):
+        # Replayed all it received, but the last transaction is old and nothing is streaming in
+        lags, opened = replicas
+        lags["replica-a"] = db.REPLICA_MAX_LAG_SECONDS + 1
+        assert db.replica_lag(replica("replica-a", lags["replica-a"], caught_up=True, streaming=False)) == lags["replica-a"]
+        connect = db.connect_db
+
+        def disconnected(password, host=None, port=None, **options):
+            conn = connect(password, host, port, **options)
+            conn.caught_up = True
+            conn.streaming = host != "replica-a"
+            return conn
+        monkeypatch.setattr(db, "connect_db", disconnected)
+        assert db.shared_read_db("pw").host == "replica-b"
+        assert opened[0].closed
+
+    def test_falls_back_to_primary(self, replicas):
+        lags, _ = replicas
+        lags.update({"replica-a": None, "replica-b": "error"})
+        assert db.shared_read_db("pw").host == "primary"
+        assert db.shared_read_db("pw") is db._conn
+
+    def test_no_read_hosts_uses_primary(self, replicas, monkeypatch):
+        monkeypatch.setattr(db, "READ_HOSTS", [])
+        assert db.shared_read_db("pw").host == "primary"
+
+    def test_warm_replica_is_dropped_once_it_lags(self, replicas, monkeypatch):
+        conn = db.shared_read_db("pw")
+        conn.lag = db.REPLICA_MAX_LAG_SECONDS + 1
+        monkeypatch.setattr(db, "_read_checked", db._read_checked - db.REPLICA_CHECK_SECONDS - 1)
+        assert db.shared_read_db("pw").host == "replica-b"
+
+    def test_down_replica_is_retried_later(self, replicas, monkeypatch):
+        lags, _ = replicas
+        lags["replica-a"] = None
+        db.shared_read_db("pw")
+        db.discard_read_db()
+        lags["replica-a"] = 0
+        monkeypatch.setattr(db, "_replica_down", {"replica-a": 0})
+        assert db.shared_read_db("pw").host == "replica-a"
+
+
+class TestBreakerAndTimeouts:
+
+    def test_connect_sets_timeouts(self, fake_db, monkeypatch):
+        seen = {}
+
+        def connect(**kwargs):
+            seen.update(kwargs)
+            return fake_db()
+        monkeypatch.setattr(psycopg2, "connect", connect)
+        db.connect_db("pw")
+        assert seen["connect_timeout"] == db.DB_CONNECT_TIMEOUT_SECONDS
+        assert seen["options"] == "-c statement_timeout={}".format(db.DB_STATEMENT_TIMEOUT_MS)
+        db.connect_db("pw", statement_timeout_ms=0)
+        assert seen["options"] == "-c statement_timeout=0"
+
+    def test_transaction_pooling_sets_the_timeout_per_transaction(self, fake_db, monkeypatch):
+        seen = {}
+
+        def connect(**kwargs):
+            seen.update(kwargs)
+            return fake_db()
+        monkeypatch.setattr(psycopg2, "connect", connect)
+        monkeypatch.setattr(db, "TRANSACTION_POOLING", True)
+        conn = db.connect_db("pw", statement_timeout_ms=0)
+        # The pooler would reject the options startup parameter
+        assert "options" not in seen
+        assert issubclass(seen["connection_factory"], psycopg2.extensions.connection)
+        assert seen["connection_factory"] is db.pooled_connection()
+        assert conn.statement_timeout_ms == 0
+
+    def test_connect_failures_open_the_breaker(self, monkeypatch):
+        def connect(**kwargs):
+            raise psycopg2.OperationalError("timeout expired")
+        monkeypatch.setattr(psycopg2, "connect", connect)
+        for _ in range(breaker.postgres.failure_threshold):
+            assert db.connect_db("pw")["statusCode"] == 500
+        assert db.connect_db("pw")["statusCode"] == 503
+
+    def test_replica_failures_do_not_count(self, monkeypatch):
+        def connect(**kwargs):
+            raise psycopg2.OperationalError("timeout expired")
+        monkeypatch.setattr(psycopg2, "connect", connect)
+        for _ in range(breaker.postgres.failure_threshold):
+            db.connect_db("pw", "replica-a", use_breaker=False)
+        assert breaker.postgres.allow()
+
+    def test_open_breaker_skips_the_warm_connection(self, connections):
+        db.shared_db("pw")
+        for _ in range(breaker.postgres.failure_threshold):
+            db.reset_db(psycopg2.extensions.QueryCanceledError("canceling statement due to statement timeout"))
+        assert db.shared_db("pw")["statusCode"] == 503
+
+    def test_query_errors_do_not_count(self, connections):
+        db.shared_db("pw")
+        for _ in range(breaker.postgres.failure_threshold):
+            db.reset_db(psycopg2.IntegrityError("duplicate key"))
+        assert breaker.postgres.allow()
+
+
+class TestPreparedStatements:
+
+    def test_to_positional(self):
+        assert db.to_positional("INSERT INTO t (a, b) VALUES (%s, %s);") == "INSERT INTO t (a, b) VALUES ($1, $2)"
+
+    def test_prepared_once_per_connection(self, fake_db, monkeypatch):
+        monkeypatch.setattr(db, "PREPARED_STATEMENTS", True)
+        conn = fake_db()
+        cur = conn.cursor()
+        db.execute_prepared(cur, "insert_row", "INSERT INTO t (a, b) VALUES (%s, %s);", ("x", 1))
+        db.execute_prepared(cur, "insert_row", "INSERT INTO t (a, b) VALUES (%s, %s);", ("y", 2))
+        assert conn.statements == [
+            ("PREPARE insert_row AS INSERT INTO t (a, b) VALUES ($1, $2)", None),
+            ("EXECUTE insert_row (%s, %s)", ("x", 1)),
+            ("EXECUTE insert_row (%s, %s)", ("y", 2))
+        ]
+
+        other = fake_db()
+        db.execute_prepared(other.cursor(), "insert_row", "INSERT INTO t (a, b) VALUES (%s, %s);", ("z", 3))
+        assert other.statements[0][0].startswith("PREPARE insert_row")
+
+    def test_statement_without_parameters(self, fake_db, monkeypatch):
+        monkeypatch.setattr(db, "PREPARED_STATEMENTS", True)
+        conn = fake_db()
+        db.execute_prepared(conn.cursor(), "select_all_events", db.SELECT_ALL)
+        db.execute_prepared(conn.cursor(), "select_all_events", db.SELECT_ALL)
+        assert [sql for sql, _ in conn.statements[1:]] == ["EXECUTE select_all_events"] * 2
+
+    def test_plain_sql_when_disabled(self, fake_db, monkeypatch):
+        # DB_POOL_MODE=transaction turns them off, a pooler may run EXECUTE on another server connection
+        monkeypatch.setattr(db, "PREPARED_STATEMENTS", False)
+        conn = fake_db()
+        db.execute_prepared(conn.cursor(), "insert_row", "INSERT INTO t (a) VALUES (%s);", ("x",))
+        assert conn.statements == [("INSERT INTO t (a) VALUES (%s);", ("x",))]
+
+
+class TestFetchChanges:
+
+    def test_version_is_read_before_the_changes(self, fake_db, monkeypatch):
+        monkeypatch.setattr(db, "PREPARED_STATEMENTS", False)
+        # Answers the version, changed events and tombstone queries in the order fetch_changes runs them
+        conn = fake_db(answers=[[(750,)], [(3, 748, "Pottery Workshop")], [(9,)]], columns=("id", "version", "name"))
+        changes = db.fetch_changes(conn, 700)
+        events = changes.pop("found_events")
+        assert changes == {"version": 750, "deleted": [9]}
+        assert (events.columns, events.rows) == (["id", "version", "name"], [(3, 748, "Pottery Workshop")])
+        assert [sql for sql, _ in conn.statements] == [db.CHANGES_VERSION, db.CHANGED_EVENTS, db.DELETED_EVENTS]
+        assert [params for _, params in conn.statements[1:]] == [(700,), (700,)]
+        assert conn.rollbacks == 1
+
+
+class TestFetchEvents:
+
+    def test_plain_cursor_rows(self, fake_db, monkeypatch):
+        monkeypatch.setattr(db, "PREPARED_STATEMENTS", False)
+        conn = fake_db(answers=[[("Pottery Workshop", "98101")]], columns=("name", "zip"))
+        events = db.fetch_events(conn)
+        assert (events.columns, events.rows) == (["name", "zip"], [("Pottery Workshop", "98101")])
+        assert conn.rollbacks == 1
+
+
+class TestVisibleEvents:
+
+    def test_full_list_matches_since_zero(self, seeded_db):
+        # init.sql seeds Woodworking 101 unapproved, so neither read returns it
+        events = db.fetch_events(seeded_db)
+        changes = db.fetch_changes(seeded_db, 0)
+        names = sorted(row[events.columns.index("name")] for row in events.rows)
+        assert names == sorted(record["name"] for record in changes["found_events"])
+        assert "Pottery Workshop" in names
+        assert "Woodworking 101" not in names
@@ -0,0 +1,40 @@
+import math
+import random
+import pytest
+from common import geo
+
+
+class TestCentroids:
+
+    def test_bundled_table(self):
+        assert geo.centroid("20001") == pytest.approx((38.91, -77.02), abs=0.01)
+        assert geo.centroid("20001-1234") == geo.centroid("20001")
+        assert geo.centroid("00000") is None
+        assert geo.centroid(None) is None
+
+    def test_gazetteer_format(self, tmp_path):
+        path = tmp_path / "gazetteer.txt"
+        path.write_text("GEOID\tALAND\tINTPTLAT\tINTPTLONG                                                                                                               \n"
+                        "20001\t1\t38.910\t-77.018\n")
+        assert geo.load_centroids(str(path)) == {"20001": (38.910, -77.018)}
+
+
+class TestDistance:
+
+    def test_haversine(self):
+        # Washington Monument to the Capitol is about 2.3 km
+        assert geo.haversine_km(38.8895, -77.0353, 38.8899, -77.0091) == pytest.approx(2.27, abs=0.05)
+        assert geo.haversine_km(0, 0, 0, 180) == pytest.approx(math.pi * geo.EARTH_RADIUS_KM)
+
+    @pytest.mark.parametrize("lat, lon, radius", [(38.9, -77.03, 10), (64.8, -147.7, 150), (-33.9, 151.2, 50)])
+    def test_box_contains_the_circle(self, lat, lon, radius):
+        min_lat, max_lat, min_lon, max_lon = geo.bounding_box(lat, lon, radius)
+        rng = random.Random(1)
+        for _ in range(2000):
+            point = (lat + rng.uniform(-3, 3), lon + rng.uniform(-6, 6))
+            if geo.haversine_km(lat, lon, *point) <= radius:
+                assert min_lat <= point[0] <= max_lat
+                assert min_lon <= point[1] <= max_lon
+
+    def test_box_near_a_pole_covers_every_longitude(self):
+        assert geo.bounding_box(89.9, 10, 50)[2:] == (-180.0, 180.0)
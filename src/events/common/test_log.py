@@ -0,0 +1,89 @@
+import pytest
+import io
+import json
+import logging
+from common import log
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    # Reconfigures the root logger, then points its handler at a buffer
+    def configure(level="INFO", sample_rate="1"):
+        monkeypatch.setenv("LOG_LEVEL", level)
+        monkeypatch.setenv("LOG_SAMPLE_RATE", sample_rate)
+        log.configure()
+        stream = io.StringIO()
+        logging.getLogger().handlers[0].setStream(stream)
+        return stream
+    root = logging.getLogger()
+    handlers, level = root.handlers, root.level
+    yield configure
+    root.handlers, root.level = handlers, level
+    monkeypatch.setattr(log, "_request_id", None)
+
+
+def lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+class Context:
+    aws_request_id = "req-1"
+
+
+class TestJsonFormatter:
+
+    def test_one_json_object_per_line(self, captured):
+        stream = captured()
+        log.get_logger("test").info("Inserted %s events", 3)
+        entry, = lines(stream)
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "test"
+        assert entry["message"] == "Inserted 3 events"
+        assert entry["timestamp"].endswith("Z")
+
+    def test_request_id_and_fields(self, captured):
+        stream = captured()
+        log.start_request(Context())
+        log.get_logger("test").info("done", extra={"fields": {"rows": 2}})
+        entry, = lines(stream)
+        assert entry["request_id"] == "req-1"
+        assert entry["rows"] == 2
+
+    def test_exception_is_included(self, captured):
+        stream = captured()
+        try:
+            raise ValueError("bad row")
+        except ValueError:
+            log.get_logger("test").exception("Import failed")
+        entry, = lines(stream)
+        assert "ValueError: bad row" in entry["exception"]
+
+    def test_unknown_level_falls_back_to_info(self, captured):
+        captured(level="chatty")
+        assert logging.getLogger().level == logging.INFO
+
+
+class TestSampling:
+
+    def test_unsampled_request_keeps_warnings_and_errors(self, captured):
+        stream = captured(sample_rate="0")
+        assert log.start_request(Context()) is False
+        logger = log.get_logger("test")
+        logger.info("skipped")
+        logger.warning("kept")
+        logger.error("also kept")
+        assert [entry["message"] for entry in lines(stream)] == ["kept", "also kept"]
+
+    def test_sampled_request_restores_base_level(self, captured, monkeypatch):
+        stream = captured(sample_rate="0.5")
+        monkeypatch.setattr(log.random, "random", lambda: 0.9)
+        assert log.start_request(Context()) is False
+        monkeypatch.setattr(log.random, "random", lambda: 0.1)
+        assert log.start_request(Context()) is True
+        log.get_logger("test").info("kept")
+        assert [entry["message"] for entry in lines(stream)] == ["kept"]
+
+    def test_debug_base_level_is_kept_when_sampled(self, captured):
+        captured(level="DEBUG")
+        log.start_request()
+        assert logging.getLogger().level == logging.DEBUG
@@ -0,0 +1,80 @@
+import pytest
+import json
+from common import metrics
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(metrics, "_cold_start", True)
+
+
+class TestDisabledMetrics:
+
+    def test_handler_is_returned_untouched(self, monkeypatch):
+        monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+
+        def handler(event, context):
+            return {"statusCode": 200}
+
+        assert metrics.instrument("test")(handler) is handler
+
+    def test_stage_outside_invocation_is_shared_noop(self):
+        assert metrics.stage("DbQuery") is metrics.stage("RedisGet")
+        with metrics.stage("DbQuery"):
+            metrics.record("RowCount", 3)
+
+
+class TestEnabledMetrics:
+
+    def test_invocation_emits_one_emf_line(self, enabled, capsys):
+        @metrics.instrument("test_handler")
+        def handler(event, context):
+            with metrics.stage("DbQuery"):
+                pass
+            metrics.record("RowCount", 3)
+            return {"statusCode": 200}
+
+        handler({}, None)
+        line = json.loads(capsys.readouterr().out.strip())
+
+        assert line["Handler"] == "test_handler"
+        assert line["StatusCode"] == 200
+        assert line["RowCount"] == 3
+        assert line["DbQuery"] >= 0
+        assert line["ColdStart"] == 1
+        names = {metric["Name"]: metric["Unit"] for metric in line["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+        assert names["DbQuery"] == "Milliseconds"
+        assert names["Total"] == "Milliseconds"
+        assert "StatusCode" not in names
+
+    def test_only_first_invocation_is_cold(self, enabled, capsys):
+        handler = metrics.instrument("test_handler")(lambda event, context: {"statusCode": 200})
+        handler({}, None)
+        handler({}, None)
+        lines = [json.loads(line) for line in capsys.readouterr().out.strip().splitlines()]
+
+        assert [line["ColdStart"] for line in lines] == [1, 0]
+
+    def test_repeated_stage_accumulates(self, enabled, capsys):
+        @metrics.instrument("test_handler")
+        def handler(event, context):
+            for _ in range(2):
+                with metrics.stage("SecretFetch"):
+                    pass
+            return {"statusCode": 200}
+
+        handler({}, None)
+        line = json.loads(capsys.readouterr().out.strip())
+
+        assert line["SecretFetch"] >= 0
+
+    def test_emits_when_handler_raises(self, enabled, capsys):
+        @metrics.instrument("test_handler")
+        def handler(event, context):
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            handler({}, None)
+
+        assert json.loads(capsys.readouterr().out.strip())["Handler"] == "test_handler"
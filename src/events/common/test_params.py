@@ -0,0 +1,54 @@
+import pytest
+from common.params import (
+    columnar_format,
+    float_param,
+    int_param,
+    query_params
+)
+
+
+class TestQueryParams:
+
+    def test_proxy_event(self):
+        assert query_params({"requestContext": {}, "queryStringParameters": {"q": "pottery"}}) == {"q": "pottery"}
+        assert query_params({"requestContext": {}, "queryStringParameters": None}) == {}
+
+    def test_direct_invocation(self):
+        assert query_params({"q": "pottery"}) == {"q": "pottery"}
+        assert query_params("not a dict") == {}
+
+
+class TestIntParam:
+
+    def test_default_and_parsing(self):
+        assert int_param({}, "page", 1) == 1
+        assert int_param({"page": ""}, "page", 1) == 1
+        assert int_param({"page": "4"}, "page", 1, minimum=1) == 4
+
+    def test_bounds(self):
+        with pytest.raises(ValueError, match="at most 100"):
+            int_param({"page_size": "101"}, "page_size", 20, minimum=1, maximum=100)
+        with pytest.raises(ValueError, match="whole number"):
+            int_param({"page": "1.5"}, "page", 1)
+
+
+class TestFloatParam:
+
+    def test_parsing(self):
+        assert float_param({}, "lat") is None
+        assert float_param({"lat": "38.9"}, "lat", minimum=-90, maximum=90) == 38.9
+
+    @pytest.mark.parametrize("value", ["north", "nan", "inf", "91"])
+    def test_rejected(self, value):
+        with pytest.raises(ValueError):
+            float_param({"lat": value}, "lat", minimum=-90, maximum=90)
+
+
+class TestColumnarFormat:
+
+    def test_values(self):
+        assert not columnar_format({})
+        assert not columnar_format({"format": "rows"})
+        assert columnar_format({"format": "columnar"})
+        with pytest.raises(ValueError):
+            columnar_format({"format": "csv"})
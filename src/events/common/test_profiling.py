@@ -0,0 +1,84 @@
+import pytest
+import json
+import sys
+from common import profiling
+
+
+@pytest.fixture
+def fresh_profile(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_PATH", str(tmp_path / "profile.json"))
+    monkeypatch.setattr(profiling, "_phases", [])
+    monkeypatch.setattr(profiling, "_roots", [])
+    monkeypatch.setattr(profiling, "_stack", [])
+    monkeypatch.setattr(profiling, "_profiled", False)
+    return tmp_path
+
+
+class TestImportTree:
+
+    def test_nested_imports_are_recorded_as_children(self, fresh_profile, monkeypatch):
+        (fresh_profile / "profiled_parent.py").write_text("import profiled_child\n")
+        (fresh_profile / "profiled_child.py").write_text("VALUE = 1\n")
+        monkeypatch.syspath_prepend(str(fresh_profile))
+        finder = profiling._TimingFinder()
+        monkeypatch.setattr(profiling, "_finder", finder)
+        sys.meta_path.insert(0, finder)
+        try:
+            import profiled_parent
+        finally:
+            profiling._stop()
+            sys.modules.pop("profiled_parent", None)
+            sys.modules.pop("profiled_child", None)
+
+        assert profiled_parent.profiled_child.VALUE == 1
+        parent = profiling._roots[0]
+        assert parent["module"] == "profiled_parent"
+        assert parent["children"][0]["module"] == "profiled_child"
+        assert parent["total_ms"] >= parent["children"][0]["total_ms"]
+        assert finder not in sys.meta_path
+
+    def test_real_loader_is_restored_on_the_module(self, fresh_profile, monkeypatch):
+        (fresh_profile / "profiled_loader.py").write_text("")
+        monkeypatch.syspath_prepend(str(fresh_profile))
+        finder = profiling._TimingFinder()
+        sys.meta_path.insert(0, finder)
+        try:
+            import profiled_loader
+        finally:
+            sys.meta_path.remove(finder)
+            sys.modules.pop("profiled_loader", None)
+
+        assert not isinstance(profiled_loader.__loader__, profiling._TimingLoader)
+        assert not isinstance(profiled_loader.__spec__.loader, profiling._TimingLoader)
+
+
+class TestProfileColdStart:
+
+    def test_profile_is_written_once(self, fresh_profile, capsys):
+        calls = []
+        handler = profiling.profile_cold_start(lambda event, context: calls.append(event) or {"statusCode": 200})
+        handler(1, None)
+        handler(2, None)
+        with open(profiling.PROFILE_PATH) as f:
+            profile = json.load(f)
+        lines = capsys.readouterr().out.strip().splitlines()
+
+        assert calls == [1, 2]
+        assert len(lines) == 1
+        assert [phase["phase"] for phase in profile["phases"]] == ["handler_start", "handler_end"]
+        assert "import_tree" not in json.loads(lines[0])["cold_start_profile"]
+
+    def test_disabled_returns_handler(self, monkeypatch):
+        monkeypatch.setattr(profiling, "PROFILE_ENABLED", False)
+
+        def handler(event, context):
+            return None
+
+        assert profiling.profile_cold_start(handler) is handler
+
+    def test_marks_keep_first_occurrence(self, fresh_profile):
+        profiling.mark("first_db_connected")
+        profiling.mark("first_db_connected")
+
+        assert len(profiling._phases) == 1
@@ -0,0 +1,70 @@
+import pytest
+import json
+from datetime import (
+    date,
+    datetime,
+    time
+)
+from decimal import Decimal
+from common import responses
+from common.responses import (
+    RowSet,
+    columnar,
+    is_error,
+    return_error,
+    success
+)
+
+
+class TestResponses:
+
+    def test_return_error_shape(self):
+        assert return_error(422, 'Missing required input') == {"statusCode": 422, "message": 'Missing required input'}
+
+    def test_success_serializes_body(self):
+        response = success(found_events=[{"date": "2026-05-12"}])
+
+        assert response["statusCode"] == 200
+        assert json.loads(response["body"]) == {"message": "Successful", "found_events": [{"date": "2026-05-12"}]}
+
+    def test_accepted_message(self):
+        assert json.loads(success(202)["body"])["message"] == "Accepted"
+
+    def test_is_error(self):
+        assert is_error(return_error(500, 'failed'))
+        assert not is_error("password")
+        assert not is_error({"name": "Pottery"})
+
+    def test_columnar(self):
+        assert columnar([{"name": "Pottery", "price": 45.0}, {"name": "Painting", "price": 35.0}]) == {
+            "columns": ["name", "price"],
+            "rows": [["Pottery", 45.0], ["Painting", 35.0]]
+        }
+        assert columnar([]) == {"columns": [], "rows": []}
+
+
+class TestRowSet:
+    COLUMNS = ["name", "time", "price", "kids", "date", "seats", "off %s"]
+    ROWS = [
+        ("Pottery", time(14, 0), 45.0, True, date(2026, 2, 15), 8, Decimal("10.50")),
+        ("Painting", None, None, False, date(2026, 2, 20), None, None),
+        ("Wood \"101\" café", time(9, 30), 60, None, None, 12, 0.25),
+        ("Weaving", time(18, 0), float("nan"), True, datetime(2026, 3, 1, 9, 0), 2 ** 70, None),
+        ("Knitting\n", time(10, 0), 20.0, False, date(2026, 3, 2), 4, float("inf"))
+    ]
+
+    @pytest.mark.parametrize("chunk", [1, 2, 1000])
+    def test_same_body_as_dict_rows(self, monkeypatch, chunk):
+        monkeypatch.setattr(responses, "ROW_CHUNK", chunk)
+        records = [dict(zip(self.COLUMNS, row)) for row in self.ROWS]
+        assert success(found_events=RowSet(self.COLUMNS, self.ROWS), version=3) == success(found_events=records, version=3)
+
+    def test_empty(self):
+        assert json.loads(success(found_events=RowSet([], []))["body"])["found_events"] == []
+
+    def test_columnar_and_iteration(self):
+        rows = RowSet(self.COLUMNS, self.ROWS)
+        assert columnar(rows) == {"columns": self.COLUMNS, "rows": self.ROWS}
+        assert len(rows) == 5
+        assert json.loads(rows.to_json())[0]["price"] == 45.0
+        assert next(iter(rows))["name"] == "Pottery"
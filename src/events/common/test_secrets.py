@@ -0,0 +1,46 @@
+import pytest
+import io
+import json
+from common import config
+from common import secrets
+
+
+@pytest.fixture
+def extension(monkeypatch):
+    requests = []
+
+    def urlopen(req, timeout=None):
+        assert timeout == secrets.SECRETS_TIMEOUT_SECONDS
+        requests.append(req.full_url)
+        return io.BytesIO(json.dumps({"Parameter": {"Value": "secret"}}).encode())
+    monkeypatch.setattr(secrets, "urlopen", urlopen)
+    monkeypatch.setattr(secrets, "_cache", {})
+    monkeypatch.setattr(config, "PARAMETERS_SECRETS_EXTENSION_URL", "http://extension")
+    return requests
+
+
+class TestGetAwsPass:
+
+    def test_value_is_fetched_once_while_fresh(self, extension):
+        assert secrets.get_aws_pass("db_pass") == "secret"
+        assert secrets.get_aws_pass("db_pass") == "secret"
+        assert len(extension) == 1
+
+    def test_expired_value_is_fetched_again(self, extension, monkeypatch):
+        secrets.get_aws_pass("db_pass")
+        monkeypatch.setattr(secrets, "SECRETS_CACHE_SECONDS", 0)
+        secrets.get_aws_pass("db_pass")
+        assert len(extension) == 2
+
+    def test_errors_are_not_cached(self, extension, monkeypatch):
+        def failing(req, timeout=None):
+            raise OSError("extension not ready")
+        monkeypatch.setattr(secrets, "urlopen", failing)
+        assert secrets.get_aws_pass("db_pass")["statusCode"] == 500
+        assert secrets._cache == {}
+
+    def test_stalled_extension_is_an_error(self, extension, monkeypatch):
+        def stalled(req, timeout=None):
+            raise TimeoutError("timed out")
+        monkeypatch.setattr(secrets, "urlopen", stalled)
+        assert secrets.get_aws_pass("db_pass")["statusCode"] == 500
@@ -0,0 +1,273 @@
+# Puts src/events on sys.path so handler tests can import the shared common package
+import os
+from collections import namedtuple
+import pytest
+from common import breaker
+
+# Tests that run the SQL for real need a seeded database, e.g. docker compose up database with
+# POSTGRES_TEST_DSN=postgresql://postgres:<password>@localhost:5432/postgres. They are skipped without one.
+POSTGRES_TEST_DSN = os.environ.get('POSTGRES_TEST_DSN')
+# Tests that run the cache scripts need a Redis node, e.g. REDIS_TEST_NODE=localhost:6379 after docker compose up redis
+REDIS_TEST_NODE = os.environ.get('REDIS_TEST_NODE')
+
+# Entry of cursor.description, the handlers only read its name
+Column = namedtuple("Column", "name")
+
+
+class FakeCursor:
+
+    def __init__(self, conn):
+        self.connection = conn
+        self.rowcount = 0
+        self.rows = []
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append((sql, params))
+        self.rows = self.connection.answer(sql)
+        self.rowcount = len(self.rows)
+        self.description = [Column(name) for name in self.connection.columns]
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    """psycopg2 connection that records statements and answers them with the rows a test sets up.
+
+    results maps a statement to its rows, any other statement takes the next of answers. Rows are
+    tuples, as the plain cursor returns them, and columns names them in the cursor description.
+    """
+
+    def __init__(self, results=None, answers=(), columns=(), rollback_error=None):
+        self.results = results or {}
+        self.answers = list(answers)
+        self.columns = columns
+        self.rollback_error = rollback_error
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.commits += 1
+        return False
+
+    def answer(self, sql):
+        if sql in self.results:
+            return self.results[sql]
+        return self.answers.pop(0) if self.answers else []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        if self.rollback_error:
+            raise self.rollback_error
+        if self.closed:
+            raise Exception("connection already closed")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class FakePipeline:
+
+    def __init__(self, r, transaction):
+        self.r = r
+        self.transaction = transaction
+        self.commands = []
+        self.queued = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        # Queues any FakeRedis command, execute() runs them in order. The sync method is taken so the
+        # async client's pipeline queues plain calls too, as redis.asyncio does.
+        command = getattr(FakeRedis, name).__get__(self.r)
+
+        def queue(*args, **kwargs):
+            self.commands.append((name, *args))
+            self.queued.append(lambda: command(*args, **kwargs))
+        return queue
+
+    def execute(self):
+        if self.r.error:
+            raise self.r.error
+        return [command() for command in self.queued]
+
+
+class FakeRedis:
+    """Redis in dicts, for the commands the handlers send.
+
+    Scripts are recorded and answer with script_results in order, tests that need a script's logic
+    replace run_script. A pipeline raises error when executed.
+    """
+
+    def __init__(self, script_results=(), error=None):
+        self.script_results = list(script_results)
+        self.error = error
+        self.data = {}
+        self.sorted_sets = {}
+        self.streams = {}
+        self.acked = []
+        self.deleted = []
+        self.scripts = []
+        self.pipelines = []
+        self.deliveries = 1
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, *keys):
+        self.deleted.extend(keys)
+        return len([self.data.pop(key) for key in keys if key in self.data])
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def zadd(self, key, mapping):
+        self.sorted_sets.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        self.streams.setdefault(name, []).append(fields)
+
+    def xack(self, stream, group, *entry_ids):
+        self.acked.extend(entry_ids)
+        return len(entry_ids)
+
+    def xpending_range(self, stream, group, min, max, count):
+        return [{'message_id': min, 'times_delivered': self.deliveries}]
+
+    def run_script(self, script, keys, args):
+        return self.script_results.pop(0) if self.script_results else None
+
+    def eval(self, script, numkeys, *args):
+        self.scripts.append(("eval", script, args[:numkeys], args[numkeys:]))
+        return self.run_script(script, args[:numkeys], args[numkeys:])
+
+    def eval_ro(self, script, numkeys, *args):
+        self.scripts.append(("eval_ro", script, args[:numkeys], args[numkeys:]))
+        return self.run_script(script, args[:numkeys], args[numkeys:])
+
+    def pipeline(self, transaction=True):
+        self.pipelines.append(FakePipeline(self, transaction))
+        return self.pipelines[-1]
+
+
+class AsyncFakePipeline(FakePipeline):
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self):
+        return FakePipeline.execute(self)
+
+
+class AsyncFakeRedis(FakeRedis):
+    # FakeRedis as redis.asyncio, its commands return awaitables
+
+    async def get(self, key):
+        return FakeRedis.get(self, key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        return FakeRedis.set(self, key, value, nx, ex)
+
+    async def delete(self, *keys):
+        return FakeRedis.delete(self, *keys)
+
+    async def eval(self, script, numkeys, *args):
+        return FakeRedis.eval(self, script, numkeys, *args)
+
+    async def eval_ro(self, script, numkeys, *args):
+        return FakeRedis.eval_ro(self, script, numkeys, *args)
+
+    def pipeline(self, transaction=True):
+        self.pipelines.append(AsyncFakePipeline(self, transaction))
+        return self.pipelines[-1]
+
+
+@pytest.fixture
+def fake_db():
+    # The class, tests build one connection per answer set
+    return FakeConnection
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis
+
+
+@pytest.fixture
+def async_fake_redis():
+    return AsyncFakeRedis
+
+
+@pytest.fixture(autouse=True)
+def closed_breakers(monkeypatch):
+    # Breaker state is per process, so failures recorded by one test must not open it for the next
+    monkeypatch.setattr(breaker, "postgres", breaker.CircuitBreaker("postgres"))
+    monkeypatch.setattr(breaker, "redis", breaker.CircuitBreaker("redis"))
+
+
+@pytest.fixture
+def seeded_db():
+    # Connection to the database init.sql seeded, everything a test writes is rolled back
+    if not POSTGRES_TEST_DSN:
+        pytest.skip("set POSTGRES_TEST_DSN to the seeded docker compose database")
+    import psycopg2
+    try:
+        conn = psycopg2.connect(POSTGRES_TEST_DSN, connect_timeout=2)
+    except psycopg2.OperationalError as e:
+        pytest.skip("database unavailable: {}".format(e))
+    yield conn
+    conn.rollback()
+    conn.close()
+
+
+@pytest.fixture
+def live_redis():
+    # Client for a single Redis node, skipped when none is reachable
+    if not REDIS_TEST_NODE:
+        pytest.skip("set REDIS_TEST_NODE to a running Redis node")
+    import redis
+    host, _, port = REDIS_TEST_NODE.partition(':')
+    r = redis.Redis(host=host, port=int(port or 6379), password=os.environ.get('REDIS_PASSWORD'), decode_responses=True, socket_connect_timeout=2)
+    try:
+        r.ping()
+    except redis.ConnectionError as e:
+        pytest.skip("redis unavailable: {}".format(e))
+    yield r
+    r.close()
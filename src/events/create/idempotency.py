@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from common import config  # loads .env before the lookups below
+from common.log import get_logger
+
+logger = get_logger(__name__)
+
+IDEMPOTENCY_HEADER = 'idempotency-key'
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+# How long a claim is held for a request that is still running, it must outlive the lambda timeout
+IN_FLIGHT_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_IN_FLIGHT_TTL_SECONDS', '60'))
+WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '10'))
+POLL_INTERVAL_SECONDS = 0.1
+KEY_PREFIX = 'idempotency'
+IN_PROGRESS = 'in_progress'
+COMPLETE = 'complete'
+
+def get_idempotency_key(event):
+	if not isinstance(event, dict):
+		return None
+	headers = event.get("headers") or {}
+	for header, value in headers.items():
+		if header.lower() == IDEMPOTENCY_HEADER and value:
+			return value.strip()
+	return None
+
+def redis_key(idempotency_key):
+	return "{}:{}".format(KEY_PREFIX, hashlib.sha256(idempotency_key.encode('utf-8')).hexdigest())
+
+def fingerprint(data):
+	return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def should_store(response):
+	# Server errors and throttling are released so the retry can run the submission again
+	status = response.get("statusCode", 500)
+	return status < 500 and status != 429
+
+def conflict(message):
+	return {
+		"statusCode": 409,
+		"message": message
+	}
+
+def mismatch():
+	return {
+		"statusCode": 422,
+		"message": 'Idempotency-Key was already used for a different request'
+	}
+
+def resolve(record, request_fingerprint):
+	"""Maps a stored record to the response for a duplicate request, or None while the first request is running."""
+	if record.get("fingerprint") != request_fingerprint:
+		return mismatch()
+	if record.get("state") == COMPLETE:
+		return record["response"]
+	return None
+
+def claim_request(r, idempotency_key, request_fingerprint):
+	"""Claims the key for this request.
+
+	Returns None when the caller owns the key and should process the request,
+	otherwise the response to send back for the duplicate.
+	"""
+	key = redis_key(idempotency_key)
+	claim = json.dumps({"state": IN_PROGRESS, "fingerprint": request_fingerprint})
+	if r.set(key, claim, nx=True, ex=IN_FLIGHT_TTL_SECONDS):
+		return None
+
+	deadline = time.monotonic() + WAIT_SECONDS
+	while True:
+		stored = r.get(key)
+		if stored is None:
+			# The first request failed and released the key, take it over
+			if r.set(key, claim, nx=True, ex=IN_FLIGHT_TTL_SECONDS):
+				return None
+			continue
+		response = resolve(json.loads(stored), request_fingerprint)
+		if response is not None:
+			logger.info("Replaying stored response for idempotency key")
+			return response
+		if time.monotonic() >= deadline:
+			return conflict('A request with this Idempotency-Key is still in progress')
+		time.sleep(POLL_INTERVAL_SECONDS)
+
+def complete_request(r, idempotency_key, request_fingerprint, response):
+	key = redis_key(idempotency_key)
+	if should_store(response):
+		record = {"state": COMPLETE, "fingerprint": request_fingerprint, "response": response}
+		r.set(key, json.dumps(record, default=str), ex=IDEMPOTENCY_TTL_SECONDS)
+	else:
+		r.delete(key)
+
+async def claim_request_async(r, idempotency_key, request_fingerprint):
+	"""claim_request for a redis.asyncio client, polling without blocking the event loop."""
+	key = redis_key(idempotency_key)
+	claim = json.dumps({"state": IN_PROGRESS, "fingerprint": request_fingerprint})
+	if await r.set(key, claim, nx=True, ex=IN_FLIGHT_TTL_SECONDS):
+		return None
+
+	deadline = time.monotonic() + WAIT_SECONDS
+	while True:
+		stored = await r.get(key)
+		if stored is None:
+			if await r.set(key, claim, nx=True, ex=IN_FLIGHT_TTL_SECONDS):
+				return None
+			continue
+		response = resolve(json.loads(stored), request_fingerprint)
+		if response is not None:
+			logger.info("Replaying stored response for idempotency key")
+			return response
+		if time.monotonic() >= deadline:
+			return conflict('A request with this Idempotency-Key is still in progress')
+		await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+async def complete_request_async(r, idempotency_key, request_fingerprint, response):
+	key = redis_key(idempotency_key)
+	if should_store(response):
+		record = {"state": COMPLETE, "fingerprint": request_fingerprint, "response": response}
+		await r.set(key, json.dumps(record, default=str), ex=IDEMPOTENCY_TTL_SECONDS)
+	else:
+		await r.delete(key)
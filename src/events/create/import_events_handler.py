@@ -0,0 +1,274 @@
+import psycopg2
+import csv
+import io
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from validators import (
+    validate_user_input,
+    validate_required_user_input_exists
+)
+from common import config
+from common.db import (
+    TRANSACTION_POOLING,
+    connect_db
+)
+from common.responses import (
+    is_error,
+    return_error,
+    success
+)
+from common.secrets import get_aws_pass
+from common.log import (
+    get_logger,
+    start_request
+)
+from insert_event_handler import sanitize_input
+from submission_queue import SUBMISSION_FIELDS
+
+logger = get_logger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '5000'))
+IMPORT_TIMEZONE = ZoneInfo(os.environ.get('IMPORT_TIMEZONE', 'America/New_York'))
+
+# Staging rows are copied without constraints, then merged so duplicates are skipped instead of aborting the COPY
+# Behind a transaction-mode pooler the next chunk may run on another server connection, so the staging
+# table is then dropped with the transaction instead of being left behind on this one
+STAGING_SCOPE = "ON COMMIT DROP " if TRANSACTION_POOLING else ""
+CREATE_STAGING = """CREATE TEMP TABLE IF NOT EXISTS import_staging {}AS SELECT {} FROM user_submitted_event WITH NO DATA;""".format(STAGING_SCOPE, ", ".join(SUBMISSION_FIELDS))
+COPY_STAGING = """COPY import_staging ({}) FROM STDIN WITH (FORMAT csv)""".format(", ".join(SUBMISSION_FIELDS))
+MERGE_STAGING = """INSERT INTO user_submitted_event ({0}) SELECT {0} FROM import_staging ON CONFLICT ON CONSTRAINT unique_event_name_link_date DO NOTHING;""".format(", ".join(SUBMISSION_FIELDS))
+TRUNCATE_STAGING = """TRUNCATE import_staging;"""
+
+REPORT_FIELDS = ('line', 'reason', 'record')
+ICS_FIELDS = {
+	'SUMMARY': 'name',
+	'DESCRIPTION': 'description',
+	'LOCATION': 'location',
+	'URL': 'link'
+}
+ICS_ESCAPES = {'n': '\n', 'N': '\n', ',': ',', ';': ';', '\\': '\\'}
+
+def parse_bool(value):
+	if isinstance(value, bool) or value is None:
+		return value
+	lowered = value.strip().lower()
+	if lowered in ('true', 'yes', '1'):
+		return True
+	if lowered in ('false', 'no', '0'):
+		return False
+	return value
+
+def read_csv(stream, defaults):
+	"""Yields (line, record) for each CSV row, the header uses the same keys as the submit payload."""
+	reader = csv.DictReader(stream)
+	for row in reader:
+		record = dict(defaults)
+		for key, value in row.items():
+			if key and value is not None and value.strip() != '':
+				record[key.strip()] = value.strip()
+		if 'kids' in record:
+			record['kids'] = parse_bool(record['kids'])
+		yield reader.line_num, record
+
+def unfold_ics(stream):
+	# RFC 5545 folds long lines by starting the continuation with a space or tab
+	current = None
+	start = 0
+	for number, raw in enumerate(stream, 1):
+		line = raw.rstrip('\r\n')
+		if line[:1] in (' ', '\t') and current is not None:
+			current += line[1:]
+			continue
+		if current is not None:
+			yield start, current
+		current = line
+		start = number
+	if current is not None:
+		yield start, current
+
+def unescape_ics(value):
+	return re.sub(r'\\([nN,;\\])', lambda match: ICS_ESCAPES[match.group(1)], value)
+
+def parse_ics_datetime(params, value):
+	"""Returns (date, time) strings for a DTSTART value, or (date, None) for all-day events."""
+	if 'VALUE=DATE' in params or len(value) == 8:
+		return datetime.strptime(value, '%Y%m%d').strftime('%Y-%m-%d'), None
+	if value.endswith('Z'):
+		start = datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=ZoneInfo('UTC')).astimezone(IMPORT_TIMEZONE)
+	else:
+		start = datetime.strptime(value, '%Y%m%dT%H%M%S')
+	return start.strftime('%Y-%m-%d'), start.strftime('%H:%M:%S')
+
+def read_ics(stream, defaults):
+	"""Yields (line, record) for each VEVENT, holding only the event being parsed in memory."""
+	record = None
+	start = 0
+	for number, line in unfold_ics(stream):
+		name, _, value = line.partition(':')
+		prop, _, params = name.partition(';')
+		prop = prop.upper()
+		if prop == 'BEGIN' and value.upper() == 'VEVENT':
+			record = dict(defaults)
+			start = number
+		elif prop == 'END' and value.upper() == 'VEVENT' and record is not None:
+			yield start, record
+			record = None
+		elif record is None:
+			continue
+		elif prop == 'DTSTART':
+			try:
+				record['date'], record['time'] = parse_ics_datetime(params.upper(), value.strip())
+			except ValueError:
+				record['date'] = value
+		elif prop == 'ORGANIZER':
+			for param in params.split(';'):
+				if param.upper().startswith('CN='):
+					record['organization'] = param[3:].strip('"')
+		elif prop in ICS_FIELDS:
+			record[ICS_FIELDS[prop]] = unescape_ics(value)
+
+def to_row(record, today):
+	"""Runs a record through the submit pipeline checks and returns (row, None) or (None, reason)."""
+	if not validate_required_user_input_exists(record):
+		return None, 'Missing required input'
+	name = sanitize_input(record.get("name"))
+	descrip = sanitize_input(record.get("description"))
+	org = sanitize_input(record.get("organization"))
+	location = sanitize_input(record.get("location"))
+	if not validate_user_input(record, name, descrip, org, location):
+		return None, 'Input entered is invalid'
+	return (name, record.get("price"), descrip, record.get("link"), record.get("kids"), location, record.get("date"), record.get("time"), org, record.get("email"), today), None
+
+def copy_field(value):
+	# COPY reads an unquoted empty field as NULL and a quoted one as an empty string, so only None is left unquoted
+	if value is None:
+		return ''
+	return '"{}"'.format(str(value).replace('"', '""'))
+
+def copy_chunk(conn, rows):
+	buffer = io.StringIO()
+	for row in rows:
+		buffer.write(','.join(copy_field(value) for value in row))
+		buffer.write('\n')
+	buffer.seek(0)
+	with conn.cursor() as cur:
+		cur.execute(CREATE_STAGING)
+		cur.copy_expert(COPY_STAGING, buffer)
+		cur.execute(MERGE_STAGING)
+		inserted = cur.rowcount
+		cur.execute(TRUNCATE_STAGING)
+	conn.commit()
+	return inserted
+
+def new_totals():
+	return {"read": 0, "inserted": 0, "rejected": 0, "duplicates": 0}
+
+def import_records(conn, records, report, totals=None):
+	"""Validates and loads records in chunks of IMPORT_CHUNK_SIZE, writing rejected ones to report.
+
+	totals is updated as the import goes, so a caller passing it in still has the counts when reading fails partway.
+	"""
+	if totals is None:
+		totals = new_totals()
+	today = datetime.now().strftime('%Y-%m-%d')
+	report_writer = csv.writer(report)
+	report_writer.writerow(REPORT_FIELDS)
+	chunk = []
+	try:
+		for line, record in records:
+			totals["read"] += 1
+			row, reason = to_row(record, today)
+			if row is None:
+				totals["rejected"] += 1
+				report_writer.writerow((line, reason, json.dumps(record, default=str)))
+				continue
+			chunk.append((line, record, row))
+			if len(chunk) >= IMPORT_CHUNK_SIZE:
+				loading, chunk = chunk, []
+				load_chunk(conn, loading, report_writer, totals)
+	finally:
+		# Records read before a failure are still loaded, so the totals and report account for every record read
+		if chunk:
+			load_chunk(conn, chunk, report_writer, totals)
+	return totals
+
+def load_chunk(conn, chunk, report_writer, totals):
+	"""Copies one chunk of (line, record, row), reporting every row of a chunk the database rejects.
+
+	The failed chunk is rolled back, earlier chunks stay committed and the import goes on.
+	"""
+	try:
+		inserted = copy_chunk(conn, [row for _, _, row in chunk])
+	except psycopg2.Error as e:
+		logger.error("Chunk of %s rows failed with code: %s error: %s", len(chunk), e.pgcode, e.pgerror)
+		# A connection that cannot roll back is gone, the handler then fails the import
+		conn.rollback()
+		reason = 'Database error {}: {}'.format(e.pgcode, (e.pgerror or str(e)).strip())
+		for line, record, _ in chunk:
+			report_writer.writerow((line, reason, json.dumps(record, default=str)))
+		totals["rejected"] += len(chunk)
+		return
+	totals["inserted"] += inserted
+	totals["duplicates"] += len(chunk) - inserted
+
+def open_records(stream, file_format, defaults):
+	if file_format == 'ics':
+		return read_ics(stream, defaults)
+	if file_format == 'csv':
+		return read_csv(stream, defaults)
+	raise ValueError("Unsupported import format: {}".format(file_format))
+
+def import_failed(code, message, report_path, totals):
+	# The counts so far tell the caller what was imported before the failure
+	return {
+		"statusCode": code,
+		"message": message,
+		"report": report_path,
+		**totals
+	}
+
+def lambda_handler(event, context):
+	"""Imports a local CSV or ICS file.
+
+	event: {"path": "...", "format": "csv"|"ics", "report_path": "...", "defaults": {"email": "...", "organization": "..."}}
+	"""
+	start_request(context)
+	logger.info('Starting import handler')
+	path = event.get("path")
+	if not path:
+		return return_error(422, 'Missing import path')
+	file_format = (event.get("format") or os.path.splitext(path)[1].lstrip('.')).lower()
+	report_path = event.get("report_path") or path + ".rejected.csv"
+	defaults = event.get("defaults") or {}
+
+	password = get_aws_pass(config.DB_PASS_KEY)
+	if is_error(password):
+		return password
+	# COPY of a large file can legitimately outlast the handlers' statement timeout
+	conn = connect_db(password, statement_timeout_ms=0)
+	if is_error(conn):
+		return conn
+
+	totals = new_totals()
+	try:
+		with open(path, newline='', encoding='utf-8') as stream, open(report_path, 'w', newline='', encoding='utf-8') as report:
+			import_records(conn, open_records(stream, file_format, defaults), report, totals)
+	except (ValueError, OSError, csv.Error) as e:
+		# Covers a missing file, malformed CSV and undecodable bytes, chunks loaded before the failure stay imported
+		logger.error("Failed import after %s: %s", totals, e)
+		return import_failed(422, str(e), report_path, totals)
+	except psycopg2.Error as e:
+		logger.error("Failed database call with code: %s error: %s", e.pgcode, e.pgerror)
+		return import_failed(500, 'Import into database failed', report_path, totals)
+	finally:
+		conn.close()
+
+	logger.info("Import finished: %s", totals)
+	return success(report=report_path, **totals)
+
+if __name__ == '__main__':
+	print(json.dumps(lambda_handler({"path": sys.argv[1], "defaults": json.loads(sys.argv[2]) if len(sys.argv) > 2 else {}}, None)))
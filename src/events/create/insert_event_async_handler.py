@@ -0,0 +1,188 @@
+# Imported first so an enabled cold start profile covers every import below
+from common import profiling
+import asyncio
+from common import aio
+from common import breaker
+from common import config
+from common import metrics
+from common.responses import (
+    is_error,
+    return_error,
+    success
+)
+from common.log import (
+    get_logger,
+    start_request
+)
+from idempotency import (
+    claim_request_async,
+    complete_request_async,
+    fingerprint,
+    get_idempotency_key
+)
+from insert_event_handler import (
+    WRITE_BEHIND,
+    build_values,
+    get_request_data,
+    rate_limit_identity,
+    rate_limited
+)
+from rate_limiter import (
+    RATE_LIMIT_ENABLED,
+    check_rate_limit_async
+)
+from submission_queue import (
+    SUBMISSION_FIELDS,
+    enqueue_submission
+)
+
+logger = get_logger(__name__)
+profiling.mark("handler_imported")
+
+# asyncpg sends typed parameters, so every value goes as text and Postgres casts it like it does for psycopg2 literals
+COLUMN_TYPES = {'price': 'double precision', 'kids': 'boolean', 'date': 'date', 'time': 'time', 'date_submitted': 'date'}
+INSERT = """INSERT INTO user_submitted_event ({}) VALUES ({});""".format(
+	", ".join(SUBMISSION_FIELDS),
+	", ".join("${}::text".format(i) + ("::" + COLUMN_TYPES[field] if field in COLUMN_TYPES else "") for i, field in enumerate(SUBMISSION_FIELDS, 1))
+)
+
+def as_text(value):
+	if value is None:
+		return None
+	if isinstance(value, bool):
+		return 'true' if value else 'false'
+	return str(value)
+
+async def get_redis(password_task):
+	password = await password_task
+	if is_error(password):
+		return password
+	try:
+		return aio.shared_async_redis(password)
+	except Exception as e:
+		logger.error("Failed to connect to redis: %s", e)
+		return return_error(500, 'Error connecting to Redis')
+
+async def get_db():
+	# Fetches its own secret, so a task cancelled before it starts leaves no coroutine unawaited
+	password = await aio.get_aws_pass_async(config.DB_PASS_KEY)
+	if is_error(password):
+		return password
+	return await aio.shared_pg(password)
+
+async def insert_submission(db_task, values, r):
+	import asyncpg
+	conn = await db_task
+	if is_error(conn):
+		return await queue_fallback(r, values, conn)
+	try:
+		with metrics.stage("DbInsert"):
+			await conn.execute(INSERT, *[as_text(value) for value in values])
+	except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError) as e:
+		logger.error("Failed database call with code: %s error: %s", getattr(e, "sqlstate", None), e)
+		if getattr(e, "sqlstate", None) == "23505":
+			return return_error(422, 'The event was already submitted')
+		if aio.pg_unavailable(e):
+			await aio.reset_pg(e)
+			return await queue_fallback(r, values, return_error(500, 'Insert into database failed'))
+		return return_error(500, 'Insert into database failed')
+	breaker.postgres.record_success()
+	return success()
+
+async def queue_submission(r, values):
+	try:
+		with metrics.stage("QueueWrite"):
+			await enqueue_submission(r, values)
+	except Exception as e:
+		logger.error("Failed to queue submission: %s", e)
+		breaker.redis.record_failure()
+		return return_error(500, 'Queueing submission failed')
+	return success(202)
+
+async def queue_fallback(r, values, error):
+	"""Queues the submission for submission_consumer when Postgres is unavailable, otherwise returns error."""
+	if r is None:
+		r = await get_redis(aio.get_aws_pass_async(config.REDIS_PASS_KEY))
+		if is_error(r):
+			return error
+	response = await queue_submission(r, values)
+	if response["statusCode"] != 202:
+		return error
+	logger.warning("Queued submission, database unavailable: %s", error.get("message"))
+	metrics.set_property("Fallback", "queue")
+	return response
+
+async def submit_event(event, data, r, db_task):
+	if RATE_LIMIT_ENABLED and r is not None:
+		with metrics.stage("RateLimit"):
+			retry_after = await check_rate_limit_async(r, *rate_limit_identity(event, data))
+		if retry_after:
+			logger.info("Submission rate limited for %s seconds", retry_after)
+			return rate_limited(retry_after)
+
+	values = build_values(data)
+	if is_error(values):
+		return values
+
+	if WRITE_BEHIND:
+		return await queue_submission(r, values)
+	return await insert_submission(db_task, values, r)
+
+async def handle(event, data):
+	"""Same flow as insert_event_handler, with the independent I/O overlapped.
+
+	Both secrets are fetched together, and the database connection is opened while the
+	idempotency claim and rate limit check run against Redis.
+	"""
+	db_task = None
+	if not WRITE_BEHIND:
+		db_task = asyncio.ensure_future(get_db())
+	try:
+		return await respond(event, data, db_task)
+	finally:
+		# A rate limited, invalid or replayed request returns without awaiting the connection
+		if db_task is not None:
+			await aio.cancel(db_task)
+
+async def respond(event, data, db_task):
+	idempotency_key = get_idempotency_key(event)
+	r = None
+	if RATE_LIMIT_ENABLED or WRITE_BEHIND or idempotency_key:
+		r = await get_redis(aio.get_aws_pass_async(config.REDIS_PASS_KEY))
+		if is_error(r):
+			if WRITE_BEHIND:
+				return r
+			r = None
+
+	if not idempotency_key or r is None:
+		return await submit_event(event, data, r, db_task)
+
+	request_fingerprint = fingerprint(data)
+	try:
+		duplicate = await claim_request_async(r, idempotency_key, request_fingerprint)
+	except Exception as e:
+		logger.error("Idempotency check failed: %s", e)
+		breaker.redis.record_failure()
+		return await submit_event(event, data, r, db_task)
+	if duplicate is not None:
+		metrics.set_property("IdempotentReplay", True)
+		return duplicate
+
+	response = await submit_event(event, data, r, db_task)
+	try:
+		await complete_request_async(r, idempotency_key, request_fingerprint, response)
+	except Exception as e:
+		logger.error("Failed to store idempotent response: %s", e)
+	return response
+
+@profiling.profile_cold_start
+@metrics.instrument('insert_event_async_handler')
+def lambda_handler(event, context):
+	start_request(context)
+	logger.info('Starting lambda handler')
+	try:
+		data = get_request_data(event)
+	except Exception as e:
+		logger.error("Failed json conversion: %s", e)
+		return return_error(500, 'Conversion error')
+	return aio.run(handle(event, data))
@@ -1,54 +1,58 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import logging
+# Imported first so an enabled cold start profile covers every import below
+from common import profiling
 import json
 import os
-import requests
-from dotenv import load_dotenv
 import html
+import base64
 import re
 from datetime import datetime
+from common import breaker
+from common import config
+from common import metrics
+from common.cache import shared_redis
+from common.db import (
+    execute_prepared,
+    is_unavailable,
+    record_db_success,
+    reset_db,
+    shared_db
+)
+from common.responses import (
+    is_error,
+    return_error,
+    success
+)
+from common.secrets import get_aws_pass
+from common.log import (
+    get_logger,
+    start_request
+)
 from validators import (
     validate_user_input,
     validate_required_user_input_exists
 )
+from idempotency import (
+    claim_request,
+    complete_request,
+    fingerprint,
+    get_idempotency_key
+)
+from rate_limiter import (
+    RATE_LIMIT_ENABLED,
+    check_rate_limit
+)
+from submission_queue import (
+    SUBMISSION_FIELDS,
+    enqueue_submission
+)
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-INSERT = """INSERT INTO user_submitted_event (name, price, description, link, kids, location_name, date, time, business, email, date_submitted) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);"""
-
-if os.path.exists('.env'):
-	load_dotenv()
-	logger.info("Loaded environment from .env file")
-else:
-	logger.info("No .env file")
-
-aws_session_token = os.environ['AWS_SESSION_TOKEN']
-env = os.environ['ENV']
-url=os.environ['PARAMETERS_SECRETS_EXTENSION_URL']
+logger = get_logger(__name__)
+profiling.mark("handler_imported")
 
-dbname = os.environ['DB_NAME']
-user = os.environ['DB_USER']
-port = os.environ['DB_PORT']
-host = os.environ['DB_HOST']
-DB_PASS_KEY=os.environ['DB_PASS_KEY']
+INSERT = """INSERT INTO user_submitted_event ({}) VALUES ({});""".format(", ".join(SUBMISSION_FIELDS), ", ".join(["%s"] * len(SUBMISSION_FIELDS)))
 
-def return_error(code, message):
-	return {
-		"statusCode": code,
-		"message": message
-	}
-
-def connect_db(pg_connection):
-	logger.info("Connecting to database")
-	try:
-		conn = psycopg2.connect(**pg_connection)
-	except psycopg2.Error as e:
-		logger.error("Failed database call with code: {} error: {}".format(e.pgcode, e.pgerror))
-		return return_error(500, 'Error connecting to database')
-	return conn
+# When enabled, validated submissions are appended to a Redis Stream and written by submission_consumer
+WRITE_BEHIND = os.environ.get('SUBMISSION_WRITE_BEHIND', 'false').lower() == 'true'
 
 def sanitize_input(input_str):
 	if not input_str:
@@ -68,49 +72,124 @@ def sanitize_input(input_str):
 	sanitized_str = html.escape(sanitized_str)
 	return sanitized_str
 
+def get_redis():
+	redis_password = get_aws_pass(config.REDIS_PASS_KEY)
+	if is_error(redis_password):
+		return redis_password
+	try:
+		return shared_redis(redis_password)
+	except Exception as e:
+		logger.error("Failed to connect to redis: %s", e)
+		return return_error(500, 'Error connecting to Redis')
+
+def get_source_ip(event):
+	# API Gateway REST (v1) and HTTP (v2) proxy events keep the caller address in different places
+	request_context = event.get("requestContext") or {}
+	identity = request_context.get("identity") or {}
+	http = request_context.get("http") or {}
+	return identity.get("sourceIp") or http.get("sourceIp")
+
+def get_request_data(event):
+	if not isinstance(event, (dict, list)):
+		return json.loads(event)
+	if isinstance(event, dict) and "requestContext" in event and "body" in event:
+		body = event.get("body") or "{}"
+		if event.get("isBase64Encoded"):
+			body = base64.b64decode(body).decode("utf-8")
+		return json.loads(body) if isinstance(body, str) else body
+	return event
+
+def rate_limited(retry_after):
+	return {
+		"statusCode": 429,
+		"headers": {"Retry-After": str(retry_after)},
+		"message": 'Too many submissions, try again later'
+	}
+
+def queue_submission(r, values):
+	try:
+		with metrics.stage("QueueWrite"), breaker.redis.guard():
+			enqueue_submission(r, values)
+	except Exception as e:
+		logger.error("Failed to queue submission: %s", e)
+		return return_error(500, 'Queueing submission failed')
+	return success(202)
+
+@profiling.profile_cold_start
+@metrics.instrument('insert_event_handler')
 def lambda_handler(event, context):
+	start_request(context)
 	logger.info('Starting lambda handler')
-	password=''
 	try:
-		url_config=url+"/systemsmanager/parameters/get"
-		logger.info("Parameter getter has started with url {}".format(url_config))
-		res = requests.get(
-    		url_config,
-    		headers={"X-Aws-Parameters-Secrets-Token": aws_session_token},
-    		params={"name": DB_PASS_KEY, "withDecryption": "true"}
-    		)
-		password = res.json()['Parameter']['Value']
+		data = get_request_data(event)
 	except Exception as e:
-		logger.error({e})
-		return return_error(500, 'Server parameter retrieval error')
-
-	pg_connection = {
-		'dbname': dbname,
-		'user': user,
-		'password': password,
-		'port': port,
-		'host': host
-	}
-	conn = connect_db(pg_connection)
+		logger.error("Failed json conversion: %s", e)
+		return return_error(500, 'Conversion error')
 
-	if not isinstance(event, (dict, list)):
-		try:
-			data = json.loads(event)
-		except Exception as e:
-			logger.error("Failed json conversion: {} and error: {}".format(e.stackTrace()))
-			return return_error(500, 'Conversion error')
-	else:
-		data = event
-
-	name = sanitize_input(data.get("name", None))
-	descrip = sanitize_input(data.get("description", None))
-	org = sanitize_input(data.get("organization", None))
-	location = sanitize_input(data.get("location", None))
-
-	if not validate_required_user_input_exists(data): 
-		return return_error(422, 'Missing required input')
-	if not validate_user_input(data, name, descrip, org, location):
-		return return_error(422, 'Input entered is invalid')
+	idempotency_key = get_idempotency_key(event)
+	r = None
+	if RATE_LIMIT_ENABLED or WRITE_BEHIND or idempotency_key:
+		r = get_redis()
+		if is_error(r):
+			if WRITE_BEHIND:
+				return r
+			r = None
+
+	if not idempotency_key or r is None:
+		return submit_event(event, data, r)
+
+	request_fingerprint = fingerprint(data)
+	try:
+		duplicate = claim_request(r, idempotency_key, request_fingerprint)
+	except Exception as e:
+		logger.error("Idempotency check failed: %s", e)
+		breaker.redis.record_failure()
+		return submit_event(event, data, r)
+	if duplicate is not None:
+		metrics.set_property("IdempotentReplay", True)
+		return duplicate
+
+	response = submit_event(event, data, r)
+	try:
+		complete_request(r, idempotency_key, request_fingerprint, response)
+	except Exception as e:
+		logger.error("Failed to store idempotent response: %s", e)
+	return response
+
+def rate_limit_identity(event, data):
+	source_ip = get_source_ip(event) if isinstance(event, dict) else None
+	email = data.get('email') if isinstance(data.get('email'), str) else None
+	return email, source_ip
+
+def submit_event(event, data, r):
+	if RATE_LIMIT_ENABLED and r is not None:
+		with metrics.stage("RateLimit"):
+			retry_after = check_rate_limit(r, *rate_limit_identity(event, data))
+		if retry_after:
+			logger.info("Submission rate limited for %s seconds", retry_after)
+			return rate_limited(retry_after)
+
+	values = build_values(data)
+	if is_error(values):
+		return values
+
+	if WRITE_BEHIND:
+		return queue_submission(r, values)
+
+	return insert_submission(values, r)
+
+def build_values(data):
+	"""Sanitizes and validates the submission, returning its row values or an error response."""
+	with metrics.stage("Validate"):
+		name = sanitize_input(data.get("name", None))
+		descrip = sanitize_input(data.get("description", None))
+		org = sanitize_input(data.get("organization", None))
+		location = sanitize_input(data.get("location", None))
+
+		if not validate_required_user_input_exists(data): 
+			return return_error(422, 'Missing required input')
+		if not validate_user_input(data, name, descrip, org, location):
+			return return_error(422, 'Input entered is invalid')
 
 	time = data.get("time", None)
 	price = data.get("price", None)
@@ -119,21 +198,43 @@ def lambda_handler(event, context):
 	date = data.get("date", None)
 	email = data.get('email', None)
 	today = datetime.now().strftime('%Y-%m-%d')
+	return (name, price, descrip, link, kids, location, date, time, org, email, today)
+
+def insert_submission(values, r=None):
+	import psycopg2
+	password = get_aws_pass(config.DB_PASS_KEY)
+	if is_error(password):
+		return password
+
+	conn = shared_db(password)
+	if is_error(conn):
+		return queue_fallback(r, values, conn)
 
 	try:
-		with conn.cursor(cursor_factory=RealDictCursor) as cur:
-			cur.execute(INSERT, (name, price, descrip, link, kids, location, date, time, org, email, today))
+		with metrics.stage("DbInsert"), conn.cursor() as cur:
+			execute_prepared(cur, "insert_submission", INSERT, values)
 			conn.commit()
 			cur.close()
-		conn.close()
 	except psycopg2.Error as e:
-		logger.error("Failed database call with code: {} error: {}".format(e.pgcode, e.pgerror))
+		logger.error("Failed database call with code: %s error: %s", e.pgcode, e.pgerror)
+		reset_db(e)
 		if e.pgcode == "23505":
 			return return_error(422, 'The event was already submitted')
+		if is_unavailable(e):
+			return queue_fallback(r, values, return_error(500, 'Insert into database failed'))
 		return return_error(500, 'Insert into database failed')
-	return {
-		"statusCode": 200,
-        "body": json.dumps({
-            "message": "Successful",
-        }, default=str) 
-	}
\ No newline at end of file
+	record_db_success(conn)
+	return success()
+
+def queue_fallback(r, values, error):
+	"""Queues the submission for submission_consumer when Postgres is unavailable, otherwise returns error."""
+	if r is None:
+		r = get_redis()
+		if is_error(r):
+			return error
+	response = queue_submission(r, values)
+	if response["statusCode"] != 202:
+		return error
+	logger.warning("Queued submission, database unavailable: %s", error.get("message"))
+	metrics.set_property("Fallback", "queue")
+	return response
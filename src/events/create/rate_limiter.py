@@ -0,0 +1,93 @@
+import hashlib
+import os
+from common import config  # loads .env before the lookups below
+from common import breaker
+from common.log import get_logger
+
+logger = get_logger(__name__)
+
+RATE_LIMIT_ENABLED = os.environ.get('SUBMISSION_RATE_LIMIT_ENABLED', 'false').lower() == 'true'
+EMAIL_LIMIT = int(os.environ.get('SUBMISSION_EMAIL_LIMIT', '5'))
+EMAIL_WINDOW_SECONDS = int(os.environ.get('SUBMISSION_EMAIL_WINDOW_SECONDS', '3600'))
+SOURCE_LIMIT = int(os.environ.get('SUBMISSION_SOURCE_LIMIT', '20'))
+SOURCE_WINDOW_SECONDS = int(os.environ.get('SUBMISSION_SOURCE_WINDOW_SECONDS', '3600'))
+# Buckets are keyed submission_rate:{email:<hash>} and submission_rate:{source:<ip>}. Each is hash tagged
+# on its own identity, so a cluster spreads them over its slots instead of sending every submitter to one primary.
+KEY_PREFIX = 'submission_rate'
+
+# Token bucket in KEYS[1], refilled continuously at ARGV[1] tokens per ARGV[2] milliseconds.
+# Takes a token and returns 0, or returns the milliseconds until a token is available.
+TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local capacity = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local rate = capacity / window
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local available = tonumber(bucket[1]) or capacity
+local last = tonumber(bucket[2]) or now
+available = math.min(capacity, available + (now - last) * rate)
+if available < 1 then
+	return math.ceil((1 - available) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(available - 1), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], window)
+return 0
+"""
+
+def hash_identity(value):
+	return hashlib.sha256(value.strip().lower().encode('utf-8')).hexdigest()[:32]
+
+def build_limits(email, source_ip):
+	# Returns (key, capacity, window in milliseconds) for each bucket the submission is charged to
+	limits = []
+	if email:
+		limits.append(("{}:{{email:{}}}".format(KEY_PREFIX, hash_identity(email)), EMAIL_LIMIT, EMAIL_WINDOW_SECONDS * 1000))
+	if source_ip:
+		limits.append(("{}:{{source:{}}}".format(KEY_PREFIX, source_ip), SOURCE_LIMIT, SOURCE_WINDOW_SECONDS * 1000))
+	return limits
+
+def queue_buckets(pipe, limits):
+	# The buckets are in different slots, so each gets its own script call. They are pipelined into
+	# one round trip, or one per node on a cluster, and a bucket with a token is charged even when
+	# another one rejects the submission.
+	for key, capacity, window_ms in limits:
+		pipe.eval(TOKEN_BUCKET_SCRIPT, 1, key, capacity, window_ms)
+
+def retry_after_seconds(wait_ms):
+	return max(1, -(-int(wait_ms) // 1000))
+
+def check_rate_limit(r, email, source_ip):
+	"""Returns 0 when the submission is allowed, otherwise the Retry-After value in seconds."""
+	limits = build_limits(email, source_ip)
+	if not limits:
+		return 0
+	try:
+		with r.pipeline(transaction=False) as pipe:
+			queue_buckets(pipe, limits)
+			wait_ms = max(pipe.execute())
+	except Exception as e:
+		# Fail open so a Redis outage does not block submissions
+		logger.error("Rate limit check failed: %s", e)
+		breaker.redis.record_failure()
+		return 0
+	if not wait_ms:
+		return 0
+	return retry_after_seconds(wait_ms)
+
+async def check_rate_limit_async(r, email, source_ip):
+	"""check_rate_limit for a redis.asyncio client."""
+	limits = build_limits(email, source_ip)
+	if not limits:
+		return 0
+	try:
+		async with r.pipeline(transaction=False) as pipe:
+			queue_buckets(pipe, limits)
+			wait_ms = max(await pipe.execute())
+	except Exception as e:
+		logger.error("Rate limit check failed: %s", e)
+		breaker.redis.record_failure()
+		return 0
+	if not wait_ms:
+		return 0
+	return retry_after_seconds(wait_ms)
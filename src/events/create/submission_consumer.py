@@ -0,0 +1,125 @@
+import psycopg2
+from psycopg2.extras import execute_values
+import os
+from common import config
+from common.cache import connect_redis
+from common.db import (
+    connect_db,
+    is_unavailable
+)
+from common.responses import (
+    is_error,
+    return_error,
+    success
+)
+from common.secrets import get_aws_pass
+from common.log import (
+    get_logger,
+    start_request
+)
+from submission_queue import (
+    SUBMISSION_FIELDS,
+    ack,
+    dead_letter,
+    decode_submission,
+    delivery_count,
+    ensure_consumer_group,
+    read_batch,
+    MAX_DELIVERIES
+)
+
+logger = get_logger(__name__)
+
+# Duplicates are dropped instead of failing the whole batch, matching the 23505 handling of the direct insert
+INSERT_BATCH = """INSERT INTO user_submitted_event ({}) VALUES %s ON CONFLICT ON CONSTRAINT unique_event_name_link_date DO NOTHING;""".format(", ".join(SUBMISSION_FIELDS))
+MAX_BATCHES = int(os.environ.get('SUBMISSION_MAX_BATCHES', '20'))
+CONSUMER_NAME = os.environ.get('SUBMISSION_CONSUMER_NAME', os.environ.get('AWS_LAMBDA_LOG_STREAM_NAME', 'local'))
+
+def insert_rows(conn, rows):
+	with conn.cursor() as cur:
+		execute_values(cur, INSERT_BATCH, rows, page_size=len(rows))
+	conn.commit()
+
+def retry_or_dead_letter(r, entry_id, fields, reason):
+	# Entries below the delivery limit stay pending and are reclaimed by read_batch after the idle timeout
+	if delivery_count(r, entry_id) >= MAX_DELIVERIES:
+		dead_letter(r, entry_id, fields, reason)
+	else:
+		logger.info("Submission %s left pending for retry: %s", entry_id, reason)
+
+def recover(conn, error):
+	# A lost connection is raised again so the run stops with the remaining entries still pending,
+	# rather than failing every row against it and spending their deliveries
+	if is_unavailable(error):
+		raise error
+	try:
+		conn.rollback()
+	except psycopg2.Error as e:
+		logger.error("Rollback failed: %s", e)
+		raise e from error
+
+def write_batch(r, conn, entries):
+	decoded = []
+	for entry_id, fields in entries:
+		try:
+			decoded.append((entry_id, fields, decode_submission(fields)))
+		except Exception as e:
+			dead_letter(r, entry_id, fields, 'Undecodable submission: {}'.format(e))
+
+	if not decoded:
+		return 0
+	try:
+		insert_rows(conn, [row for _, _, row in decoded])
+		ack(r, [entry_id for entry_id, _, _ in decoded])
+		return len(decoded)
+	except psycopg2.Error as e:
+		recover(conn, e)
+		logger.error("Batch insert failed with code: %s error: %s, retrying rows individually", e.pgcode, e.pgerror)
+
+	written = 0
+	for entry_id, fields, row in decoded:
+		try:
+			insert_rows(conn, [row])
+			ack(r, [entry_id])
+			written += 1
+		except psycopg2.Error as e:
+			recover(conn, e)
+			retry_or_dead_letter(r, entry_id, fields, "{}: {}".format(e.pgcode, e.pgerror))
+	return written
+
+def lambda_handler(event, context):
+	start_request(context)
+	logger.info('Starting submission consumer')
+	db_password = get_aws_pass(config.DB_PASS_KEY)
+	redis_password = get_aws_pass(config.REDIS_PASS_KEY)
+	if is_error(db_password):
+		return db_password
+	if is_error(redis_password):
+		return redis_password
+
+	try:
+		r = connect_redis(redis_password)
+		ensure_consumer_group(r)
+	except Exception as e:
+		logger.error("Failed to connect to redis: %s", e)
+		return return_error(500, 'Error connecting to Redis')
+	conn = connect_db(db_password)
+	if is_error(conn):
+		return conn
+
+	written = 0
+	try:
+		for _ in range(MAX_BATCHES):
+			entries = read_batch(r, CONSUMER_NAME)
+			if not entries:
+				break
+			written += write_batch(r, conn, entries)
+	except psycopg2.Error as e:
+		# Unacknowledged entries are reclaimed by the next run
+		logger.error("Stopped after %s submissions, database connection lost: %s", written, e)
+		return return_error(500, 'Database connection lost, remaining submissions stay queued')
+	finally:
+		conn.close()
+
+	logger.info("Wrote %s queued submissions", written)
+	return success(written=written)
@@ -0,0 +1,67 @@
+import json
+import os
+from common import config  # loads .env before the lookups below
+from common.log import get_logger
+
+logger = get_logger(__name__)
+
+# Column order of user_submitted_event used by both the direct insert and the stream consumer
+SUBMISSION_FIELDS = ('name', 'price', 'description', 'link', 'kids', 'location_name', 'date', 'time', 'business', 'email', 'date_submitted')
+
+# The hash tag keeps the dead letter stream in the stream's cluster slot, dead_letter moves entries in one transaction
+SUBMISSION_STREAM = os.environ.get('SUBMISSION_STREAM', '{event_submissions}')
+DEAD_LETTER_STREAM = os.environ.get('SUBMISSION_DEAD_LETTER_STREAM', SUBMISSION_STREAM + ':dead')
+CONSUMER_GROUP = os.environ.get('SUBMISSION_CONSUMER_GROUP', 'submission_writers')
+STREAM_MAXLEN = int(os.environ.get('SUBMISSION_STREAM_MAXLEN', '100000'))
+BATCH_SIZE = int(os.environ.get('SUBMISSION_BATCH_SIZE', '500'))
+MAX_DELIVERIES = int(os.environ.get('SUBMISSION_MAX_DELIVERIES', '5'))
+RETRY_IDLE_MS = int(os.environ.get('SUBMISSION_RETRY_IDLE_MS', '60000'))
+
+def encode_submission(values):
+	return {"row": json.dumps(dict(zip(SUBMISSION_FIELDS, values)), default=str)}
+
+def decode_submission(fields):
+	row = json.loads(fields["row"])
+	return tuple(row.get(field) for field in SUBMISSION_FIELDS)
+
+def enqueue_submission(r, values):
+	return r.xadd(SUBMISSION_STREAM, encode_submission(values), maxlen=STREAM_MAXLEN, approximate=True)
+
+def ensure_consumer_group(r):
+	from redis.exceptions import ResponseError
+	try:
+		r.xgroup_create(SUBMISSION_STREAM, CONSUMER_GROUP, id='0', mkstream=True)
+	except ResponseError as e:
+		if 'BUSYGROUP' not in str(e):
+			raise
+
+def read_batch(r, consumer):
+	# Entries left pending by a failed or crashed consumer are retried before new ones are read
+	# Redis 7 also returns the ids of deleted entries, 6.2 only the cursor and the entries
+	entries = r.xautoclaim(SUBMISSION_STREAM, CONSUMER_GROUP, consumer, RETRY_IDLE_MS, start_id='0-0', count=BATCH_SIZE)[1]
+	if entries:
+		return entries
+	response = r.xreadgroup(CONSUMER_GROUP, consumer, {SUBMISSION_STREAM: '>'}, count=BATCH_SIZE)
+	if not response:
+		return []
+	return response[0][1]
+
+def ack(r, entry_ids):
+	if entry_ids:
+		r.xack(SUBMISSION_STREAM, CONSUMER_GROUP, *entry_ids)
+
+def delivery_count(r, entry_id):
+	pending = r.xpending_range(SUBMISSION_STREAM, CONSUMER_GROUP, min=entry_id, max=entry_id, count=1)
+	if not pending:
+		return 0
+	return pending[0]['times_delivered']
+
+def dead_letter(r, entry_id, fields, reason):
+	logger.error("Moving submission %s to dead letter stream: %s", entry_id, reason)
+	dead_fields = dict(fields)
+	dead_fields['source_id'] = entry_id
+	dead_fields['error'] = reason
+	pipe = r.pipeline()
+	pipe.xadd(DEAD_LETTER_STREAM, dead_fields, maxlen=STREAM_MAXLEN, approximate=True)
+	pipe.xack(SUBMISSION_STREAM, CONSUMER_GROUP, entry_id)
+	pipe.execute()
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import idempotency
+from idempotency import (
+    claim_request,
+    claim_request_async,
+    complete_request,
+    complete_request_async,
+    fingerprint,
+    get_idempotency_key,
+    redis_key
+)
+
+
+class TestGetIdempotencyKey:
+
+    def test_header_lookup_is_case_insensitive(self):
+        assert get_idempotency_key({"headers": {"Idempotency-Key": "abc"}}) == "abc"
+        assert get_idempotency_key({"headers": {"idempotency-key": " abc "}}) == "abc"
+
+    def test_missing_header(self):
+        assert get_idempotency_key({"headers": None}) is None
+        assert get_idempotency_key({}) is None
+        assert get_idempotency_key('{"name": "Pottery"}') is None
+
+
+class TestFingerprint:
+
+    def test_key_order_does_not_matter(self):
+        assert fingerprint({"a": 1, "b": 2}) == fingerprint({"b": 2, "a": 1})
+
+    def test_different_payloads_differ(self):
+        assert fingerprint({"a": 1}) != fingerprint({"a": 2})
+
+
+class TestClaimAndComplete:
+
+    def test_first_request_claims_the_key(self, fake_redis):
+        assert claim_request(fake_redis(), "abc", "fp") is None
+
+    def test_completed_response_is_replayed(self, fake_redis):
+        r = fake_redis()
+        response = {"statusCode": 200, "body": "{}"}
+        claim_request(r, "abc", "fp")
+        complete_request(r, "abc", "fp", response)
+
+        assert claim_request(r, "abc", "fp") == response
+
+    def test_key_reused_with_different_request(self, fake_redis):
+        r = fake_redis()
+        claim_request(r, "abc", "fp")
+        complete_request(r, "abc", "fp", {"statusCode": 200})
+
+        assert claim_request(r, "abc", "other")["statusCode"] == 422
+
+    def test_server_errors_release_the_key(self, fake_redis):
+        r = fake_redis()
+        claim_request(r, "abc", "fp")
+        complete_request(r, "abc", "fp", {"statusCode": 500, "message": "failed"})
+
+        assert redis_key("abc") not in r.data
+        assert claim_request(r, "abc", "fp") is None
+
+    def test_rate_limited_responses_are_not_stored(self, fake_redis):
+        r = fake_redis()
+        claim_request(r, "abc", "fp")
+        complete_request(r, "abc", "fp", {"statusCode": 429})
+
+        assert redis_key("abc") not in r.data
+
+    def test_in_flight_duplicate_times_out_with_conflict(self, fake_redis, monkeypatch):
+        monkeypatch.setattr(idempotency, "WAIT_SECONDS", 0)
+        r = fake_redis()
+        claim_request(r, "abc", "fp")
+
+        assert claim_request(r, "abc", "fp")["statusCode"] == 409
+
+    def test_stored_record_contains_response(self, fake_redis):
+        r = fake_redis()
+        claim_request(r, "abc", "fp")
+        complete_request(r, "abc", "fp", {"statusCode": 202})
+        record = json.loads(r.data[redis_key("abc")])
+
+        assert record["state"] == "complete"
+        assert record["response"] == {"statusCode": 202}
+
+
+class TestAsyncClaimAndComplete:
+
+    def test_completed_response_is_replayed(self, async_fake_redis):
+        r = async_fake_redis()
+        response = {"statusCode": 200, "body": "{}"}
+        assert asyncio.run(claim_request_async(r, "abc", "fp")) is None
+        asyncio.run(complete_request_async(r, "abc", "fp", response))
+        assert asyncio.run(claim_request_async(r, "abc", "fp")) == response
+
+    def test_server_errors_release_the_key(self, async_fake_redis):
+        r = async_fake_redis()
+        asyncio.run(claim_request_async(r, "abc", "fp"))
+        asyncio.run(complete_request_async(r, "abc", "fp", {"statusCode": 500}))
+        assert r.data == {}
+
+    def test_in_flight_duplicate_times_out_with_conflict(self, async_fake_redis, monkeypatch):
+        monkeypatch.setattr(idempotency, "WAIT_SECONDS", 0)
+        r = async_fake_redis()
+        asyncio.run(claim_request_async(r, "abc", "fp"))
+        assert asyncio.run(claim_request_async(r, "abc", "fp"))["statusCode"] == 409
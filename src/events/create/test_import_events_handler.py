@@ -0,0 +1,189 @@
+import pytest
+import io
+import csv
+import psycopg2
+import import_events_handler
+from import_events_handler import (
+    copy_field,
+    import_records,
+    parse_ics_datetime,
+    read_csv,
+    read_ics,
+    to_row,
+    unescape_ics
+)
+
+DEFAULTS = {"email": "imports@example.com", "organization": "Clay Co"}
+
+CSV_FEED = """name,description,location,date,time,price,link,kids
+Pottery Workshop,Learn pottery,Studio,2026-05-12,14:00,45,https://example.com/pottery,true
+Missing Date,Learn pottery,Studio,,14:00,45,https://example.com/pottery,false
+"""
+
+ICS_FEED = """BEGIN:VCALENDAR\r
+BEGIN:VEVENT\r
+SUMMARY:Watercolor\\, for beginners\r
+DESCRIPTION:A long description that is\r
+  folded across lines\r
+DTSTART:20260512T140000\r
+LOCATION:Art Studio\r
+URL:https://example.com/watercolor\r
+ORGANIZER;CN="Paint Place":mailto:paint@example.com\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+
+class TestReadCsv:
+
+    def test_rows_are_merged_with_defaults(self):
+        records = list(read_csv(io.StringIO(CSV_FEED), DEFAULTS))
+
+        assert len(records) == 2
+        line, record = records[0]
+        assert line == 2
+        assert record["organization"] == "Clay Co"
+        assert record["kids"] is True
+
+    def test_empty_cells_are_left_out(self):
+        _, record = list(read_csv(io.StringIO(CSV_FEED), DEFAULTS))[1]
+
+        assert "date" not in record
+        assert record["kids"] is False
+
+
+class TestReadIcs:
+
+    def test_event_properties_are_mapped(self):
+        records = list(read_ics(io.StringIO(ICS_FEED), DEFAULTS))
+
+        assert len(records) == 1
+        line, record = records[0]
+        assert line == 2
+        assert record["name"] == "Watercolor, for beginners"
+        assert record["description"] == "A long description that is folded across lines"
+        assert record["date"] == "2026-05-12"
+        assert record["time"] == "14:00:00"
+        assert record["organization"] == "Paint Place"
+        assert record["email"] == "imports@example.com"
+
+    def test_properties_outside_events_are_ignored(self):
+        feed = "BEGIN:VCALENDAR\nSUMMARY:Calendar name\nEND:VCALENDAR\n"
+
+        assert list(read_ics(io.StringIO(feed), DEFAULTS)) == []
+
+    def test_unescape(self):
+        assert unescape_ics(r"a\;b\nc\\d") == "a;b\nc\\d"
+
+
+class TestParseIcsDatetime:
+
+    def test_all_day_event_has_no_time(self):
+        assert parse_ics_datetime("VALUE=DATE", "20260512") == ("2026-05-12", None)
+
+    def test_utc_time_is_converted_to_import_timezone(self):
+        assert parse_ics_datetime("", "20260512T180000Z") == ("2026-05-12", "14:00:00")
+
+    def test_invalid_value_raises(self):
+        with pytest.raises(ValueError):
+            parse_ics_datetime("", "tomorrow")
+
+
+class TestToRow:
+
+    def test_valid_record_is_sanitized(self):
+        record = dict(DEFAULTS, name="<b>Pottery</b>", location="Studio", date="2026-05-12", time="14:00", link="https://example.com")
+        row, reason = to_row(record, "2026-05-01")
+
+        assert reason is None
+        assert row[0] == "&lt;b&gt;Pottery&lt;/b&gt;"
+        assert row[-1] == "2026-05-01"
+
+    def test_missing_required_input(self):
+        assert to_row({"name": "Pottery"}, "2026-05-01") == (None, 'Missing required input')
+
+    def test_invalid_input(self):
+        record = dict(DEFAULTS, name="Pottery", location="Studio", date="2020-05-12", time="14:00", link="https://example.com")
+
+        assert to_row(record, "2026-05-01") == (None, 'Input entered is invalid')
+
+
+class TestImportRecords:
+
+    def test_valid_rows_are_copied_in_chunks_and_rejects_reported(self, monkeypatch):
+        chunks = []
+        monkeypatch.setattr(import_events_handler, "IMPORT_CHUNK_SIZE", 1)
+        monkeypatch.setattr(import_events_handler, "copy_chunk", lambda conn, rows: chunks.append(list(rows)) or len(rows))
+        report = io.StringIO()
+        totals = import_records(None, read_csv(io.StringIO(CSV_FEED), DEFAULTS), report)
+
+        assert totals == {"read": 2, "inserted": 1, "rejected": 1, "duplicates": 0}
+        assert len(chunks) == 1
+        rejected = list(csv.reader(io.StringIO(report.getvalue())))
+        assert rejected[0] == ["line", "reason", "record"]
+        assert rejected[1][:2] == ["3", "Missing required input"]
+
+    def test_failed_chunk_is_reported_and_the_import_goes_on(self, fake_db, monkeypatch):
+
+        def copy_chunk(conn, rows):
+            if rows[0][0] == "Pottery Workshop":
+                raise psycopg2.DataError("value too long")
+            return len(rows)
+        monkeypatch.setattr(import_events_handler, "IMPORT_CHUNK_SIZE", 1)
+        monkeypatch.setattr(import_events_handler, "copy_chunk", copy_chunk)
+        conn = fake_db()
+        feed = CSV_FEED.replace("Missing Date,Learn pottery,Studio,,", "Weaving,Learn weaving,Studio,2026-05-13,")
+        report = io.StringIO()
+        totals = import_records(conn, read_csv(io.StringIO(feed), DEFAULTS), report)
+
+        assert totals == {"read": 2, "inserted": 1, "rejected": 1, "duplicates": 0}
+        assert conn.rollbacks == 1
+        rejected = list(csv.reader(io.StringIO(report.getvalue())))
+        assert rejected[1][0] == "2"
+        assert rejected[1][1].startswith("Database error")
+        assert "Pottery Workshop" in rejected[1][2]
+
+
+class TestCopyField:
+
+    def test_only_none_is_left_unquoted(self):
+        assert [copy_field(value) for value in (None, "", 'say "hi"', 45, True)] == ['', '""', '"say ""hi"""', '"45"', '"True"']
+
+
+class TestHandler:
+
+    @pytest.fixture
+    def run(self, fake_db, monkeypatch, tmp_path):
+        # Every valid row is "inserted", so the totals show how far the import got
+        monkeypatch.setattr(import_events_handler, "get_aws_pass", lambda key: "password")
+        monkeypatch.setattr(import_events_handler, "connect_db", lambda password, **options: fake_db())
+        monkeypatch.setattr(import_events_handler, "copy_chunk", lambda conn, rows: len(rows))
+        monkeypatch.setattr(import_events_handler, "IMPORT_CHUNK_SIZE", 1)
+
+        def run(content=None):
+            path = tmp_path / "events.csv"
+            if content is not None:
+                path.write_bytes(content)
+            return import_events_handler.lambda_handler({"path": str(path), "defaults": DEFAULTS}, None)
+        return run
+
+    def test_missing_file_is_rejected(self, run):
+        response = run()
+        assert response["statusCode"] == 422
+        assert response["read"] == 0
+
+    def test_malformed_csv_returns_the_totals_so_far(self, run):
+        response = run((CSV_FEED + "x" * 200000 + "\n").encode())
+        assert response["statusCode"] == 422
+        assert "field larger than field limit" in response["message"]
+        assert (response["read"], response["inserted"], response["rejected"]) == (2, 1, 1)
+
+    def test_undecodable_bytes_keep_the_rows_read_before_them(self, run, monkeypatch):
+        # Past the text reader's first decoded block, so rows are read before the error and loaded as the last chunk
+        monkeypatch.setattr(import_events_handler, "IMPORT_CHUNK_SIZE", 1000)
+        rows = CSV_FEED.splitlines()[1] + "\n"
+        response = run((CSV_FEED + rows * 200).encode() + b"\xff\xfe\n")
+        assert response["statusCode"] == 422
+        assert response["inserted"] > 0
+        assert response["read"] == response["inserted"] + response["rejected"] + response["duplicates"]
+        assert response["report"].endswith(".rejected.csv")
@@ -0,0 +1,60 @@
+import pytest
+import asyncio
+import insert_event_async_handler
+from insert_event_async_handler import (
+    INSERT,
+    as_text,
+    handle
+)
+
+
+class TestInsert:
+
+    def test_values_are_cast_from_text(self):
+        assert "$2::text::double precision" in INSERT
+        assert "$5::text::boolean" in INSERT
+        assert "$1::text," in INSERT
+
+    def test_as_text(self):
+        assert as_text(None) is None
+        assert as_text(True) == 'true'
+        assert as_text(25.5) == '25.5'
+        assert as_text('Pottery') == 'Pottery'
+
+
+class TestHandle:
+
+    @pytest.fixture
+    def loop(self, monkeypatch):
+        connecting = []
+
+        async def get_db():
+            connecting.append(True)
+            await asyncio.sleep(10)
+
+        async def get_redis(password_task):
+            await password_task
+            return object()
+
+        async def get_pass(key):
+            await asyncio.sleep(0)
+            return "password"
+
+        async def limited(r, *identity):
+            return 30
+        monkeypatch.setattr(insert_event_async_handler, "WRITE_BEHIND", False)
+        monkeypatch.setattr(insert_event_async_handler, "RATE_LIMIT_ENABLED", True)
+        monkeypatch.setattr(insert_event_async_handler, "get_db", get_db)
+        monkeypatch.setattr(insert_event_async_handler, "get_redis", get_redis)
+        monkeypatch.setattr(insert_event_async_handler, "check_rate_limit_async", limited)
+        monkeypatch.setattr(insert_event_async_handler.aio, "get_aws_pass_async", get_pass)
+        loop = asyncio.new_event_loop()
+        yield loop, connecting
+        loop.close()
+
+    def test_early_return_cancels_the_connection(self, loop):
+        loop, connecting = loop
+        response = loop.run_until_complete(handle({"headers": {}}, {"email": "a@example.com"}))
+        assert response["statusCode"] == 429
+        assert len(connecting) == 1
+        assert [task for task in asyncio.all_tasks(loop) if not task.done()] == []
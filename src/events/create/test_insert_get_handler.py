@@ -1,6 +1,14 @@
 import pytest
 import html
-from insert_event_handler import sanitize_input
+import psycopg2
+import insert_event_handler
+from common.responses import return_error
+from insert_event_handler import (
+    get_request_data,
+    get_source_ip,
+    insert_submission,
+    sanitize_input
+)
 
 
 class TestSanitizeInput:
@@ -80,3 +88,59 @@ class TestSanitizeInput:
         result = sanitize_input(input_str)
 
         assert result == input_str
+
+
+class TestRequestParsing:
+
+    def test_direct_invocation_event_is_the_payload(self):
+        event = {"name": "Pottery"}
+
+        assert get_request_data(event) is event
+
+    def test_json_string_event_is_parsed(self):
+        assert get_request_data('{"name": "Pottery"}') == {"name": "Pottery"}
+
+    def test_proxy_event_body_is_parsed(self):
+        event = {"requestContext": {}, "body": '{"name": "Pottery"}'}
+
+        assert get_request_data(event) == {"name": "Pottery"}
+
+    def test_base64_proxy_event_body_is_decoded(self):
+        event = {"requestContext": {}, "body": "eyJuYW1lIjogIlBvdHRlcnkifQ==", "isBase64Encoded": True}
+
+        assert get_request_data(event) == {"name": "Pottery"}
+
+    def test_source_ip_from_rest_and_http_events(self):
+        assert get_source_ip({"requestContext": {"identity": {"sourceIp": "10.0.0.1"}}}) == "10.0.0.1"
+        assert get_source_ip({"requestContext": {"http": {"sourceIp": "10.0.0.2"}}}) == "10.0.0.2"
+        assert get_source_ip({}) is None
+
+
+class TestQueueFallback:
+
+    @pytest.fixture
+    def queued(self, monkeypatch):
+        rows = []
+        monkeypatch.setattr(insert_event_handler, "get_aws_pass", lambda key: "password")
+        monkeypatch.setattr(insert_event_handler, "get_redis", lambda: "redis")
+        monkeypatch.setattr(insert_event_handler, "enqueue_submission", lambda r, values: rows.append(values))
+        return rows
+
+    def test_unavailable_database_queues_the_submission(self, queued, monkeypatch):
+        monkeypatch.setattr(insert_event_handler, "shared_db", lambda password: return_error(503, 'Database temporarily unavailable'))
+        assert insert_submission(("Pottery",))["statusCode"] == 202
+        assert queued == [("Pottery",)]
+
+    def test_statement_timeout_queues_the_submission(self, queued, monkeypatch):
+        class TimingOutConnection:
+            def cursor(self):
+                raise psycopg2.extensions.QueryCanceledError("canceling statement due to statement timeout")
+        monkeypatch.setattr(insert_event_handler, "shared_db", lambda password: TimingOutConnection())
+        monkeypatch.setattr(insert_event_handler, "reset_db", lambda error: None)
+        assert insert_submission(("Pottery",))["statusCode"] == 202
+
+    def test_redis_down_returns_the_database_error(self, queued, monkeypatch):
+        monkeypatch.setattr(insert_event_handler, "shared_db", lambda password: return_error(503, 'Database temporarily unavailable'))
+        monkeypatch.setattr(insert_event_handler, "get_redis", lambda: return_error(500, 'Error connecting to Redis'))
+        assert insert_submission(("Pottery",))["statusCode"] == 503
+        assert queued == []
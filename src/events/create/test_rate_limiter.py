@@ -0,0 +1,76 @@
+import asyncio
+from rate_limiter import (
+    EMAIL_LIMIT,
+    SOURCE_WINDOW_SECONDS,
+    build_limits,
+    check_rate_limit,
+    check_rate_limit_async,
+    hash_identity,
+    retry_after_seconds
+)
+
+
+class TestBuildLimits:
+
+    def test_email_and_source_buckets(self):
+        limits = build_limits("User@Example.com", "10.0.0.1")
+
+        assert [key for key, _, _ in limits] == ["submission_rate:{email:" + hash_identity("user@example.com") + "}", "submission_rate:{source:10.0.0.1}"]
+        assert limits[0][1] == EMAIL_LIMIT
+        assert limits[1][2] == SOURCE_WINDOW_SECONDS * 1000
+
+    def test_buckets_are_spread_over_slots(self):
+        from redis.crc import key_slot
+        keys = [key for email in ("a@example.com", "b@example.com", "c@example.com") for key, _, _ in build_limits(email, None)]
+
+        assert len({key_slot(key.encode()) for key in keys}) == 3
+
+    def test_email_is_not_stored_in_plain_text(self):
+        limits = build_limits("user@example.com", None)
+
+        assert "user@example.com" not in limits[0][0]
+
+    def test_missing_identities_build_no_buckets(self):
+        assert build_limits(None, None) == []
+
+
+class TestRetryAfterSeconds:
+
+    def test_rounds_up_to_whole_seconds(self):
+        assert retry_after_seconds(1001) == 2
+        assert retry_after_seconds(2000) == 2
+
+    def test_minimum_is_one_second(self):
+        assert retry_after_seconds(1) == 1
+
+
+class TestCheckRateLimit:
+
+    def test_allowed_request_returns_zero(self, fake_redis):
+        r = fake_redis(script_results=(0, 0))
+
+        assert check_rate_limit(r, "user@example.com", "10.0.0.1") == 0
+        assert [len(keys) for _, _, keys, _ in r.scripts] == [1, 1]
+        assert not r.pipelines[0].transaction
+
+    def test_limited_request_returns_the_longest_wait(self, fake_redis):
+        assert check_rate_limit(fake_redis(script_results=(0, 30500)), "user@example.com", "10.0.0.1") == 31
+
+    def test_redis_failure_fails_open(self, fake_redis):
+        assert check_rate_limit(fake_redis(error=ConnectionError("down")), "user@example.com", None) == 0
+
+    def test_no_identity_skips_redis(self, fake_redis):
+        r = fake_redis(script_results=(5000,))
+
+        assert check_rate_limit(r, None, None) == 0
+        assert r.scripts == []
+
+
+class TestCheckRateLimitAsync:
+
+    def test_matches_sync_results(self, async_fake_redis):
+        assert asyncio.run(check_rate_limit_async(async_fake_redis(script_results=(0, 0)), "user@example.com", "10.0.0.1")) == 0
+        assert asyncio.run(check_rate_limit_async(async_fake_redis(script_results=(30500,)), "user@example.com", None)) == 31
+
+    def test_fails_open(self, async_fake_redis):
+        assert asyncio.run(check_rate_limit_async(async_fake_redis(error=ConnectionError("down")), "user@example.com", None)) == 0
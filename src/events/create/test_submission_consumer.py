@@ -0,0 +1,98 @@
+import pytest
+import psycopg2
+import submission_consumer as consumer
+from submission_queue import (
+    DEAD_LETTER_STREAM,
+    MAX_DELIVERIES,
+    encode_submission
+)
+
+
+def submission(name):
+    return encode_submission((name, 10, 'A class', 'https://example.com/' + name, True, 'Studio', '2026-11-01', '18:00', 'Biz', 'a@example.com', '2026-10-19'))
+
+
+@pytest.fixture
+def inserts(monkeypatch):
+    # Names in failing are rejected by the insert, batches containing them fail as a whole
+    state = {"failing": set(), "error": psycopg2.IntegrityError("check violation"), "batches": []}
+
+    def insert_rows(conn, rows):
+        state["batches"].append([row[0] for row in rows])
+        if any(row[0] in state["failing"] for row in rows):
+            raise state["error"]
+    monkeypatch.setattr(consumer, "insert_rows", insert_rows)
+    return state
+
+
+class TestWriteBatch:
+
+    def test_written_rows_are_acked(self, inserts, fake_redis, fake_db):
+        r = fake_redis()
+        entries = [("1-0", submission("Pottery")), ("2-0", submission("Painting"))]
+        assert consumer.write_batch(r, fake_db(), entries) == 2
+        assert inserts["batches"] == [["Pottery", "Painting"]]
+        assert r.acked == ["1-0", "2-0"]
+
+    def test_failed_batch_falls_back_to_single_rows(self, inserts, fake_redis, fake_db):
+        inserts["failing"].add("Painting")
+        r = fake_redis()
+        conn = fake_db()
+        entries = [("1-0", submission("Pottery")), ("2-0", submission("Painting")), ("3-0", submission("Weaving"))]
+        assert consumer.write_batch(r, conn, entries) == 2
+        assert inserts["batches"][1:] == [["Pottery"], ["Painting"], ["Weaving"]]
+        assert r.acked == ["1-0", "3-0"]
+        assert conn.rollbacks == 2
+
+    def test_failed_row_stays_pending_below_the_limit(self, inserts, fake_redis, fake_db):
+        inserts["failing"].add("Painting")
+        r = fake_redis()
+        r.deliveries = MAX_DELIVERIES - 1
+        consumer.write_batch(r, fake_db(), [("2-0", submission("Painting"))])
+        assert r.acked == []
+        assert DEAD_LETTER_STREAM not in r.streams
+
+    def test_failed_row_is_dead_lettered_at_the_limit(self, inserts, fake_redis, fake_db):
+        inserts["failing"].add("Painting")
+        r = fake_redis()
+        r.deliveries = MAX_DELIVERIES
+        consumer.write_batch(r, fake_db(), [("2-0", submission("Painting"))])
+        assert r.acked == ["2-0"]
+        assert [fields["source_id"] for fields in r.streams[DEAD_LETTER_STREAM]] == ["2-0"]
+
+    def test_undecodable_entry_is_dead_lettered(self, inserts, fake_redis, fake_db):
+        r = fake_redis()
+        assert consumer.write_batch(r, fake_db(), [("1-0", {"row": "not json"})]) == 0
+        assert r.acked == ["1-0"]
+        assert inserts["batches"] == []
+
+    def test_lost_connection_stops_without_spending_deliveries(self, inserts, fake_redis, fake_db):
+        inserts["failing"].add("Painting")
+        inserts["error"] = psycopg2.OperationalError("server closed the connection unexpectedly")
+        r = fake_redis()
+        r.deliveries = MAX_DELIVERIES
+        with pytest.raises(psycopg2.OperationalError):
+            consumer.write_batch(r, fake_db(), [("1-0", submission("Pottery")), ("2-0", submission("Painting"))])
+        assert r.acked == []
+        assert DEAD_LETTER_STREAM not in r.streams
+
+    def test_failed_rollback_stops_the_run(self, inserts, fake_redis, fake_db):
+        inserts["failing"].add("Painting")
+        conn = fake_db(rollback_error=psycopg2.InterfaceError("connection already closed"))
+        with pytest.raises(psycopg2.InterfaceError):
+            consumer.write_batch(fake_redis(), conn, [("2-0", submission("Painting"))])
+
+
+class TestHandler:
+
+    def test_lost_connection_ends_the_run(self, inserts, fake_redis, fake_db, monkeypatch):
+        inserts["failing"].add("Pottery")
+        inserts["error"] = psycopg2.OperationalError("server closed the connection unexpectedly")
+        conn = fake_db()
+        monkeypatch.setattr(consumer, "get_aws_pass", lambda key: "password")
+        monkeypatch.setattr(consumer, "connect_redis", lambda password: fake_redis())
+        monkeypatch.setattr(consumer, "ensure_consumer_group", lambda r: None)
+        monkeypatch.setattr(consumer, "connect_db", lambda password: conn)
+        monkeypatch.setattr(consumer, "read_batch", lambda r, name: [("1-0", submission("Pottery"))])
+        assert consumer.lambda_handler({}, None)["statusCode"] == 500
+        assert conn.closed
@@ -0,0 +1,59 @@
+import pytest
+import json
+from submission_queue import (
+    DEAD_LETTER_STREAM,
+    SUBMISSION_FIELDS,
+    SUBMISSION_STREAM,
+    encode_submission,
+    decode_submission,
+    read_batch
+)
+
+
+class TestSubmissionEncoding:
+
+    def test_round_trip_preserves_values_and_order(self):
+        values = ("Pottery", 45, "Learn pottery", "https://example.com", True, "Studio", "2026-05-12", "14:00", "Clay Co", "a@example.com", "2026-05-01")
+        assert decode_submission(encode_submission(values)) == values
+
+    def test_none_values_survive_round_trip(self):
+        values = ("Pottery", None, None, "https://example.com", None, "Studio", "2026-05-12", "14:00", "Clay Co", "a@example.com", "2026-05-01")
+        assert decode_submission(encode_submission(values)) == values
+
+    def test_encoded_row_is_keyed_by_column(self):
+        values = tuple(range(len(SUBMISSION_FIELDS)))
+        row = json.loads(encode_submission(values)["row"])
+
+        assert list(row.keys()) == list(SUBMISSION_FIELDS)
+
+    def test_missing_fields_decode_as_none(self):
+        result = decode_submission({"row": json.dumps({"name": "Pottery"})})
+
+        assert result[0] == "Pottery"
+        assert all(value is None for value in result[1:])
+
+    def test_invalid_payload_raises(self):
+        with pytest.raises(Exception):
+            decode_submission({"row": "not json"})
+
+
+class TestStreamNames:
+
+    def test_dead_letter_stream_shares_the_cluster_slot(self):
+        from redis.crc import key_slot
+
+        assert key_slot(SUBMISSION_STREAM.encode()) == key_slot(DEAD_LETTER_STREAM.encode())
+
+
+class TestReadBatch:
+
+    @pytest.mark.parametrize("reply", [
+        ["0-0", [("1-0", {"row": "{}"})]],
+        ["0-0", [("1-0", {"row": "{}"})], []]
+    ])
+    def test_claims_on_redis_6_and_7(self, reply):
+        class Stream:
+            def xautoclaim(self, *args, **kwargs):
+                return reply
+
+        assert read_batch(Stream(), "consumer") == [("1-0", {"row": "{}"})]
@@ -2,11 +2,9 @@ import re
 from typing import Optional
 from urllib.parse import urlparse
 from datetime import datetime
-import logging
+from common.log import get_logger
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+logger = get_logger(__name__)
 
 NAME_SIZE=500
 DESCRIPTION_SIZE=500
@@ -0,0 +1,156 @@
+# Imported first so an enabled cold start profile covers every import below
+from common import profiling
+import os
+from datetime import date
+from common import breaker
+from common import config
+from common import metrics
+from common.cache import (
+    read_calendar_cache,
+    shared_cache_redis,
+    write_calendar_cache
+)
+from common.db import (
+    VISIBLE_EVENT,
+    execute_prepared,
+    record_db_success,
+    reset_db,
+    shared_db
+)
+from common.params import query_params
+from common.responses import (
+    is_error,
+    return_error,
+    success
+)
+from common.secrets import get_aws_pass
+from common.log import (
+    get_logger,
+    start_request
+)
+
+logger=get_logger(__name__)
+profiling.mark("handler_imported")
+
+CALENDAR_MAX_DAYS=int(os.environ.get('CALENDAR_MAX_DAYS', '366'))
+NO_CRAFT='unspecified'
+
+# Served by idx_event_date_craft without reading the event rows
+CALENDAR_COUNTS="""Select date, craft, count(*) from event
+where date >= %s and date < %s and {}
+group by date, craft;""".format(VISIBLE_EVENT)
+
+def parse_date(params, name):
+	value=params.get(name)
+	try:
+		return date.fromisoformat(value)
+	except (TypeError, ValueError):
+		raise ValueError("{} must be a date like 2026-02-01".format(name))
+
+def calendar_request(params):
+	"""Returns the inclusive (start, end) dates of the requested range."""
+	start=parse_date(params, "start")
+	end=parse_date(params, "end")
+	if end < start:
+		raise ValueError("end must not be before start")
+	if (end - start).days >= CALENDAR_MAX_DAYS:
+		raise ValueError("The range must be at most {} days".format(CALENDAR_MAX_DAYS))
+	return start, end
+
+def month_start(month):
+	return date(int(month[:4]), int(month[5:]), 1)
+
+def next_month(day):
+	return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+def months_between(start, end):
+	months=[]
+	day=start.replace(day=1)
+	while day <= end:
+		months.append(day.strftime("%Y-%m"))
+		day=next_month(day)
+	return months
+
+def count_months(conn, months):
+	"""Returns {month: {day: {craft: count}}} for every month given, empty months included."""
+	counts={month: {} for month in months}
+	with metrics.stage("DbQuery"), conn.cursor() as cur:
+		# One query over the span of the missing months, rows of months already cached in between are dropped
+		execute_prepared(cur, "calendar_counts", CALENDAR_COUNTS, (month_start(months[0]), next_month(month_start(months[-1]))))
+		rows=cur.fetchall()
+	conn.rollback()
+	for day, craft, count in rows:
+		day=day.isoformat()
+		month=counts.get(day[:7])
+		if month is not None:
+			month.setdefault(day, {})[craft or NO_CRAFT]=count
+	return counts
+
+def summarize(counts, start, end):
+	"""Narrows the monthly counts to the requested range and totals them per day and per craft."""
+	days={}
+	crafts={}
+	for month in counts.values():
+		for day, by_craft in month.items():
+			if not start.isoformat() <= day <= end.isoformat():
+				continue
+			days[day]={"total": sum(by_craft.values()), "crafts": by_craft}
+			for craft, count in by_craft.items():
+				crafts[craft]=crafts.get(craft, 0) + count
+	return {
+		"days": dict(sorted(days.items())),
+		"crafts": crafts,
+		"total": sum(crafts.values())
+	}
+
+def cached_months(months):
+	"""Returns (redis client or None, {month: counts} found in the cache)."""
+	red_password=get_aws_pass(config.REDIS_PASS_KEY)
+	if is_error(red_password):
+		return None, {}
+	try:
+		with breaker.redis.guard():
+			r=shared_cache_redis(red_password)
+			return r, read_calendar_cache(r, months)
+	except Exception as e:
+		logger.error("Failed to read calendar cache: %s", e)
+		return None, {}
+
+@profiling.profile_cold_start
+@metrics.instrument('get_calendar_handler')
+def lambda_handler(event, context):
+	import psycopg2
+	start_request(context)
+	logger.info('Starting calendar handler')
+	try:
+		start, end=calendar_request(query_params(event))
+	except ValueError as e:
+		return return_error(422, str(e))
+
+	months=months_between(start, end)
+	r, counts=cached_months(months)
+	missing=[month for month in months if month not in counts]
+	metrics.record("CachedMonths", len(months) - len(missing))
+	if missing:
+		db_password=get_aws_pass(config.DB_PASS_KEY)
+		if is_error(db_password):
+			return db_password
+		# Counts are cached for a day, so they come from the primary: a lagging replica would cache a month promotion just invalidated
+		conn=shared_db(db_password)
+		if is_error(conn):
+			return conn
+		try:
+			fresh=count_months(conn, missing)
+		except psycopg2.Error as e:
+			logger.error("Failed database call with code: %s and error: %s", e.pgcode, e.pgerror)
+			reset_db(e)
+			return return_error(500, 'Retrieval from database failed')
+		record_db_success(conn)
+		counts.update(fresh)
+		if r is not None:
+			try:
+				with breaker.redis.guard():
+					write_calendar_cache(r, fresh)
+			except Exception as e:
+				logger.error("Failed to write calendar cache: %s", e)
+	return success(start=start, end=end, **summarize(counts, start, end))
@@ -1,88 +1,182 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import logging
-import json
+# Imported first so an enabled cold start profile covers every import below
+from common import profiling
 import os
-import requests
-from dotenv import load_dotenv
+from common import config
+from common import metrics
+from common import breaker
+from common.cache import (
+    read_event_cache,
+    shared_cache_redis
+)
+from common.db import (
+    VISIBLE_EVENT,
+    execute_prepared,
+    fetch_changes,
+    fetch_events,
+    fetch_rowset,
+    record_db_success,
+    reset_read_db,
+    shared_read_db
+)
+from common.geo import bounding_box
+from common.params import (
+    columnar_format,
+    float_param,
+    int_param,
+    query_params
+)
+from common.responses import (
+    RowSet,
+    columnar,
+    is_error,
+    return_error,
+    success
+)
+from common.secrets import get_aws_pass
+from common.log import (
+    get_logger,
+    start_request
+)
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
-logger=logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-SELECT_ALL="Select name, time, price, description, link, craft,kids, date, business, location_name, address, city, state, zip from event LEFT JOIN location on event.location_id=location.id;"
+logger=get_logger(__name__)
+profiling.mark("handler_imported")
 
-if os.path.exists('.env'):
-	load_dotenv()
-	logger.info("Loaded environment from .env file")
-else:
-	logger.info("No .env file")
+SEARCH_PAGE_SIZE=int(os.environ.get('SEARCH_PAGE_SIZE', '20'))
+SEARCH_MAX_PAGE_SIZE=100
+SEARCH_MAX_QUERY_LENGTH=200
+NEARBY_RADIUS_KM=float(os.environ.get('NEARBY_RADIUS_KM', '10'))
+NEARBY_MAX_RADIUS_KM=200
 
-aws_session_token=os.environ['AWS_SESSION_TOKEN']
-URL=os.environ['PARAMETERS_SECRETS_EXTENSION_URL']
+# Matches come from the GIN index on search_vector, so only they are ranked
+SEARCH_EVENTS="""Select name, time, price, description, link, craft, kids, date, business, location_name, address, city, state, zip
+from event LEFT JOIN location on event.location_id=location.id, websearch_to_tsquery('english', %s) query
+where event.search_vector @@ query and {}
+order by ts_rank_cd(event.search_vector, query) desc, event.id
+limit %s offset %s;""".format(VISIBLE_EVENT)
 
-DB_NAME=os.environ['DB_NAME']
-USER=os.environ['DB_USER']
-PORT=os.environ['DB_PORT']
-HOST=os.environ['DB_HOST']
-DB_PASS_KEY=os.environ['DB_PASS_KEY']
+# The bounding box range is answered from idx_location_lat_lon, only rows inside it get the exact
+# haversine distance. Parameters: lat, lat, lon, box, radius, limit, offset.
+NEARBY_EVENTS="""Select name, time, price, description, link, craft, kids, date, business, location_name, address, city, state, zip, distance_km
+from (Select event.id, name, time, price, description, link, craft, kids, date, business, location_name, address, city, state, zip,
+	2 * 6371.0088 * asin(least(1, sqrt(power(sin(radians(location.latitude - %s) / 2), 2)
+		+ cos(radians(%s)) * cos(radians(location.latitude)) * power(sin(radians(location.longitude - %s) / 2), 2)))) distance_km
+	from event JOIN location on event.location_id=location.id
+	where location.latitude between %s and %s and location.longitude between %s and %s and {}) nearby
+where distance_km <= %s
+order by distance_km, id
+limit %s offset %s;""".format(VISIBLE_EVENT)
 
-def return_error(code, message):
-	return {
-		"statusCode": code,
-		"message": message
-	}
+def page_request(params):
+	page=int_param(params, "page", 1, minimum=1)
+	page_size=int_param(params, "page_size", SEARCH_PAGE_SIZE, minimum=1, maximum=SEARCH_MAX_PAGE_SIZE)
+	return page, page_size
 
-def connect_db(pg_connection):
-	logger.info("Connecting to database")
-	try:
-		conn=psycopg2.connect(**pg_connection)
-	except Exception as e:
-		logger.error("Failed to connect to database with code: {} and error: {}".format(e.pgcode, e.pgerror))
-		return return_error(500, 'Error connecting to database')
-	return conn
+def search_request(params):
+	"""Returns (query, page, page_size) when the request is a search, None otherwise."""
+	q=params.get("q")
+	if q is None:
+		return None
+	q=q.strip()
+	if not q or len(q) > SEARCH_MAX_QUERY_LENGTH:
+		raise ValueError("q must be 1 to {} characters".format(SEARCH_MAX_QUERY_LENGTH))
+	return (q, *page_request(params))
+
+def nearby_request(params):
+	"""Returns (lat, lon, radius_km, page, page_size) when the request is a proximity search, None otherwise."""
+	lat=float_param(params, "lat", minimum=-90, maximum=90)
+	lon=float_param(params, "lon", minimum=-180, maximum=180)
+	if lat is None and lon is None:
+		return None
+	if lat is None or lon is None:
+		raise ValueError("lat and lon must be given together")
+	radius_km=float_param(params, "radius_km", NEARBY_RADIUS_KM, minimum=0, maximum=NEARBY_MAX_RADIUS_KM)
+	return (lat, lon, radius_km, *page_request(params))
+
+def paged_query(params):
+	"""Returns (statement name, sql, arguments, page, page_size) for a search, None for the full list."""
+	search=search_request(params)
+	nearby=nearby_request(params)
+	if search and nearby:
+		raise ValueError("q cannot be combined with lat and lon")
+	if search:
+		q, page, page_size=search
+		return "search_events", SEARCH_EVENTS, (q,), page, page_size
+	if nearby:
+		lat, lon, radius_km, page, page_size=nearby
+		return "nearby_events", NEARBY_EVENTS, (lat, lat, lon, *bounding_box(lat, lon, radius_km), radius_km), page, page_size
+	return None
 
-def get_aws_pass(password):
+def fetch_page(conn, name, sql, arguments, page, page_size):
+	"""Runs a paged query, fetching one row past the page to tell whether another page exists."""
+	with metrics.stage("DbSearch"), conn.cursor() as cur:
+		execute_prepared(cur, name, sql, (*arguments, page_size + 1, (page - 1) * page_size))
+		records=fetch_rowset(cur)
+	conn.rollback()
+	return RowSet(records.columns, records.rows[:page_size]), len(records) > page_size
+
+def events_body(records, as_columns):
+	return columnar(records) if as_columns else {"found_events": records}
+
+def cached_fallback(error, as_columns=False):
+	"""Serves the cached list, possibly stale, when Postgres is unavailable, otherwise returns error."""
+	red_password=get_aws_pass(config.REDIS_PASS_KEY)
+	if is_error(red_password):
+		return error
 	try:
-		url_config=URL+"/systemsmanager/parameters/get"
-		logger.info("Parameter getter has started with url {}".format(url_config))
-		res = requests.get(
-    		url_config,
-    		headers={"X-Aws-Parameters-Secrets-Token": aws_session_token},
-    		params={"name": password, "withDecryption": "true"}
-    		)
-		found_pass=res.json()['Parameter']['Value']
+		with breaker.redis.guard():
+			records=read_event_cache(shared_cache_redis(red_password))
 	except Exception as e:
-		logger.error({e})
-		return return_error(500, 'Server parameter retrieval error')
-	return found_pass
+		logger.error("Cache fallback failed: %s", e)
+		return error
+	if records is None:
+		return error
+	logger.warning("Serving cached events, database unavailable: %s", error.get("message"))
+	metrics.set_property("Fallback", "cache")
+	metrics.record("RowCount", len(records))
+	return success(**events_body(records, as_columns))
 
+@profiling.profile_cold_start
+@metrics.instrument('get_events_handler')
 def lambda_handler(event, context):
+	import psycopg2
+	start_request(context)
 	logger.info('Starting lambda handler')
-	db_password=get_aws_pass(DB_PASS_KEY)
+	params=query_params(event)
+	try:
+		search=paged_query(params)
+		since=int_param(params, "since", None, minimum=0)
+		as_columns=columnar_format(params)
+	except ValueError as e:
+		return return_error(422, str(e))
+	if search and since is not None:
+		return return_error(422, 'since cannot be combined with q or lat and lon')
+	# The cache only holds the full list, searches and changes have nothing to fall back to
+	full_list=search is None and since is None
 
-	pg_connection = {
-		'dbname': DB_NAME,
-		'user': USER,
-		'password': db_password,
-		'port': PORT,
-		'host': HOST
-	}
+	db_password=get_aws_pass(config.DB_PASS_KEY)
+	if is_error(db_password):
+		return cached_fallback(db_password, as_columns) if full_list else db_password
 
-	conn = connect_db(pg_connection)
-	result=[]
+	conn = shared_read_db(db_password)
+	if is_error(conn):
+		return cached_fallback(conn, as_columns) if full_list else conn
 	try:
-		with conn.cursor(cursor_factory=RealDictCursor) as cur:
-			cur.execute(SELECT_ALL)
-			records = cur.fetchall()
-			cur.close()
-		conn.close()
+		if search:
+			records, has_more = fetch_page(conn, *search)
+			page, page_size = search[3:]
+			body = {**events_body(records, as_columns), "page": page, "page_size": page_size, "has_more": has_more}
+		elif since is not None:
+			changes = fetch_changes(conn, since)
+			records = changes.pop("found_events")
+			body = {**events_body(records, as_columns), **changes}
+		else:
+			records = fetch_events(conn)
+			body = events_body(records, as_columns)
 	except psycopg2.Error as e:
-		logger.error("Failed database call with code: {} and error: {}".format(e.pgcode, e.pgerror))
-		return return_error(500, 'Retrieval from database failed')
-	return {
-		"statusCode": 200,
-	       "body": json.dumps({
-	           "message": "Successful",
-	           "found_events": records
-	       }, default=str) 
-	}
+		logger.error("Failed database call with code: %s and error: %s", e.pgcode, e.pgerror)
+		reset_read_db(e)
+		error = return_error(500, 'Retrieval from database failed')
+		return cached_fallback(error, as_columns) if full_list else error
+	record_db_success(conn)
+	metrics.record("RowCount", len(records))
+	return success(**body)
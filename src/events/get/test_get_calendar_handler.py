@@ -0,0 +1,91 @@
+import json
+import pytest
+from datetime import date
+import get_calendar_handler as calendar
+from common import db
+
+
+class TestCalendarRequest:
+
+    def test_range(self):
+        assert calendar.calendar_request({"start": "2026-02-01", "end": "2026-03-31"}) == (date(2026, 2, 1), date(2026, 3, 31))
+
+    @pytest.mark.parametrize("params", [
+        {},
+        {"start": "2026-02-01"},
+        {"start": "2026-02-30", "end": "2026-03-01"},
+        {"start": "2026-03-01", "end": "2026-02-01"},
+        {"start": "2026-01-01", "end": "2027-06-01"}
+    ])
+    def test_invalid(self, params):
+        with pytest.raises(ValueError):
+            calendar.calendar_request(params)
+
+
+class TestMonths:
+
+    def test_months_between_wraps_the_year(self):
+        assert calendar.months_between(date(2026, 11, 15), date(2027, 1, 2)) == ["2026-11", "2026-12", "2027-01"]
+
+    def test_summarize_keeps_the_requested_days(self):
+        counts = {
+            "2026-02": {"2026-02-01": {"pottery": 2}, "2026-02-20": {"pottery": 1, "painting": 3}},
+            "2026-03": {"2026-03-05": {"unspecified": 1}}
+        }
+        summary = calendar.summarize(counts, date(2026, 2, 10), date(2026, 3, 31))
+        assert summary == {
+            "days": {
+                "2026-02-20": {"total": 4, "crafts": {"pottery": 1, "painting": 3}},
+                "2026-03-05": {"total": 1, "crafts": {"unspecified": 1}}
+            },
+            "crafts": {"pottery": 1, "painting": 3, "unspecified": 1},
+            "total": 5
+        }
+
+
+class TestCountMonths:
+
+    def test_plain_rows_are_grouped_by_month_and_day(self, fake_db, monkeypatch):
+        monkeypatch.setattr(db, "PREPARED_STATEMENTS", False)
+        # The 2026-03 row falls between the requested months, which are already cached
+        conn = fake_db(answers=[[(date(2026, 2, 14), "pottery", 2), (date(2026, 2, 14), None, 1), (date(2026, 3, 2), "pottery", 5)]])
+        assert calendar.count_months(conn, ["2026-02", "2026-04"]) == {
+            "2026-02": {"2026-02-14": {"pottery": 2, "unspecified": 1}},
+            "2026-04": {}
+        }
+        assert conn.rollbacks == 1
+
+    def test_seeded_counts(self, seeded_db):
+        assert calendar.count_months(seeded_db, ["2026-02"])["2026-02"]["2026-02-15"]["pottery"] >= 1
+
+
+class TestHandler:
+
+    @pytest.fixture
+    def backends(self, monkeypatch):
+        state = {"queried": [], "written": []}
+        cached = {"2026-02": {"2026-02-14": {"pottery": 2}}}
+        monkeypatch.setattr(calendar, "cached_months", lambda months: ("redis", {m: cached[m] for m in months if m in cached}))
+        monkeypatch.setattr(calendar, "get_aws_pass", lambda key: "password")
+        monkeypatch.setattr(calendar, "shared_db", lambda password: "conn")
+
+        def count_months(conn, months):
+            state["queried"].append(months)
+            return {month: {} for month in months}
+        monkeypatch.setattr(calendar, "count_months", count_months)
+        monkeypatch.setattr(calendar, "write_calendar_cache", lambda r, counts: state["written"].append(counts))
+        return state
+
+    def test_only_uncached_months_hit_the_database(self, backends):
+        response = calendar.lambda_handler({"queryStringParameters": {"start": "2026-02-01", "end": "2026-03-31"}}, None)
+        assert response["statusCode"] == 200
+        assert json.loads(response["body"])["days"] == {"2026-02-14": {"total": 2, "crafts": {"pottery": 2}}}
+        assert backends["queried"] == [["2026-03"]]
+        assert backends["written"] == [{"2026-03": {}}]
+
+    def test_fully_cached_range(self, backends):
+        calendar.lambda_handler({"start": "2026-02-01", "end": "2026-02-28"}, None)
+        assert backends["queried"] == []
+
+    def test_invalid_range(self, backends):
+        assert calendar.lambda_handler({"start": "2026-02-01"}, None)["statusCode"] == 422
@@ -0,0 +1,152 @@
+import json
+import pytest
+import get_events_handler
+from common import db
+from common.geo import bounding_box
+from get_events_handler import (
+    NEARBY_EVENTS,
+    NEARBY_RADIUS_KM,
+    SEARCH_EVENTS,
+    SEARCH_MAX_PAGE_SIZE,
+    SEARCH_PAGE_SIZE,
+    fetch_page,
+    lambda_handler,
+    nearby_request,
+    paged_query,
+    search_request
+)
+
+
+class TestSearchRequest:
+
+    def test_plain_list_request(self):
+        assert search_request({}) is None
+
+    def test_defaults(self):
+        assert search_request({"q": " kids pottery "}) == ("kids pottery", 1, SEARCH_PAGE_SIZE)
+
+    def test_paging(self):
+        assert search_request({"q": "watercolor", "page": "3", "page_size": "10"}) == ("watercolor", 3, 10)
+
+    @pytest.mark.parametrize("params", [
+        {"q": "  "},
+        {"q": "x" * 201},
+        {"q": "watercolor", "page": "0"},
+        {"q": "watercolor", "page": "two"},
+        {"q": "watercolor", "page_size": str(SEARCH_MAX_PAGE_SIZE + 1)}
+    ])
+    def test_invalid_requests(self, params):
+        with pytest.raises(ValueError):
+            search_request(params)
+
+    def test_invalid_search_is_rejected_before_the_database(self):
+        response = lambda_handler({"queryStringParameters": {"q": "watercolor", "page": "0"}}, None)
+        assert response == {"statusCode": 422, "message": "page must be at least 1"}
+
+
+class TestSearchQuery:
+
+    def test_uses_the_indexed_vector_and_pages(self):
+        assert "search_vector @@ query" in SEARCH_EVENTS
+        assert "websearch_to_tsquery('english', %s)" in SEARCH_EVENTS
+        assert SEARCH_EVENTS.count("%s") == 3
+
+
+class TestNearbyRequest:
+
+    def test_not_a_proximity_search(self):
+        assert nearby_request({}) is None
+
+    def test_defaults(self):
+        assert nearby_request({"lat": "38.9", "lon": "-77.03"}) == (38.9, -77.03, NEARBY_RADIUS_KM, 1, SEARCH_PAGE_SIZE)
+
+    @pytest.mark.parametrize("params", [
+        {"lat": "38.9"},
+        {"lat": "95", "lon": "-77"},
+        {"lat": "38.9", "lon": "-77", "radius_km": "-1"},
+        {"lat": "38.9", "lon": "-77", "radius_km": "5000"}
+    ])
+    def test_invalid_requests(self, params):
+        with pytest.raises(ValueError):
+            nearby_request(params)
+
+
+class TestPagedQuery:
+
+    def test_full_list(self):
+        assert paged_query({}) is None
+
+    def test_nearby_arguments_match_the_placeholders(self):
+        name, sql, arguments, page, page_size = paged_query({"lat": "38.9", "lon": "-77.03", "radius_km": "5", "page": "2"})
+        assert (name, sql, page) == ("nearby_events", NEARBY_EVENTS, 2)
+        assert arguments == (38.9, 38.9, -77.03, *bounding_box(38.9, -77.03, 5), 5)
+        # The paging limit and offset are added by fetch_page
+        assert NEARBY_EVENTS.count("%s") == len(arguments) + 2
+
+    def test_search_and_nearby_are_exclusive(self):
+        with pytest.raises(ValueError):
+            paged_query({"q": "pottery", "lat": "38.9", "lon": "-77.03"})
+
+
+class TestSince:
+
+    @pytest.mark.parametrize("params, message", [
+        ({"since": "-1"}, "since must be at least 0"),
+        ({"since": "v2"}, "since must be a whole number"),
+        ({"since": "10", "q": "pottery"}, "since cannot be combined with q or lat and lon"),
+        ({"format": "xml"}, "format must be rows or columnar")
+    ])
+    def test_invalid_requests(self, params, message):
+        assert lambda_handler({"queryStringParameters": params}, None) == {"statusCode": 422, "message": message}
+
+
+class TestColumnar:
+
+    @pytest.fixture
+    def database(self, fake_db, monkeypatch):
+        monkeypatch.setattr(db, "PREPARED_STATEMENTS", False)
+        monkeypatch.setattr(get_events_handler, "get_aws_pass", lambda key: "password")
+        monkeypatch.setattr(get_events_handler, "record_db_success", lambda conn: None)
+
+        def serve(*answers):
+            conn = fake_db(answers=answers, columns=("id", "name"))
+            monkeypatch.setattr(get_events_handler, "shared_read_db", lambda password: conn)
+            return conn
+        return serve
+
+    def test_search_rows_are_the_cursor_tuples(self, database, monkeypatch):
+        rows = [(1, "Pottery Workshop"), (2, "Pottery for Kids")]
+        database(rows)
+        captured = {}
+        monkeypatch.setattr(get_events_handler, "success", lambda **body: captured.update(body))
+        get_events_handler.lambda_handler({"queryStringParameters": {"q": "pottery", "page_size": "1", "format": "columnar"}}, None)
+        assert captured["columns"] == ["id", "name"]
+        assert captured["rows"] == rows[:1]
+        assert captured["rows"][0] is rows[0]
+        assert captured["has_more"]
+
+    def test_since_rows_are_the_cursor_tuples(self, database):
+        database([(750,)], [(3, "Pottery Workshop")], [(9,)])
+        response = get_events_handler.lambda_handler({"queryStringParameters": {"since": "700", "format": "columnar"}}, None)
+        assert json.loads(response["body"]) == {
+            "message": "Successful",
+            "columns": ["id", "name"],
+            "rows": [[3, "Pottery Workshop"]],
+            "version": 750,
+            "deleted": [9]
+        }
+
+
+class TestAgainstDatabase:
+
+    def test_nearby_finds_the_seeded_event(self, seeded_db):
+        # init.sql puts Pottery Workshop at the Seattle community center, 47.6114 -122.3305
+        records, has_more = fetch_page(seeded_db, *paged_query({"lat": "47.6114", "lon": "-122.3305", "radius_km": "5"}))
+        records = list(records)
+        assert [record["name"] for record in records] == ["Pottery Workshop"]
+        assert records[0]["distance_km"] < 0.01
+        assert not has_more
+
+    def test_search_ranks_the_seeded_event(self, seeded_db):
+        records, _ = fetch_page(seeded_db, *paged_query({"q": "pottery techniques"}))
+        assert next(iter(records))["name"] == "Pottery Workshop"
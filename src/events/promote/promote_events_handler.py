@@ -0,0 +1,150 @@
+import psycopg2
+from psycopg2.extras import execute_values
+import os
+from common import config
+from common.cache import (
+    connect_redis,
+    invalidate_calendar_cache,
+    write_event_cache
+)
+from common.db import (
+    connect_db,
+    fetch_events
+)
+from common.geo import centroid
+from common.responses import (
+    is_error,
+    return_error,
+    success
+)
+from common.secrets import get_aws_pass
+from common.log import (
+    get_logger,
+    start_request
+)
+
+logger=get_logger(__name__)
+
+# Locks a batch of approved submissions, skipping rows another promotion run already holds
+CLAIM_BATCH="""CREATE TEMP TABLE promotion_batch (LIKE user_submitted_event) ON COMMIT DROP;
+INSERT INTO promotion_batch
+SELECT * FROM user_submitted_event
+WHERE status = 'ready' AND approved
+ORDER BY id
+LIMIT %s
+FOR UPDATE SKIP LOCKED;"""
+UPSERT_LOCATIONS="""INSERT INTO location (location_name, address, city, state, zip)
+SELECT DISTINCT location_name, address, city, state, zip FROM promotion_batch
+ON CONFLICT ON CONSTRAINT unique_location DO NOTHING;"""
+INSERT_EVENTS="""INSERT INTO event (name, price, description, link, craft, kids, location_id, date, time, business, approved, submitted_by)
+SELECT b.name, b.price, b.description, b.link, b.craft, b.kids, l.id, b.date, b.time, b.business, b.approved, b.email
+FROM promotion_batch b
+JOIN location l ON l.location_name = b.location_name
+	AND l.address IS NOT DISTINCT FROM b.address
+	AND l.city IS NOT DISTINCT FROM b.city
+	AND l.state IS NOT DISTINCT FROM b.state
+	AND l.zip IS NOT DISTINCT FROM b.zip
+RETURNING date;"""
+MARK_DONE="""UPDATE user_submitted_event SET status = 'done'
+FROM promotion_batch WHERE user_submitted_event.id = promotion_batch.id;"""
+MISSING_COORDINATES="SELECT id, zip FROM location WHERE latitude IS NULL AND zip IS NOT NULL AND NOT geocode_attempted;"
+# Misses are written as NULL coordinates too, so each location is looked up once instead of on every run
+SET_COORDINATES="""UPDATE location SET latitude = v.latitude::double precision, longitude = v.longitude::double precision, geocode_attempted = true
+FROM (VALUES %s) AS v (id, latitude, longitude) WHERE location.id = v.id;"""
+
+PROMOTION_BATCH_SIZE=int(os.environ.get('PROMOTION_BATCH_SIZE', '1000'))
+PROMOTION_MAX_BATCHES=int(os.environ.get('PROMOTION_MAX_BATCHES', '10'))
+
+def promote_batch(conn):
+	"""Promotes one batch in a single transaction.
+
+	Returns the number of submissions moved and the months, as YYYY-MM, of the events inserted.
+	"""
+	with conn:
+		with conn.cursor() as cur:
+			cur.execute(CLAIM_BATCH, (PROMOTION_BATCH_SIZE,))
+			claimed=cur.rowcount
+			if claimed == 0:
+				return 0, set()
+			cur.execute(UPSERT_LOCATIONS)
+			logger.info("Added %s new locations", cur.rowcount)
+			cur.execute(INSERT_EVENTS)
+			logger.info("Inserted %s events", cur.rowcount)
+			months={row[0].strftime("%Y-%m") for row in cur.fetchall()}
+			cur.execute(MARK_DONE)
+	return claimed, months
+
+def geocode_locations(conn):
+	"""Fills in coordinates from the bundled zip centroids, returns the number of locations geocoded.
+
+	Only locations not looked up before are read. Those whose zip is not in the table stay NULL, are
+	marked as attempted and are left out of proximity searches.
+	"""
+	with conn:
+		with conn.cursor() as cur:
+			cur.execute(MISSING_COORDINATES)
+			attempts=[(location_id, *(centroid(zip_code) or (None, None))) for location_id, zip_code in cur.fetchall()]
+			if attempts:
+				execute_values(cur, SET_COORDINATES, attempts)
+	found=sum(1 for _, latitude, _ in attempts if latitude is not None)
+	logger.info("Geocoded %s of %s locations", found, len(attempts))
+	return found
+
+def refresh_cache(conn, r):
+	try:
+		write_event_cache(r, fetch_events(conn))
+	except Exception as e:
+		# The promoted rows are already committed, a stale cache is fixed by the next run
+		logger.error("Failed to refresh cache: %s", e)
+		return False
+	return True
+
+def invalidate_calendar(r, months):
+	try:
+		invalidate_calendar_cache(r, sorted(months))
+	except Exception as e:
+		# The stale months expire after CALENDAR_CACHE_SECONDS
+		logger.error("Failed to invalidate calendar months %s: %s", sorted(months), e)
+		return False
+	return True
+
+def lambda_handler(event, context):
+	start_request(context)
+	logger.info('Starting promotion handler')
+	db_password=get_aws_pass(config.DB_PASS_KEY)
+	if is_error(db_password):
+		return db_password
+	conn=connect_db(db_password)
+	if is_error(conn):
+		return conn
+
+	r=None
+	red_password=get_aws_pass(config.REDIS_PASS_KEY)
+	if not is_error(red_password):
+		r=connect_redis(red_password)
+
+	promoted=0
+	try:
+		for _ in range(PROMOTION_MAX_BATCHES):
+			count, months=promote_batch(conn)
+			if count == 0:
+				break
+			promoted+=count
+			if r is not None:
+				refresh_cache(conn, r)
+				invalidate_calendar(r, months)
+	except psycopg2.Error as e:
+		logger.error("Failed promotion with code: %s and error: %s", e.pgcode, e.pgerror)
+		conn.close()
+		return return_error(500, 'Promotion of submitted events failed')
+
+	geocoded=0
+	try:
+		geocoded=geocode_locations(conn)
+	except psycopg2.Error as e:
+		# New locations are retried on the next run, until then they only miss proximity searches
+		logger.error("Failed geocoding with code: %s and error: %s", e.pgcode, e.pgerror)
+	finally:
+		conn.close()
+
+	return success(promoted=promoted, geocoded=geocoded)
@@ -0,0 +1,107 @@
+import pytest
+from datetime import date
+import promote_events_handler as promote
+
+
+def batch(claimed, dates):
+    return {
+        # The claim is only counted, INSERT_EVENTS returns each event's date
+        promote.CLAIM_BATCH: [()] * claimed,
+        promote.INSERT_EVENTS: [(day,) for day in dates]
+    }
+
+
+class TestPromoteBatch:
+
+    def test_nothing_claimed_stops_early(self, fake_db):
+        conn = fake_db(batch(0, []))
+        assert promote.promote_batch(conn) == (0, set())
+        assert [sql for sql, _ in conn.statements] == [promote.CLAIM_BATCH]
+
+    def test_batch_moves_rows_and_returns_their_months(self, fake_db):
+        conn = fake_db(batch(3, [date(2026, 11, 2), date(2026, 11, 20), date(2027, 1, 5)]))
+        assert promote.promote_batch(conn) == (3, {"2026-11", "2027-01"})
+        assert [sql for sql, _ in conn.statements] == [promote.CLAIM_BATCH, promote.UPSERT_LOCATIONS, promote.INSERT_EVENTS, promote.MARK_DONE]
+        assert conn.commits == 1
+
+
+class TestGeocodeLocations:
+
+    def test_only_known_zips_get_coordinates(self, fake_db, monkeypatch):
+        updates = []
+        monkeypatch.setattr(promote, "execute_values", lambda cur, sql, rows: updates.extend(rows))
+        conn = fake_db({promote.MISSING_COORDINATES: [(1, "20001"), (2, "00000")]})
+        assert promote.geocode_locations(conn) == 1
+        assert updates == [(1, 38.9109, -77.0179), (2, None, None)]
+
+    def test_unknown_zip_is_recorded_as_attempted(self, fake_db, monkeypatch):
+        # Without the attempt every later run would look the zip up again
+        updates = []
+        monkeypatch.setattr(promote, "execute_values", lambda cur, sql, rows: updates.append((sql, rows)))
+        assert promote.geocode_locations(fake_db({promote.MISSING_COORDINATES: [(2, "00000")]})) == 0
+        assert updates == [(promote.SET_COORDINATES, [(2, None, None)])]
+
+    def test_nothing_to_update(self, fake_db, monkeypatch):
+        monkeypatch.setattr(promote, "execute_values", lambda cur, sql, rows: pytest.fail("update without rows"))
+        assert promote.geocode_locations(fake_db()) == 0
+
+
+class TestHandler:
+
+    @pytest.fixture
+    def run(self, monkeypatch):
+        def run(conn, r):
+            monkeypatch.setattr(promote, "get_aws_pass", lambda key: "password")
+            monkeypatch.setattr(promote, "connect_db", lambda password: conn)
+            monkeypatch.setattr(promote, "connect_redis", lambda password: r)
+            monkeypatch.setattr(promote, "fetch_events", lambda conn: [{"name": "Pottery Workshop"}])
+            return promote.lambda_handler({}, None)
+        return run
+
+    def test_inserted_months_are_invalidated(self, fake_db, fake_redis, run, monkeypatch):
+        batches = iter([(2, {"2027-01", "2026-11"}), (0, set())])
+        monkeypatch.setattr(promote, "promote_batch", lambda conn: next(batches))
+        monkeypatch.setattr(promote, "write_event_cache", lambda r, records: None)
+        r = fake_redis()
+        response = run(fake_db(), r)
+        assert response["statusCode"] == 200
+        assert r.deleted == ["event_calendar:{2026}-11", "event_calendar:{2027}-01"]
+
+    def test_redis_errors_after_the_commit_are_swallowed(self, fake_db, fake_redis, run, monkeypatch):
+        batches = iter([(2, {"2026-11"}), (0, set())])
+        monkeypatch.setattr(promote, "promote_batch", lambda conn: next(batches))
+
+        def write_event_cache(r, records):
+            raise ConnectionError("redis down")
+        monkeypatch.setattr(promote, "write_event_cache", write_event_cache)
+        conn = fake_db()
+        response = run(conn, fake_redis(error=ConnectionError("redis down")))
+        assert response["statusCode"] == 200
+        assert '"promoted": 2' in response["body"]
+        assert conn.closed
+
+    def test_refresh_cache_reports_failure(self, fake_db, fake_redis, monkeypatch):
+        def write_event_cache(r, records):
+            raise ConnectionError("redis down")
+        monkeypatch.setattr(promote, "fetch_events", lambda conn: [])
+        monkeypatch.setattr(promote, "write_event_cache", write_event_cache)
+        assert promote.refresh_cache(fake_db(), fake_redis()) is False
+
+
+class TestAgainstDatabase:
+
+    def test_location_upsert_matches_missing_address_parts(self, seeded_db):
+        # unique_location is NULLS NOT DISTINCT, Postgres 15 and later, so a second upsert of a
+        # location without an address finds the first instead of adding a duplicate
+        with seeded_db.cursor() as cur:
+            cur.execute("""INSERT INTO user_submitted_event (name, location_name, date, time, business, email, date_submitted, approved, status)
+                VALUES ('Upsert test class', 'Upsert test hall', '2030-01-05', '10:00', 'Upsert Co', 'upsert@example.com', '2030-01-01', true, 'ready');""")
+            cur.execute(promote.CLAIM_BATCH, (promote.PROMOTION_BATCH_SIZE,))
+            cur.execute(promote.UPSERT_LOCATIONS)
+            assert cur.rowcount >= 1
+            cur.execute(promote.UPSERT_LOCATIONS)
+            assert cur.rowcount == 0
+            cur.execute("Select count(*) from location where location_name = 'Upsert test hall';")
+            assert cur.fetchone()[0] == 1
+            cur.execute(promote.INSERT_EVENTS)
+            assert (date(2030, 1, 5),) in cur.fetchall()
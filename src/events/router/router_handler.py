@@ -0,0 +1,52 @@
+# Imported first so an enabled cold start profile covers every import below
+from common import profiling
+import importlib
+from common.responses import return_error
+from common.log import get_logger
+
+logger=get_logger(__name__)
+profiling.mark("handler_imported")
+
+# (method, path) -> module whose lambda_handler serves the route. Every handler in this container
+# goes through the shared secrets cache, database connection and Redis client in common.
+ROUTES={
+	("GET", "/events"): "get_events_handler",
+	("GET", "/events/cached"): "get_redis_events_handler",
+	("GET", "/events/calendar"): "get_calendar_handler",
+	("POST", "/events"): "insert_event_handler"
+}
+_handlers={}
+
+def normalize_path(path):
+	return "/" + path.strip("/") if path else "/"
+
+def get_route(event):
+	"""Returns (method, path) for API Gateway REST (v1) and HTTP (v2) proxy events."""
+	route_key=event.get("routeKey")
+	if route_key and route_key != "$default":
+		method, _, path=route_key.partition(" ")
+		return method.upper(), normalize_path(path)
+	http=(event.get("requestContext") or {}).get("http") or {}
+	method=event.get("httpMethod") or http.get("method") or ""
+	# resource is the matched template without the stage or a custom domain base path
+	path=event.get("resource") or event.get("rawPath") or event.get("path")
+	return method.upper(), normalize_path(path)
+
+def get_handler(module_name):
+	# Handler modules are imported on first use, so a container only serving reads never loads the submission code
+	handler=_handlers.get(module_name)
+	if handler is None:
+		handler=importlib.import_module(module_name).lambda_handler
+		_handlers[module_name]=handler
+	return handler
+
+def lambda_handler(event, context):
+	if not isinstance(event, dict):
+		return return_error(400, 'Unsupported event')
+	method, path=get_route(event)
+	module_name=ROUTES.get((method, path))
+	if module_name is None:
+		if any(route_path == path for _, route_path in ROUTES):
+			return return_error(405, 'Method not allowed')
+		return return_error(404, 'Route not found')
+	return get_handler(module_name)(event, context)
@@ -0,0 +1,53 @@
+import pytest
+import router_handler
+from router_handler import (
+    get_route,
+    lambda_handler
+)
+
+
+@pytest.fixture
+def routed(monkeypatch):
+    # Replaces the handler imports so dispatch is tested without the database or Redis
+    calls = []
+
+    def fake_handler(name):
+        def handler(event, context):
+            calls.append(name)
+            return {"statusCode": 200, "handler": name}
+        return handler
+    monkeypatch.setattr(router_handler, "_handlers", {name: fake_handler(name) for name in router_handler.ROUTES.values()})
+    return calls
+
+
+class TestGetRoute:
+
+    def test_rest_api_event_uses_resource(self):
+        event = {"httpMethod": "get", "resource": "/events/cached", "path": "/prod/events/cached"}
+        assert get_route(event) == ("GET", "/events/cached")
+
+    def test_http_api_route_key(self):
+        assert get_route({"routeKey": "POST /events", "rawPath": "/events"}) == ("POST", "/events")
+
+    def test_http_api_default_route_uses_raw_path(self):
+        event = {"routeKey": "$default", "rawPath": "/events/", "requestContext": {"http": {"method": "GET"}}}
+        assert get_route(event) == ("GET", "/events")
+
+
+class TestDispatch:
+
+    def test_each_route_reaches_its_handler(self, routed):
+        assert lambda_handler({"httpMethod": "GET", "resource": "/events"}, None)["handler"] == "get_events_handler"
+        assert lambda_handler({"httpMethod": "GET", "resource": "/events/cached"}, None)["handler"] == "get_redis_events_handler"
+        assert lambda_handler({"routeKey": "POST /events"}, None)["handler"] == "insert_event_handler"
+        assert routed == ["get_events_handler", "get_redis_events_handler", "insert_event_handler"]
+
+    def test_unknown_path_is_404(self, routed):
+        assert lambda_handler({"httpMethod": "GET", "resource": "/venues"}, None)["statusCode"] == 404
+        assert routed == []
+
+    def test_wrong_method_is_405(self, routed):
+        assert lambda_handler({"httpMethod": "DELETE", "resource": "/events"}, None)["statusCode"] == 405
+
+    def test_non_proxy_event_is_rejected(self, routed):
+        assert lambda_handler("{}", None)["statusCode"] == 400
@@ -0,0 +1,165 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import (
+    datetime,
+    timezone
+)
+from common import config
+from common.db import (
+    VISIBLE_EVENT,
+    record_db_success,
+    reset_read_db,
+    shared_read_db
+)
+from common.responses import (
+    RowSet,
+    is_error,
+    return_error,
+    success
+)
+from common.secrets import get_aws_pass
+from common.log import (
+    get_logger,
+    start_request
+)
+
+logger=get_logger(__name__)
+
+SNAPSHOT_BUCKET=os.environ.get('SNAPSHOT_BUCKET', '')
+SNAPSHOT_PREFIX=os.environ.get('SNAPSHOT_PREFIX', 'events/')
+# Set to the LocalStack endpoint locally, left empty in AWS
+S3_ENDPOINT_URL=os.environ.get('S3_ENDPOINT_URL') or None
+SNAPSHOT_MANIFEST_MAX_AGE=int(os.environ.get('SNAPSHOT_MANIFEST_MAX_AGE', '60'))
+# Hashed names never change content, so the CDN and browsers can keep them for good
+IMMUTABLE='public, max-age=31536000, immutable'
+MANIFEST='manifest.json'
+NO_CRAFT='unspecified'
+
+UPCOMING_EVENTS="""Select name, time, price, description, link, craft, kids, date, business, location_name, address, city, state, zip
+from event LEFT JOIN location on event.location_id=location.id
+where event.date >= current_date and {}
+order by event.date, event.time, event.id;""".format(VISIBLE_EVENT)
+
+def fetch_upcoming(conn):
+	with conn.cursor() as cur:
+		cur.execute(UPCOMING_EVENTS)
+		rows=cur.fetchall()
+		columns=[column.name for column in cur.description]
+	conn.rollback()
+	return RowSet(columns, rows)
+
+def slug(value):
+	return re.sub(r'[^a-z0-9]+', '-', (value or NO_CRAFT).lower()).strip('-') or NO_CRAFT
+
+def slices(events):
+	"""Returns {name: RowSet} for the full list and each craft and month slice, rows in date order."""
+	craft=events.columns.index("craft")
+	date=events.columns.index("date")
+	groups={}
+	for row in events.rows:
+		groups.setdefault("crafts/" + slug(row[craft]), []).append(row)
+		groups.setdefault("months/" + row[date].strftime("%Y-%m"), []).append(row)
+	return {"all": events, **{name: RowSet(events.columns, rows) for name, rows in sorted(groups.items())}}
+
+def render(name, events):
+	"""Returns the gzipped file of one slice with its content hashed key, and its manifest entry."""
+	body=('{"found_events": ' + events.to_json() + '}').encode()
+	digest=hashlib.sha256(body).hexdigest()
+	# mtime=0 keeps the gzip bytes the same for the same content
+	compressed=gzip.compress(body, compresslevel=9, mtime=0)
+	path="{}.{}.json.gz".format(name, digest[:16])
+	return compressed, {"path": path, "count": len(events), "bytes": len(body), "gzip_bytes": len(compressed), "sha256": digest}
+
+def build_manifest(entries, generated_at):
+	manifest={"generated_at": generated_at, "all": entries["all"], "crafts": {}, "months": {}}
+	for name, entry in entries.items():
+		group, _, key=name.partition("/")
+		if key:
+			manifest[group][key]=entry
+	return manifest
+
+def s3_client():
+	# boto3 ships with the Lambda Python runtime, so it is not bundled in the zip
+	import boto3
+	from botocore.config import Config
+	return boto3.client("s3", endpoint_url=S3_ENDPOINT_URL, config=Config(s3={"addressing_style": "path"}) if S3_ENDPOINT_URL else None)
+
+def existing_keys(s3):
+	keys=set()
+	for page in s3.get_paginator("list_objects_v2").paginate(Bucket=SNAPSHOT_BUCKET, Prefix=SNAPSHOT_PREFIX):
+		keys.update(item["Key"] for item in page.get("Contents", []))
+	return keys
+
+def manifest_paths(manifest):
+	entries=[manifest["all"], *manifest["crafts"].values(), *manifest["months"].values()]
+	return {entry["path"] for entry in entries}
+
+def previous_manifest(s3):
+	try:
+		return json.loads(s3.get_object(Bucket=SNAPSHOT_BUCKET, Key=SNAPSHOT_PREFIX + MANIFEST)["Body"].read())
+	except s3.exceptions.NoSuchKey:
+		return None
+
+def publish(s3, files, manifest):
+	"""Uploads the files not already in the bucket, then the manifest, so it never names a missing file.
+
+	Files named by neither the new nor the previous manifest are deleted afterwards. Clients holding
+	the previous manifest for up to SNAPSHOT_MANIFEST_MAX_AGE can still fetch everything it names.
+	Returns the number of files uploaded and deleted.
+	"""
+	present=existing_keys(s3)
+	previous=previous_manifest(s3)
+	uploaded=0
+	for path, body in files.items():
+		key=SNAPSHOT_PREFIX + path
+		if key in present:
+			continue
+		s3.put_object(Bucket=SNAPSHOT_BUCKET, Key=key, Body=body, ContentType="application/json", ContentEncoding="gzip", CacheControl=IMMUTABLE)
+		uploaded+=1
+	s3.put_object(Bucket=SNAPSHOT_BUCKET, Key=SNAPSHOT_PREFIX + MANIFEST, Body=json.dumps(manifest).encode(),
+		ContentType="application/json", CacheControl="public, max-age={}".format(SNAPSHOT_MANIFEST_MAX_AGE))
+
+	keep={SNAPSHOT_PREFIX + path for path in manifest_paths(manifest) | (manifest_paths(previous) if previous else set())}
+	stale=sorted(present - keep - {SNAPSHOT_PREFIX + MANIFEST})
+	# delete_objects takes at most 1000 keys
+	for start in range(0, len(stale), 1000):
+		s3.delete_objects(Bucket=SNAPSHOT_BUCKET, Delete={"Objects": [{"Key": key} for key in stale[start:start + 1000]], "Quiet": True})
+	return uploaded, len(stale)
+
+def lambda_handler(event, context):
+	import psycopg2
+	start_request(context)
+	logger.info('Starting snapshot handler')
+	if not SNAPSHOT_BUCKET:
+		return return_error(500, 'SNAPSHOT_BUCKET is not configured')
+	db_password=get_aws_pass(config.DB_PASS_KEY)
+	if is_error(db_password):
+		return db_password
+	conn=shared_read_db(db_password)
+	if is_error(conn):
+		return conn
+	try:
+		events=fetch_upcoming(conn)
+	except psycopg2.Error as e:
+		logger.error("Failed database call with code: %s and error: %s", e.pgcode, e.pgerror)
+		reset_read_db(e)
+		return return_error(500, 'Retrieval from database failed')
+	record_db_success(conn)
+
+	files={}
+	entries={}
+	for name, rows in slices(events).items():
+		body, entry=render(name, rows)
+		files[entry["path"]]=body
+		entries[name]=entry
+	manifest=build_manifest(entries, datetime.now(timezone.utc).isoformat(timespec="seconds"))
+	try:
+		uploaded, deleted=publish(s3_client(), files, manifest)
+	except Exception as e:
+		logger.error("Failed to publish snapshot: %s", e)
+		return return_error(500, 'Publishing the snapshot failed')
+	logger.info("Published %s snapshot files, %s unchanged, %s deleted", uploaded, len(files) - uploaded, deleted)
+	return success(events=len(events), files=len(files), uploaded=uploaded, deleted=deleted)
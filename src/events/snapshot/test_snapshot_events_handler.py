@@ -0,0 +1,120 @@
+import gzip
+import io
+import json
+import pytest
+from datetime import (
+    date,
+    time
+)
+from common.responses import RowSet
+import snapshot_events_handler as snapshot
+
+COLUMNS = ["name", "time", "craft", "date"]
+EVENTS = RowSet(COLUMNS, [
+    ("Pottery Workshop", time(14, 0), "pottery", date(2026, 2, 15)),
+    ("Painting Class", time(10, 0), "Painting & Drawing", date(2026, 2, 20)),
+    ("Open Studio", time(9, 0), None, date(2026, 3, 1))
+])
+
+
+class FakeS3:
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+        self.puts = []
+        self.deleted = []
+
+    def get_paginator(self, operation):
+        s3 = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                return [{"Contents": [{"Key": key} for key in s3.objects if key.startswith(Prefix)]}]
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.puts.append(Key)
+        self.objects[Key] = Body
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            self.deleted.append(item["Key"])
+            del self.objects[item["Key"]]
+
+
+def snapshot_files():
+    files = {}
+    entries = {}
+    for name, rows in snapshot.slices(EVENTS).items():
+        body, entry = snapshot.render(name, rows)
+        files[entry["path"]] = body
+        entries[name] = entry
+    return files, snapshot.build_manifest(entries, "2026-02-01T00:00:00+00:00")
+
+
+class TestRender:
+
+    def test_slices(self):
+        assert {name: len(rows) for name, rows in snapshot.slices(EVENTS).items()} == {
+            "all": 3,
+            "crafts/painting-drawing": 1,
+            "crafts/pottery": 1,
+            "crafts/unspecified": 1,
+            "months/2026-02": 2,
+            "months/2026-03": 1
+        }
+
+    def test_content_hashed_and_deterministic(self):
+        first, entry = snapshot.render("all", EVENTS)
+        second, _ = snapshot.render("all", EVENTS)
+        assert first == second
+        assert entry["path"] == "all.{}.json.gz".format(entry["sha256"][:16])
+        assert json.loads(gzip.decompress(first))["found_events"][0] == {"name": "Pottery Workshop", "time": "14:00:00", "craft": "pottery", "date": "2026-02-15"}
+        assert snapshot.render("all", RowSet(COLUMNS, EVENTS.rows[:2]))[1]["path"] != entry["path"]
+
+    def test_manifest(self):
+        _, manifest = snapshot_files()
+        assert manifest["all"]["count"] == 3
+        assert sorted(manifest["crafts"]) == ["painting-drawing", "pottery", "unspecified"]
+        assert manifest["months"]["2026-03"]["path"].startswith("months/2026-03.")
+
+
+class TestPublish:
+
+    @pytest.fixture(autouse=True)
+    def bucket(self, monkeypatch):
+        monkeypatch.setattr(snapshot, "SNAPSHOT_BUCKET", "snapshots")
+
+    def test_manifest_is_written_last(self):
+        s3 = FakeS3()
+        files, manifest = snapshot_files()
+        assert snapshot.publish(s3, files, manifest) == (len(files), 0)
+        assert s3.puts[-1] == "events/manifest.json"
+        assert json.loads(s3.objects["events/manifest.json"]) == manifest
+
+    def test_unchanged_files_are_not_uploaded_again(self):
+        s3 = FakeS3()
+        files, manifest = snapshot_files()
+        snapshot.publish(s3, files, manifest)
+        s3.puts.clear()
+        assert snapshot.publish(s3, files, manifest) == (0, 0)
+        assert s3.puts == ["events/manifest.json"]
+
+    def test_files_older_than_the_previous_manifest_are_deleted(self):
+        s3 = FakeS3({"events/all.0000000000000000.json.gz": b"gone"})
+        files, manifest = snapshot_files()
+        previous = {"all": {"path": "all.1111111111111111.json.gz"}, "crafts": {}, "months": {}}
+        s3.objects["events/all.1111111111111111.json.gz"] = b"previous"
+        s3.objects["events/manifest.json"] = json.dumps(previous).encode()
+        assert snapshot.publish(s3, files, manifest) == (len(files), 1)
+        assert s3.deleted == ["events/all.0000000000000000.json.gz"]
+        assert "events/all.1111111111111111.json.gz" in s3.objects